@@ -12,9 +12,18 @@ mpl.use("Agg")
 
 import matplotlib.pyplot as plt
 from apscheduler.schedulers.background import BackgroundScheduler
-from flask import Flask, render_template, request, send_file, send_from_directory
-
+from flask import (
+    Flask,
+    jsonify,
+    render_template,
+    request,
+    send_file,
+    send_from_directory,
+)
+
+from wimbledon.build_profile import read_builds
 from wimbledon.github import preferences_availability as pref
+from wimbledon.transport import get_transport
 from wimbledon.vis import Visualise
 
 # Initialise Flask App
@@ -58,7 +67,12 @@ def update(update_db=True):
         # time update was triggered
         updated_at = datetime.now().strftime("%d %b %Y, %H:%M")
 
-        vis = Visualise(with_tracked_time=False, update_db=update_db)
+        vis = Visualise(
+            with_tracked_time=False,
+            update_db=update_db,
+            profile_path=app.config.get("DATA_DIR") + "/build_profile.jsonl",
+        )
+        print(vis.build_profile.summary())
 
         # Generate preference table
         print("Generate preference table...")
@@ -266,6 +280,42 @@ def whiteboard():
     return html
 
 
+@app.route("/build_profile")
+def build_profile():
+    """Get the time, memory and rows processed by each stage of building the model
+    during the last update.
+
+    Returns:
+        Flask response -- json list of build stages.
+    """
+    try:
+        path = app.config.get("DATA_DIR") + "/build_profile.jsonl"
+        if not os.path.isfile(path):
+            return jsonify([])
+
+        # the file only keeps the last few builds (see BuildProfile.to_jsonl)
+        builds = read_builds(path)
+        return jsonify(builds[-1] if len(builds) > 0 else [])
+
+    except Exception:
+        return traceback.format_exc()
+
+
+@app.route("/http_stats")
+def http_stats():
+    """Get the number of requests made to each API host (Harvest, Forecast, GitHub)
+    since the app started, with their errors and latency histograms.
+
+    Returns:
+        Flask response -- json dict of {host: stats}.
+    """
+    try:
+        return jsonify(get_transport().stats())
+
+    except Exception:
+        return traceback.format_exc()
+
+
 @app.route("/download")
 def download():
     """Get a zip of whiteboard files.
@@ -0,0 +1,38 @@
+"""Run this script to benchmark the Wimbledon model and visualisations on synthetic
+teams of different sizes (multiples of the current REG team size).
+Usage:
+
+Benchmark at 1x, 10x and 100x the team size:
+python benchmark.py
+
+Benchmark at given scales:
+python benchmark.py 1 2 5
+
+Don't measure memory usage (quicker):
+python benchmark.py 1 10 nomemory
+
+Results are saved as json to ../data/benchmark.json
+"""
+import sys
+import time
+
+from wimbledon.bench import benchmark
+
+REPORT_PATH = "../data/benchmark.json"
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    scales = [float(arg) for arg in args if arg.replace(".", "", 1).isdigit()]
+    if len(scales) == 0:
+        scales = benchmark.DEFAULT_SCALES
+
+    memory = "nomemory" not in args
+
+    start = time.time()
+    benchmark.run(scales=scales, report_path=REPORT_PATH, memory=memory)
+
+    print("=" * 50)
+    print("Saved report to", REPORT_PATH)
+    print("TOTAL BENCHMARK TIME: {:.1f}s".format(time.time() - start))
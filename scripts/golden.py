@@ -0,0 +1,58 @@
+"""Run this script to check that changes to the Wimbledon model leave its outputs
+unchanged, using a fixed synthetic dataset.
+Usage:
+
+Save a golden snapshot (before making changes):
+python golden.py save [path]
+
+Compare the current model against a saved snapshot (after making changes):
+python golden.py check [path]
+
+Compare and time a candidate implementation against Wimbledon:
+python golden.py compare my.module.MyWimbledon
+"""
+import importlib
+import sys
+import time
+
+from wimbledon.bench import golden
+
+DEFAULT_PATH = "../data/golden.json"
+
+
+def load_class(name):
+    module, cls = name.rsplit(".", 1)
+    return getattr(importlib.import_module(module), cls)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    command = args[0] if len(args) > 0 else "check"
+
+    if command == "save":
+        path = args[1] if len(args) > 1 else DEFAULT_PATH
+        start = time.time()
+        golden.save_snapshot(path)
+        print("Saved snapshot to", path, "({:.1f}s)".format(time.time() - start))
+
+    elif command == "check":
+        path = args[1] if len(args) > 1 else DEFAULT_PATH
+        differences = golden.check_snapshot(path)
+        golden.print_differences(differences)
+        sys.exit(1 if len(differences) > 0 else 0)
+
+    elif command == "compare":
+        result = golden.compare(candidate_cls=load_class(args[1]))
+        print(
+            "reference build times:",
+            ["{:.2f}s".format(t) for t in result["reference_times"]],
+        )
+        print(
+            "candidate build times:",
+            ["{:.2f}s".format(t) for t in result["candidate_times"]],
+        )
+        golden.print_differences(result["differences"])
+        sys.exit(1 if len(result["differences"]) > 0 else 0)
+
+    else:
+        print(__doc__)
@@ -0,0 +1,107 @@
+"""Run this script to record the Harvest, Forecast and GitHub API responses of a
+full extraction, database update (update_db) and GitHub reactions query, or to
+replay them offline and time the ingestion path. The date is pinned to the day the
+responses were recorded, so replays make the same requests on any day.
+Usage:
+
+Record all responses to ../data/fixtures (needs Harvest and GitHub credentials):
+python replay.py record
+
+Replay them:
+python replay.py replay
+
+Replay with 0.2s latency per request (or "latency=recorded" to use the recorded
+latencies), a simulated server rate limit of 100 requests per 15 seconds and 16
+concurrent page fetches:
+python replay.py replay latency=0.2 limit=100/15 workers=16
+
+Replay without the client-side rate limiters, to find how fast ingestion can go:
+python replay.py replay nolimit
+
+Without time entries:
+python replay.py replay notime
+
+Without the update_db or GitHub steps (also when recording, e.g. without GitHub
+credentials):
+python replay.py replay noupdate nogithub
+
+Results are saved as json to ../data/replay.json
+"""
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+from wimbledon.bench import ingest
+from wimbledon.bench.report import parse_limit, parse_options
+from wimbledon.harvest import pagination, rate_limit
+from wimbledon.http_cache import ResponseCache, set_response_cache
+from wimbledon.replay import RecordingTransport, ReplayTransport, pin_recording_date
+from wimbledon.transport import set_transport
+
+FIXTURE_DIR = "../data/fixtures"
+REPORT_PATH = "../data/replay.json"
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    options = parse_options(args)
+    fixture_dir = options.get("fixtures", FIXTURE_DIR)
+
+    # start with an empty response cache so every response is recorded/replayed
+    # in full
+    set_response_cache(ResponseCache(tempfile.mkdtemp()))
+
+    if "record" in args:
+        pin_recording_date(fixture_dir, record=True)
+        set_transport(RecordingTransport(fixture_dir))
+    elif "replay" in args:
+        latency = options.get("latency", "0")
+        if latency != "recorded":
+            latency = float(latency)
+
+        max_requests, period = parse_limit(options)
+
+        pin_recording_date(fixture_dir)
+        set_transport(
+            ReplayTransport(
+                fixture_dir,
+                latency=latency,
+                jitter=float(options.get("jitter", 0)),
+                max_requests=max_requests,
+                period=period,
+            )
+        )
+
+        # requests aren't sent anywhere, but building them needs credentials
+        for name in [
+            "HARVEST_ACCOUNT_ID",
+            "FORECAST_ACCOUNT_ID",
+            "HARVEST_ACCESS_TOKEN",
+            "GITHUB_TOKEN",
+        ]:
+            os.environ.setdefault(name, "replay")
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+    if "workers" in options:
+        pagination.DEFAULT_WORKERS = int(options["workers"])
+
+    limiters = contextlib.nullcontext()
+    if "replay" in args and "nolimit" in args:
+        limiters = rate_limit.unlimited()
+
+    start = time.time()
+    with limiters:
+        ingest.run(
+            with_tracked_time="notime" not in args,
+            run_update="noupdate" not in args,
+            run_github="nogithub" not in args,
+            report_path=REPORT_PATH,
+        )
+
+    print("=" * 50)
+    print("Saved report to", REPORT_PATH)
+    print("TOTAL TIME: {:.1f}s".format(time.time() - start))
@@ -65,6 +65,7 @@ def init_vis(with_tracked_time=True, update_db=False):
     vis = Visualise(with_tracked_time=with_tracked_time, update_db=update_db)
 
     print("{:.1f}s".format(time.time() - start))
+    print(vis.build_profile.summary())
     return vis
 
 
@@ -0,0 +1,52 @@
+"""Run this script to benchmark updating the database (update_db) against a local
+mock of the Harvest and Forecast APIs, serving synthetic teams of different sizes
+(multiples of the current REG team size). No credentials or database are needed.
+Usage:
+
+Benchmark at 1x and 10x the team size, with the real Harvest/Forecast rate limits:
+python sync_benchmark.py
+
+Benchmark at given scales:
+python sync_benchmark.py 1 2 5
+
+Add 0.2s latency to each response and make the mock APIs allow only 50 requests
+per 15 seconds (replying 429 to the rest):
+python sync_benchmark.py 1 latency=0.2 limit=50/15
+
+Don't rate limit requests in the client (only the mock APIs' limit applies):
+python sync_benchmark.py 1 nolimit
+
+Results are saved as json to ../data/sync_benchmark.json
+"""
+import sys
+import time
+
+from wimbledon.bench import sync
+from wimbledon.bench.report import parse_limit, parse_options
+
+REPORT_PATH = "../data/sync_benchmark.json"
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    options = parse_options(args)
+
+    scales = [float(arg) for arg in args if arg.replace(".", "", 1).isdigit()]
+    if len(scales) == 0:
+        scales = sync.DEFAULT_SCALES
+
+    max_requests, period = parse_limit(options)
+
+    start = time.time()
+    sync.run(
+        scales=scales,
+        report_path=REPORT_PATH,
+        latency=float(options.get("latency", 0)),
+        max_requests=max_requests,
+        period=period,
+        client_limits="nolimit" not in args,
+    )
+
+    print("=" * 50)
+    print("Saved report to", REPORT_PATH)
+    print("TOTAL BENCHMARK TIME: {:.1f}s".format(time.time() - start))
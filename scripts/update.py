@@ -6,6 +6,9 @@ python update.py
 
 Including time tracking update:
 python update.py harvest
+
+Fetching all time entries, rather than only those updated since the last update:
+python update.py harvest full
 """
 
 import sys
@@ -19,7 +22,9 @@ if "harvest" in sys.argv:
 else:
     with_tracked_time = False
 
-update_db(with_tracked_time=with_tracked_time)
+full_sync = "full" in sys.argv
+
+update_db(with_tracked_time=with_tracked_time, full_sync=full_sync)
 
 print("=" * 50)
 print("TOTAL UPDATE TIME: {:.1f}s".format(time.time() - start))
@@ -0,0 +1,37 @@
+"""Run this script to update the raw data lake (Parquet files of the Harvest and
+Forecast tables, in ~/.wimbledon/lake) from the harvest and forecast apis.
+Usage:
+
+Replace all tables:
+python update_lake.py
+
+Only fetch time entries updated since the latest one in the lake, and merge them
+in (other tables are replaced):
+python update_lake.py incremental
+
+Only Harvest or only Forecast:
+python update_lake.py harvest
+python update_lake.py forecast
+"""
+import sys
+import time
+
+from wimbledon.harvest import lake
+
+start = time.time()
+
+run_harvest = "forecast" not in sys.argv or "harvest" in sys.argv
+run_forecast = "harvest" not in sys.argv or "forecast" in sys.argv
+
+time_entries_since = None
+if "incremental" in sys.argv:
+    time_entries_since = lake.latest_update()
+
+lake.update_lake(
+    run_forecast=run_forecast,
+    run_harvest=run_harvest,
+    time_entries_since=time_entries_since,
+)
+
+print("=" * 50)
+print("TOTAL UPDATE TIME: {:.1f}s".format(time.time() - start))
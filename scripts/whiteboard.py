@@ -59,5 +59,6 @@ if __name__ == "__main__":
     vis = Visualise(with_tracked_time=False, start_date=start_date, end_date=end_date)
 
     print("{:.1f}s".format(time.time() - init))
+    print(vis.build_profile.summary())
 
     whiteboard(vis, display)
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+from wimbledon.harvest.db_interface import crosswalk_ids
+
+
+def forecast_rows(ids, harvest_ids=None):
+    df = pd.DataFrame(index=pd.Index(ids, name="id"))
+    if harvest_ids is not None:
+        df["harvest_id"] = harvest_ids
+    return df
+
+
+def test_unlinked_rows_keep_their_forecast_id():
+    ids = crosswalk_ids(forecast_rows([10, 11]), harvest_ids=[1, 2])
+
+    assert ids.to_dict() == {10: 10, 11: 11}
+
+
+def test_forecast_ids_colliding_with_harvest_ids_are_negated():
+    ids = crosswalk_ids(forecast_rows([1, 2, 3]), harvest_ids=[2, 3, 4])
+
+    assert ids.to_dict() == {1: 1, 2: -2, 3: -3}
+
+
+def test_linked_rows_get_their_harvest_id():
+    df = forecast_rows([5, 6, 7], harvest_ids=[1, np.nan, np.nan])
+
+    ids = crosswalk_ids(df, link_column="harvest_id", harvest_ids=[1, 6])
+
+    # 5 is linked to harvest row 1, 6 collides with harvest row 6 and 7 is unlinked
+    assert ids.to_dict() == {5: 1, 6: -6, 7: 7}
+    assert ids.is_unique
@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+import wimbledon.sql.db_utils as db_utils
+import wimbledon.sql.schema as schema
+from wimbledon.sql import query_db
+
+
+@pytest.fixture
+def conn():
+    engine = db_utils.get_memory_engine()
+    schema.metadata.create_all(engine)
+    with engine.connect() as conn:
+        yield conn
+
+
+def rows(conn, table):
+    return {row["id"]: row["name"] for row in conn.execute(table.select())}
+
+
+def test_diff_upsert_only_writes_changed_rows(conn):
+    clients = [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}]
+
+    counts = db_utils.diff_upsert(schema.clients, clients, conn)
+    assert counts == {"unchanged": 0, "updated": 0, "inserted": 2}
+    assert rows(conn, schema.clients) == {1: "a", 2: "b"}
+
+    counts = db_utils.diff_upsert(schema.clients, clients, conn)
+    assert counts == {"unchanged": 2, "updated": 0, "inserted": 0}
+
+    clients = [{"id": 1, "name": "a"}, {"id": 2, "name": "c"}, {"id": 3, "name": "d"}]
+    counts = db_utils.diff_upsert(schema.clients, clients, conn)
+    assert counts == {"unchanged": 1, "updated": 1, "inserted": 1}
+    assert rows(conn, schema.clients) == {1: "a", 2: "c", 3: "d"}
+
+
+def test_diff_upsert_keeps_last_duplicate_and_batches(conn):
+    clients = [{"id": i, "name": str(i)} for i in range(25)] + [{"id": 0, "name": "x"}]
+
+    counts = db_utils.diff_upsert(schema.clients, clients, conn, batch_size=10)
+    assert counts["inserted"] == 25
+    assert rows(conn, schema.clients)[0] == "x"
+
+
+def test_diff_upsert_logs_changes_to_the_run(conn):
+    with db_utils.sync_run(conn) as run_id:
+        db_utils.diff_upsert(
+            schema.clients, [{"id": 1, "name": "a"}], conn, run_id=run_id
+        )
+    with db_utils.sync_run(conn) as next_run_id:
+        db_utils.diff_upsert(
+            schema.clients,
+            [{"id": 1, "name": "b"}, {"id": 2, "name": "c"}],
+            conn,
+            run_id=next_run_id,
+        )
+
+    changes = query_db.changes_since(conn=conn)
+    assert changes[["run_id", "id", "operation"]].values.tolist() == [
+        [run_id, 1, "insert"],
+        [next_run_id, 1, "update"],
+        [next_run_id, 2, "insert"],
+    ]
+    assert pd.isnull(changes["old_hash"].iloc[0])
+    assert changes["old_hash"].iloc[1] == changes["new_hash"].iloc[0]
+
+    assert query_db.changes_since(run_id, conn=conn)["run_id"].unique().tolist() == [
+        next_run_id
+    ]
@@ -0,0 +1,37 @@
+"""
+Run the golden output comparison (see wimbledon.bench.golden) under pytest. A
+snapshot saved before making changes (python scripts/golden.py save) is checked if
+there is one at data/golden.json, or at the path in the WIMBLEDON_GOLDEN environment
+variable.
+"""
+import os
+
+import pytest
+
+from wimbledon.bench import golden
+
+GOLDEN_PATH = os.environ.get(
+    "WIMBLEDON_GOLDEN",
+    os.path.join(os.path.dirname(__file__), "..", "data", "golden.json"),
+)
+
+
+@pytest.fixture(scope="module")
+def conn():
+    return golden.build_golden_db()
+
+
+def test_saved_snapshot_matches(conn):
+    if not os.path.isfile(GOLDEN_PATH):
+        pytest.skip("no golden snapshot at {}".format(GOLDEN_PATH))
+
+    differences = golden.check_snapshot(GOLDEN_PATH, conn=conn)
+    golden.print_differences(differences)
+    assert differences == {}
+
+
+def test_snapshot_round_trip(conn, tmp_path):
+    path = str(tmp_path / "golden.json")
+    golden.save_snapshot(path, conn=conn)
+
+    assert golden.check_snapshot(path, conn=conn) == {}
@@ -0,0 +1,64 @@
+import time
+from email.utils import formatdate
+from types import SimpleNamespace
+
+from wimbledon.harvest.rate_limit import RateLimiter, parse_retry_after
+
+
+def response(status_code, **headers):
+    return SimpleNamespace(status_code=status_code, headers=headers)
+
+
+def test_parse_retry_after_seconds_and_dates():
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+
+    seconds = parse_retry_after(formatdate(time.time() + 30, usegmt=True))
+    assert 25 < seconds <= 30
+
+
+def test_429_with_retry_after_pauses_requests():
+    limiter = RateLimiter(100, 15)
+
+    assert limiter.update(response(429, **{"Retry-After": "0.2"})) == 0.2
+
+    start = time.monotonic()
+    limiter.wait()
+    assert time.monotonic() - start >= 0.15
+
+
+def test_retry_after_on_success_is_ignored():
+    limiter = RateLimiter(100, 15)
+
+    assert limiter.update(response(200, **{"Retry-After": "10"})) is None
+
+    start = time.monotonic()
+    limiter.wait()
+    assert time.monotonic() - start < 0.1
+
+
+def test_send_retries_after_429():
+    limiter = RateLimiter.unlimited()
+    responses = iter([response(429, **{"Retry-After": "0"}), response(200)])
+    sent = []
+
+    def send_request():
+        sent.append(1)
+        return next(responses)
+
+    assert limiter.send(send_request).status_code == 200
+    assert len(sent) == 2
+
+
+def test_send_gives_up_after_max_retries():
+    limiter = RateLimiter.unlimited()
+    sent = []
+
+    def send_request():
+        sent.append(1)
+        return response(429, **{"Retry-After": "0"})
+
+    assert limiter.send(send_request, retries=2).status_code == 429
+    assert len(sent) == 3
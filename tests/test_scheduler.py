@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from wimbledon.harvest.scheduler import Scheduler
+
+
+def test_tasks_start_after_their_dependencies():
+    events = []
+    lock = threading.Lock()
+
+    def task(name, seconds=0.0):
+        def run(results):
+            with lock:
+                events.append(("start", name))
+            time.sleep(seconds)
+            with lock:
+                events.append(("end", name))
+            return name.upper()
+
+        return run
+
+    scheduler = Scheduler(max_workers=4)
+    scheduler.add("users", task("users", 0.1))
+    scheduler.add("clients", task("clients"))
+    scheduler.add("projects", task("projects", 0.05), after=["clients"])
+    scheduler.add("load", task("load"), after=["users", "projects"])
+    results = scheduler.run()
+
+    assert results == {
+        "users": "USERS",
+        "clients": "CLIENTS",
+        "projects": "PROJECTS",
+        "load": "LOAD",
+    }
+    assert events.index(("end", "clients")) < events.index(("start", "projects"))
+    assert events.index(("end", "users")) < events.index(("start", "load"))
+    assert events.index(("end", "projects")) < events.index(("start", "load"))
+    # independent tasks run at once
+    assert events.index(("start", "clients")) < events.index(("end", "users"))
+
+
+def test_tasks_get_the_results_of_their_dependencies():
+    scheduler = Scheduler()
+    scheduler.add("a", lambda results: 1)
+    scheduler.add("b", lambda results: results["a"] + 1, after=["a"])
+    scheduler.add("c", lambda results: results["a"] + results["b"], after=["a", "b"])
+
+    assert scheduler.run() == {"a": 1, "b": 2, "c": 3}
+
+
+def test_unknown_and_circular_dependencies_raise():
+    scheduler = Scheduler()
+    scheduler.add("a", lambda results: 1, after=["missing"])
+    with pytest.raises(ValueError, match="unknown"):
+        scheduler.run()
+
+    scheduler = Scheduler()
+    scheduler.add("a", lambda results: 1, after=["b"])
+    scheduler.add("b", lambda results: 2, after=["a"])
+    with pytest.raises(ValueError, match="circular"):
+        scheduler.run()
+
+
+def test_failed_task_stops_its_dependents():
+    ran = []
+
+    def fail(results):
+        raise RuntimeError("failed")
+
+    scheduler = Scheduler()
+    scheduler.add("a", fail)
+    scheduler.add("b", lambda results: ran.append("b"), after=["a"])
+
+    with pytest.raises(RuntimeError, match="failed"):
+        scheduler.run()
+    assert ran == []
@@ -0,0 +1,72 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from wimbledon.harvest.shards import (
+    ShardedFetch,
+    ShardFetchError,
+    date_shards,
+)
+
+
+def frame(ids, version, total_entries=None):
+    df = pd.DataFrame({"version": version}, index=pd.Index(ids, name="id"))
+    if total_entries is not None:
+        df.attrs["total_entries"] = total_entries
+    return df
+
+
+def test_date_shards():
+    assert date_shards(date(2021, 2, 1), date(2021, 7, 15)) == [
+        (date(2021, 2, 1), date(2021, 3, 31)),
+        (date(2021, 4, 1), date(2021, 6, 30)),
+        (date(2021, 7, 1), date(2021, 7, 15)),
+    ]
+
+    shards = date_shards(date(2021, 2, 1), date(2021, 7, 15), open_ended=True)
+    assert shards[0][0] is None and shards[-1][1] is None
+
+
+def test_result_dedupes_ids_and_sums_total_entries():
+    shards = [("a", "b"), ("c", "d")]
+    fetched = {
+        ("a", "b"): frame([1, 2], 1, total_entries=2),
+        ("c", "d"): frame([2, 3], 2, total_entries=2),
+    }
+
+    df = ShardedFetch(lambda start, end: fetched[(start, end)], shards).run().result()
+
+    # id 2 overlaps both shards, the last shard's row is kept
+    assert df.index.tolist() == [1, 2, 3]
+    assert df["version"].tolist() == [1, 2, 2]
+    # total_entries is the sum of the shards' (not the rows after deduping)
+    assert df.attrs["total_entries"] == 4
+
+
+def test_result_without_total_entries():
+    fetch = ShardedFetch(lambda start, end: frame([start], 1), [(1, 1), (2, 2)])
+
+    assert "total_entries" not in fetch.run().result().attrs
+
+
+def test_failed_shards_can_be_retried():
+    calls = []
+
+    def fetch_shard(start, end):
+        calls.append(start)
+        if start == 2 and calls.count(2) == 1:
+            raise ConnectionError("dropped")
+        return frame([start], 1, total_entries=1)
+
+    fetch = ShardedFetch(fetch_shard, [(1, 1), (2, 2)]).run()
+    assert list(fetch.errors) == [(2, 2)]
+    with pytest.raises(ShardFetchError) as err:
+        fetch.result()
+    assert err.value.fetch is fetch
+
+    df = fetch.retry().result()
+    assert df.index.tolist() == [1, 2]
+    assert df.attrs["total_entries"] == 2
+    # the shard that succeeded wasn't fetched again
+    assert calls.count(1) == 1
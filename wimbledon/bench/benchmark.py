@@ -0,0 +1,229 @@
+"""
+Benchmark the Wimbledon model and visualisations on synthetic teams of increasing
+size, to find where they stop scaling.
+
+For each scale a synthetic dataset (see synthetic.py) is loaded into a local
+database, and the wall time and peak (Python) memory of each step is recorded:
+building Wimbledon, whiteboard(), HTMLWriter.make_whiteboard, make_preferences_table
+and plot_demand_vs_capacity.
+"""
+import functools
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+
+# change matplotlib backend to avoid it trying to pop up figure windows
+import matplotlib as mpl
+
+mpl.use("Agg")
+
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from wimbledon import Wimbledon
+from wimbledon.bench import synthetic
+from wimbledon.bench.report import new_report, save_report
+from wimbledon.github import preferences_availability as pref
+from wimbledon.github.preferences_availability import default_emoji_mapping
+from wimbledon.vis import HTMLWriter, Visualise
+
+# approximately the size of the REG team at scale 1
+BASE_SIZE = {
+    "n_people": 50,
+    "n_projects": 80,
+    "n_programmes": 8,
+    "n_placeholders": 5,
+    "assignments_per_project": 4,
+    "churn": 2,
+    "years": 4,
+    "entries_per_week": 5,
+    # the REG Reserve project has its own client, so plot_demand_vs_capacity doesn't
+    # subtract it twice, and allocations are quarters so demand sums are exact
+    "reserve_client": "REG",
+    "fte_choices": synthetic.QUARTER_FTE_CHOICES,
+}
+
+# dataset parameters that grow with the scale of the team
+SCALED_PARAMS = ["n_people", "n_projects", "n_programmes", "n_placeholders"]
+
+DEFAULT_SCALES = [1, 10, 100]
+
+
+def scaled_size(scale, base_size=BASE_SIZE):
+    """make_dataset arguments for a team scale times bigger than base_size."""
+    size = dict(base_size)
+    for param in SCALED_PARAMS:
+        size[param] = int(size[param] * scale)
+    return size
+
+
+def measure(fn, memory=True):
+    """Run fn, timing it. If memory is True run it a second time with tracemalloc
+    to get its peak memory usage (tracing slows fn down, so isn't done when timing).
+
+    Returns:
+        tuple -- (result of fn, {"seconds": wall time, "peak_memory_mb": peak
+        memory or None})
+    """
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak = peak / 1e6
+
+    return result, {"seconds": seconds, "peak_memory_mb": peak}
+
+
+def make_preference_data(wim, start_date, end_date, seed=0):
+    """Random preference emojis in the format of
+    preferences_availability.get_preference_data, so make_preferences_table can be
+    benchmarked without querying GitHub."""
+    rng = random.Random(seed)
+
+    proj_idx = wim.get_active_projects(start_date, end_date, names=False)
+    issues = wim.projects.loc[proj_idx, "github"].dropna()
+    names = wim.get_active_people(start_date, end_date, names=True, partners=False)
+
+    emojis = list(default_emoji_mapping.values())
+    preference_data = {"Person": list(names)}
+    for project_id in issues.index:
+        preference_data[wim.get_project_name(project_id)] = [
+            rng.choice(emojis) for _ in names
+        ]
+
+    return pd.DataFrame(preference_data).set_index("Person")
+
+
+def run_scale(scale, base_size=BASE_SIZE, engine=None, memory=True, seed=0):
+    """Benchmark every step at one scale.
+
+    Returns:
+        list -- one dict per step with keys scale, step, seconds, peak_memory_mb
+        and rows (size of the step's input)
+    """
+    results = []
+
+    def record(step, fn, rows=None, repeatable=True):
+        result, measures = measure(fn, memory=memory and repeatable)
+        rows = None if rows is None else int(rows)
+        results.append(dict(scale=scale, step=step, rows=rows, **measures))
+        print(
+            "scale {:>5}  {:<30} {:>8.2f}s".format(scale, step, measures["seconds"]),
+            flush=True,
+        )
+        return result
+
+    size = scaled_size(scale, base_size)
+    data = record("generate_dataset", lambda: synthetic.make_dataset(seed=seed, **size))
+    n_rows = {table: len(rows) for table, rows in data.items()}
+    engine = record(
+        "load_db",
+        functools.partial(synthetic.load_dataset, data, engine=engine),
+        rows=sum(n_rows.values()),
+        repeatable=False,
+    )
+    del data
+    conn = engine.connect()
+
+    wim = record(
+        "Wimbledon.__init__",
+        lambda: Wimbledon(conn=conn, with_tracked_time=True),
+        rows=n_rows["assignments"] + n_rows["time_entries"],
+    )
+    for stage in wim.build_profile.to_records():
+        results.append(
+            dict(
+                scale=scale,
+                step="Wimbledon.__init__/" + stage.pop("stage"),
+                **stage,
+            )
+        )
+
+    # use a window in the middle of the data, as would be done for "today"
+    start = pd.Timestamp(wim.date_range_workdays[0])
+    end = pd.Timestamp(wim.date_range_workdays[-1])
+    today = start + (end - start) / 2
+    start_date = today - timedelta(days=30)
+    end_date = today + timedelta(days=548)
+
+    vis = Visualise(wim=wim, start_date=start_date, end_date=end_date)
+    unavail_client = wim.get_client_id("UNAVAILABLE")
+    unavail_projects = [
+        wim.get_project_name(idx) for idx in wim.get_client_projects(unavail_client)
+    ]
+
+    for key_type in ["project", "person"]:
+        sheet = record(
+            "whiteboard_" + key_type,
+            lambda: wim.whiteboard(key_type, start_date, end_date, "MS"),
+            rows=n_rows["assignments"],
+        )
+        record(
+            "make_whiteboard_" + key_type,
+            lambda: HTMLWriter.make_whiteboard(
+                sheet, key_type, "screen", unavail_projects=unavail_projects
+            ),
+            rows=sheet.shape[0],
+        )
+
+    preference_data = make_preference_data(wim, start_date, end_date, seed=seed)
+    record(
+        "make_preferences_table",
+        lambda: pref.make_preferences_table(
+            wim, preference_data, first_date=start_date, last_date=end_date
+        ),
+        rows=preference_data.size,
+    )
+
+    def plot():
+        vis.plot_demand_vs_capacity(
+            start_date=start_date, end_date=end_date, freq="W-MON", today=today
+        )
+        plt.close("all")
+
+    record("plot_demand_vs_capacity", plot, rows=n_rows["assignments"])
+
+    conn.close()
+
+    return results
+
+
+def run(
+    scales=DEFAULT_SCALES,
+    base_size=BASE_SIZE,
+    report_path=None,
+    engine_factory=None,
+    memory=True,
+    seed=0,
+):
+    """Benchmark every step at each scale and optionally save a json report.
+
+    Keyword Arguments:
+        scales {list} -- multiples of base_size to run (default: {[1, 10, 100]})
+        base_size {dict} -- make_dataset arguments for scale 1 (default: BASE_SIZE)
+        report_path {str} -- save the report as json to this path (default: {None})
+        engine_factory {callable} -- returns a new, empty sqlalchemy engine for each
+        scale. If None use an in-memory SQLite database (default: {None})
+        memory {bool} -- whether to measure peak memory (default: {True})
+        seed {int} -- random seed for the synthetic data (default: {0})
+
+    Returns:
+        dict -- the report
+    """
+    report = new_report(base_size=base_size)
+
+    for scale in scales:
+        engine = None if engine_factory is None else engine_factory()
+        report["results"] += run_scale(
+            scale, base_size=base_size, engine=engine, memory=memory, seed=seed
+        )
+        save_report(report, report_path)
+
+    return report
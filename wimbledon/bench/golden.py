@@ -0,0 +1,307 @@
+"""
+Golden output harness for checking that changes to the Wimbledon model (e.g.
+_get_allocations, _get_tracking, whiteboard or the placeholder logic) leave its
+outputs unchanged.
+
+A Wimbledon is built from a fixed synthetic dataset (see synthetic.py) loaded into
+an in-memory SQLite database, every public derived table is serialised to a json
+snapshot, and snapshots are compared with numeric tolerances. Typical use:
+
+    save_snapshot("golden.json")         # before making changes
+    check_snapshot("golden.json")        # after making changes
+
+or compare two implementations directly, including build times:
+
+    compare(Wimbledon, MyFasterWimbledon)
+"""
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from wimbledon import Wimbledon
+from wimbledon.bench import synthetic
+
+# derived attributes of Wimbledon which are dataframes/series or dicts of them
+MODEL_TABLES = [
+    "people_allocations",
+    "people_totals",
+    "peoplereq_allocations",
+    "unconfirmed_allocations",
+    "deferred_allocations",
+    "people_capacities",
+    "team_capacity",
+    "people_free_capacity",
+    "project_allocations",
+    "project_confirmed",
+    "project_unconfirmed",
+    "project_deferred",
+    "project_peoplereq",
+    "project_notfunded",
+    "project_allocated",
+]
+
+TRACKING_TABLES = [
+    "tracked_project_tasks",
+    "tracked_project_people",
+    "tracked_person_projects",
+    "tracked_person_tasks",
+    "tracked_project_totals",
+    "tracked_person_totals",
+    "tracked_task_totals",
+    "tracked_person_clients",
+    "tracked_client_totals",
+]
+
+WHITEBOARD_FREQS = ["MS", "W-MON"]
+
+
+def build_golden_db(**dataset_kwargs):
+    """Load the fixed synthetic dataset (make_dataset defaults, unless overridden by
+    dataset_kwargs) into an in-memory SQLite database and return a connection to
+    it."""
+    data = synthetic.make_dataset(**dataset_kwargs)
+    return synthetic.load_dataset(data).connect()
+
+
+def _label(value):
+    """Convert an index/column label to a string."""
+    if isinstance(value, tuple):
+        return "|".join(_label(v) for v in value)
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return str(value)
+
+
+def _value(value):
+    """Convert a cell value to something json serialisable, with all numbers as
+    floats and missing values as None."""
+    if value is None:
+        return None
+    if isinstance(value, (bool, np.bool_, int, float, np.number)):
+        return None if np.isnan(value) else float(value)
+    return str(value)
+
+
+def frame_to_dict(df):
+    """Serialise a dataframe or series to a dict of labels and values."""
+    if isinstance(df, pd.Series):
+        df = df.to_frame()
+
+    return {
+        "index": [_label(idx) for idx in df.index],
+        "columns": [_label(col) for col in df.columns],
+        "values": [[_value(v) for v in row] for row in df.to_numpy(dtype=object)],
+    }
+
+
+def snapshot(wim, whiteboard_window=None):
+    """Serialise every public derived table of a Wimbledon.
+
+    Arguments:
+        wim {Wimbledon} -- model to snapshot
+
+    Keyword Arguments:
+        whiteboard_window {tuple} -- (start_date, end_date) of the whiteboard
+        sheets. Default is the whole date range of the model, so snapshots don't
+        depend on today's date. (default: {None})
+
+    Returns:
+        dict -- {table name: serialised frame}, where dicts of frames (e.g.
+        people_allocations) are stored as one entry per key, <table name>/<key>
+    """
+    tables = MODEL_TABLES
+    if hasattr(wim, "time_entries"):
+        tables = tables + TRACKING_TABLES
+
+    result = {}
+    for name in tables:
+        table = getattr(wim, name)
+        if isinstance(table, dict):
+            for key, df in table.items():
+                result[name + "/" + _label(key)] = frame_to_dict(df)
+        else:
+            result[name] = frame_to_dict(table)
+
+    if whiteboard_window is None:
+        whiteboard_window = (wim.date_range_workdays[0], wim.date_range_workdays[-1])
+
+    for key_type in ["project", "person"]:
+        for freq in WHITEBOARD_FREQS:
+            sheet = wim.whiteboard(key_type, *whiteboard_window, freq)
+            result["whiteboard/" + key_type + "/" + freq] = frame_to_dict(sheet)
+
+    return result
+
+
+def _align(expected, actual):
+    """Positions of the labels in expected within actual, or None if the labels
+    aren't unique or don't match."""
+    if len(set(actual)) != len(actual) or set(expected) != set(actual):
+        return None
+    positions = {label: i for i, label in enumerate(actual)}
+    return [positions[label] for label in expected]
+
+
+def diff_frames(expected, actual, rtol=1e-7, atol=1e-9, max_examples=5):
+    """Compare two serialised frames, ignoring the order of rows and columns.
+
+    Returns:
+        list -- descriptions of the differences (empty if the frames match)
+    """
+    differences = []
+    rows = _align(expected["index"], actual["index"])
+    cols = _align(expected["columns"], actual["columns"])
+
+    for axis, positions in [("index", rows), ("columns", cols)]:
+        if positions is None:
+            missing = set(expected[axis]) - set(actual[axis])
+            extra = set(actual[axis]) - set(expected[axis])
+            differences.append(
+                "{} differs: {} missing, {} extra, e.g. missing {} extra {}".format(
+                    axis,
+                    len(missing),
+                    len(extra),
+                    sorted(missing)[:max_examples],
+                    sorted(extra)[:max_examples],
+                )
+            )
+    if len(differences) > 0:
+        return differences
+
+    exp_values = np.array(expected["values"], dtype=object).reshape(
+        len(expected["index"]), len(expected["columns"])
+    )
+    act_values = np.array(actual["values"], dtype=object).reshape(
+        len(actual["index"]), len(actual["columns"])
+    )
+    act_values = act_values[rows][:, cols]
+
+    mismatches = []
+    for (i, j), exp in np.ndenumerate(exp_values):
+        act = act_values[i, j]
+        if isinstance(exp, float) and isinstance(act, float):
+            equal = np.isclose(exp, act, rtol=rtol, atol=atol)
+        else:
+            equal = exp == act
+        if not equal:
+            mismatches.append((expected["index"][i], expected["columns"][j], exp, act))
+
+    if len(mismatches) > 0:
+        differences.append(
+            "{} values differ, e.g. (row, column, expected, actual): {}".format(
+                len(mismatches), mismatches[:max_examples]
+            )
+        )
+
+    return differences
+
+
+def diff_snapshots(expected, actual, rtol=1e-7, atol=1e-9):
+    """Compare two snapshots.
+
+    Returns:
+        dict -- {table name: list of differences} for each table that differs
+    """
+    differences = {}
+    for name in sorted(set(expected) | set(actual)):
+        if name not in actual:
+            differences[name] = ["missing"]
+        elif name not in expected:
+            differences[name] = ["unexpected table"]
+        else:
+            table_diff = diff_frames(expected[name], actual[name], rtol, atol)
+            if len(table_diff) > 0:
+                differences[name] = table_diff
+
+    return differences
+
+
+def time_build(model_cls=Wimbledon, conn=None, repeats=3, **kwargs):
+    """Build model_cls(conn=conn, **kwargs) repeats times.
+
+    Returns:
+        tuple -- (last model built, list of build times in seconds)
+    """
+    if conn is None:
+        conn = build_golden_db()
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        wim = model_cls(conn=conn, **kwargs)
+        times.append(time.perf_counter() - start)
+
+    return wim, times
+
+
+def save_snapshot(path, model_cls=Wimbledon, conn=None, with_tracked_time=True):
+    """Build model_cls from the golden dataset and save its snapshot to path."""
+    wim, _ = time_build(
+        model_cls, conn=conn, repeats=1, with_tracked_time=with_tracked_time
+    )
+    with open(path, "w") as f:
+        json.dump(snapshot(wim), f)
+
+
+def check_snapshot(
+    path, model_cls=Wimbledon, conn=None, with_tracked_time=True, rtol=1e-7, atol=1e-9
+):
+    """Build model_cls from the golden dataset and compare its snapshot with the one
+    saved at path.
+
+    Returns:
+        dict -- {table name: list of differences}, empty if everything matches
+    """
+    with open(path, "r") as f:
+        expected = json.load(f)
+
+    wim, _ = time_build(
+        model_cls, conn=conn, repeats=1, with_tracked_time=with_tracked_time
+    )
+    return diff_snapshots(expected, snapshot(wim), rtol=rtol, atol=atol)
+
+
+def compare(
+    reference_cls=Wimbledon,
+    candidate_cls=Wimbledon,
+    conn=None,
+    repeats=3,
+    with_tracked_time=True,
+    rtol=1e-7,
+    atol=1e-9,
+):
+    """Build a reference and a candidate implementation on the golden dataset, time
+    both builds and compare their outputs.
+
+    Returns:
+        dict -- with keys reference_times and candidate_times (lists of build times
+        in seconds), and differences (as returned by diff_snapshots)
+    """
+    if conn is None:
+        conn = build_golden_db()
+
+    ref, ref_times = time_build(
+        reference_cls, conn=conn, repeats=repeats, with_tracked_time=with_tracked_time
+    )
+    cand, cand_times = time_build(
+        candidate_cls, conn=conn, repeats=repeats, with_tracked_time=with_tracked_time
+    )
+
+    return {
+        "reference_times": ref_times,
+        "candidate_times": cand_times,
+        "differences": diff_snapshots(
+            snapshot(ref), snapshot(cand), rtol=rtol, atol=atol
+        ),
+    }
+
+
+def print_differences(differences):
+    if len(differences) == 0:
+        print("All tables match.")
+    for name, table_diff in differences.items():
+        print(name)
+        for diff in table_diff:
+            print("    " + diff)
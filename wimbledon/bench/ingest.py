@@ -0,0 +1,150 @@
+"""
+Time the ingestion path: extracting every Harvest and Forecast table from their
+APIs with get_harvest and get_forecast, a full sync into a database with update_db,
+and getting the GitHub reactions of the projects' issues with get_reactions,
+through whichever transport is installed - normally a ReplayTransport (see
+wimbledon.replay), so runs are reproducible and need no credentials or network
+connection.
+"""
+import tempfile
+import time
+
+import wimbledon.config
+import wimbledon.sql.db_utils as db_utils
+from wimbledon.bench.report import new_report, save_report
+from wimbledon.github.preferences_availability import get_reactions
+from wimbledon.harvest import api_interface, db_interface, pagination, scheduler
+from wimbledon.http_cache import get_response_cache
+from wimbledon.transport import get_transport
+
+
+def sync_db(with_tracked_time=True):
+    """Full sync (update_db) into an empty in-memory SQLite database.
+
+    Returns:
+        dict -- {table name: rows in the database} of the synced tables
+    """
+    from wimbledon.bench.sync import SYNC_TABLES, make_engine
+
+    engine = make_engine()
+    # keep the sync's checkpoints out of ~/.wimbledon
+    checkpoint_dir = wimbledon.config.CHECKPOINT_DIR
+    wimbledon.config.CHECKPOINT_DIR = tempfile.mkdtemp()
+    try:
+        db_interface.update_db(
+            conn=engine.connect(), with_tracked_time=with_tracked_time, full_sync=True
+        )
+    finally:
+        wimbledon.config.CHECKPOINT_DIR = checkpoint_dir
+
+    with engine.connect() as conn:
+        return {table.name: db_utils.count_rows(table, conn) for table in SYNC_TABLES}
+
+
+def github_reactions(fc_projects):
+    """Get the reactions to the GitHub issues of forecast projects, in one query as
+    the preferences table does (see preferences_availability.get_preference_data).
+
+    Returns:
+        dict -- {"reactions": number of reactions}
+    """
+    issues = db_interface.extract_github_issues(fc_projects)["github"].dropna()
+    token = wimbledon.config.get_github_credentials()["token"]
+
+    reactions = get_reactions(token, sorted(issues.astype(int).unique().tolist()))
+    return {"reactions": sum(len(df) for df in reactions.values())}
+
+
+def run(
+    with_tracked_time=True,
+    run_harvest=True,
+    run_forecast=True,
+    run_update=True,
+    run_github=True,
+    report_path=None,
+):
+    """Extract all Harvest and/or Forecast tables, sync them into a database and get
+    the GitHub reactions to the projects, recording the wall time, rows fetched and
+    HTTP requests made by each step, and optionally save a json report.
+
+    Keyword Arguments:
+        with_tracked_time {bool} -- include Harvest time entries (default: {True})
+        run_harvest {bool} -- extract the Harvest tables (default: {True})
+        run_forecast {bool} -- extract the Forecast tables (default: {True})
+        run_update {bool} -- time a full update_db into an in-memory SQLite
+        database (default: {True})
+        run_github {bool} -- time get_reactions for the GitHub issues of the
+        Forecast projects, only if run_forecast is True (default: {True})
+        report_path {str} -- save the report as json to this path (default: {None})
+
+    Returns:
+        dict -- the report
+    """
+    report = new_report(
+        transport=type(get_transport()).__name__,
+        page_workers=pagination.DEFAULT_WORKERS,
+        table_workers=scheduler.DEFAULT_WORKERS,
+    )
+
+    # tables extracted by earlier steps
+    data = {}
+
+    def extract(source, get):
+        data[source] = get()
+        return {table: len(df) for table, df in data[source].items()}
+
+    steps = []
+    if run_harvest:
+        steps.append(
+            (
+                "harvest",
+                lambda: extract(
+                    "harvest", lambda: api_interface.get_harvest(with_tracked_time)
+                ),
+            )
+        )
+    if run_forecast:
+        steps.append(
+            ("forecast", lambda: extract("forecast", api_interface.get_forecast))
+        )
+    if run_update:
+        steps.append(("update_db", lambda: sync_db(with_tracked_time)))
+    if run_github and run_forecast:
+        steps.append(("github", lambda: github_reactions(data["forecast"]["projects"])))
+
+    for name, step in steps:
+        get_transport().reset_stats()
+        get_response_cache().reset_stats()
+
+        start = time.perf_counter()
+        n_rows = step()
+        seconds = time.perf_counter() - start
+
+        requests = get_transport().stats()
+        n_requests = sum(host["requests"] for host in requests.values())
+
+        report["results"].append(
+            {
+                "step": name,
+                "seconds": seconds,
+                "rows": n_rows,
+                "requests": n_requests,
+                "requests_per_second": n_requests / seconds if seconds > 0 else None,
+                "rows_per_second": sum(n_rows.values()) / seconds
+                if seconds > 0
+                else None,
+                "hosts": requests,
+                "cache": get_response_cache().stats(),
+            }
+        )
+        print("-" * 50)
+        print(
+            "{}: {:.2f}s, {:d} requests, {:d} rows".format(
+                name, seconds, n_requests, sum(n_rows.values())
+            )
+        )
+        print(get_transport().summary())
+
+    save_report(report, report_path)
+
+    return report
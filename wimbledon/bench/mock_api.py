@@ -0,0 +1,406 @@
+"""
+Local stand-in for the Harvest v2 and Forecast APIs, serving a synthetic dataset
+(see synthetic.py) at any scale, to load-test the sync without credentials.
+
+The server implements the endpoints and query parameters api_interface uses:
+Harvest pagination (page, per_page, total_pages and links.next etc.), time entry
+from/to and updated_since filters, Forecast assignment date ranges, and ETag /
+If-None-Match. It can add latency to every response and enforce a rate limit,
+replying 429 with a Retry-After header to requests over the limit.
+
+    with MockAPIServer(make_dataset(), latency=0.1, max_requests=100, period=15) as api:
+        with api.installed():
+            update_db(conn=conn)
+"""
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from wimbledon.harvest import api_interface
+from wimbledon.harvest.db_interface import association_groups
+from wimbledon.harvest.rate_limit import ServerRateLimit, format_retry_after
+
+# Harvest's default (and our) page size
+PER_PAGE = 100
+
+# updated_at of every synthetic time entry
+UPDATED_AT = "2021-01-01T00:00:00Z"
+
+# forecast ids of clients, people and projects are their harvest ids plus this, as
+# in forecast they're different objects (linked by harvest_id)
+FORECAST_ID_OFFSET = 500000
+
+ROLE_NAMES = {idx: name for name, idx in association_groups.items()}
+
+
+def iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def api_records(data):
+    """Convert a synthetic dataset (as returned by synthetic.make_dataset) into the
+    json records the Harvest and Forecast APIs would return.
+
+    Returns:
+        dict -- {"harvest": {table: records}, "forecast": {table: records}}
+    """
+    people = [person for person in data["people"] if person["capacity"] is not None]
+    placeholders = [person for person in data["people"] if person["capacity"] is None]
+    placeholder_ids = {person["id"] for person in placeholders}
+    clients = {client["id"]: client for client in data["clients"]}
+
+    def split_name(name):
+        first, _, last = name.partition(" ")
+        return first, last
+
+    harvest = {
+        "clients": [{"id": c["id"], "name": c["name"]} for c in data["clients"]],
+        "users": [
+            {
+                "id": p["id"],
+                "first_name": split_name(p["name"])[0],
+                "last_name": split_name(p["name"])[1],
+                "roles": [ROLE_NAMES[p["association"]]],
+                "is_active": True,
+                "weekly_capacity": p["capacity"],
+            }
+            for p in people
+        ],
+        "projects": [
+            {
+                "id": p["id"],
+                "name": p["name"],
+                "client": {"id": p["client"], "name": clients[p["client"]]["name"]},
+                "starts_on": iso(p["start_date"]),
+                "ends_on": iso(p["end_date"]),
+            }
+            for p in data["projects"]
+        ],
+        "roles": [{"id": idx, "name": name} for idx, name in ROLE_NAMES.items()],
+        "tasks": [{"id": t["id"], "name": t["name"]} for t in data.get("tasks", [])],
+        "time_entries": [
+            {
+                "id": e["id"],
+                "spent_date": iso(e["date"]),
+                "hours": e["hours"],
+                "project": {"id": e["project"]},
+                "user": {"id": e["person"]},
+                "task": {"id": e["task"]},
+                "updated_at": UPDATED_AT,
+            }
+            for e in data.get("time_entries", [])
+        ],
+        "user_assignments": [],
+        "task_assignments": [],
+    }
+
+    forecast = {
+        "clients": [
+            {
+                "id": c["id"] + FORECAST_ID_OFFSET,
+                "name": c["name"],
+                "harvest_id": c["id"],
+            }
+            for c in data["clients"]
+        ],
+        "people": [
+            {
+                "id": p["id"] + FORECAST_ID_OFFSET,
+                "first_name": split_name(p["name"])[0],
+                "last_name": split_name(p["name"])[1],
+                "roles": [ROLE_NAMES[p["association"]]],
+                "archived": False,
+                "weekly_capacity": p["capacity"],
+                "harvest_user_id": p["id"],
+            }
+            for p in people
+        ],
+        "placeholders": [
+            {"id": p["id"], "name": p["name"], "roles": []} for p in placeholders
+        ],
+        "projects": [
+            {
+                "id": p["id"] + FORECAST_ID_OFFSET,
+                "name": p["name"],
+                "client_id": p["client"] + FORECAST_ID_OFFSET,
+                "start_date": iso(p["start_date"]),
+                "end_date": iso(p["end_date"]),
+                "code": "hut23-{}".format(p["github"])
+                if p["github"] is not None
+                else None,
+                "tags": [],
+                "harvest_id": p["id"],
+            }
+            for p in data["projects"]
+        ],
+        "roles": [{"id": idx, "name": name} for idx, name in ROLE_NAMES.items()],
+        "milestones": [],
+        "assignments": [
+            {
+                "id": a["id"],
+                "project_id": a["project"] + FORECAST_ID_OFFSET,
+                "person_id": None
+                if a["person"] in placeholder_ids
+                else a["person"] + FORECAST_ID_OFFSET,
+                "placeholder_id": a["person"]
+                if a["person"] in placeholder_ids
+                else None,
+                "start_date": iso(a["start_date"]),
+                "end_date": iso(a["end_date"]),
+                "allocation": a["allocation"],
+            }
+            for a in data["assignments"]
+        ],
+    }
+
+    return {"harvest": harvest, "forecast": forecast}
+
+
+class MockAPIServer:
+    def __init__(
+        self,
+        data,
+        latency=0.0,
+        jitter=0.0,
+        max_requests=None,
+        period=None,
+        per_page=PER_PAGE,
+        port=0,
+    ):
+        """HTTP server for the Harvest (under /harvest/v2/) and Forecast (under
+        /forecast/) APIs, run in a background thread. Use as a context manager, or
+        call start() and stop().
+
+        Arguments:
+            data {dict} -- synthetic dataset, as returned by synthetic.make_dataset
+
+        Keyword Arguments:
+            latency {float} -- seconds to wait before each response (default: {0.0})
+            jitter {float} -- add a random extra wait of up to jitter seconds to
+            each response (default: {0.0})
+            max_requests {int} -- max requests to each API per period seconds, more
+            get 429 responses (default: {None}, no limit)
+            period {float} -- length of the rate limit period in seconds (default:
+            {None})
+            per_page {int} -- default number of records per Harvest page (default:
+            {100})
+            port {int} -- port to listen on, 0 to pick a free one (default: {0})
+        """
+        self.records = api_records(data)
+        self.latency = latency
+        self.jitter = jitter
+        self.max_requests = max_requests
+        self.period = period
+        self.per_page = per_page
+
+        self.requests = collections.Counter()
+        self.server_limit = None
+        if max_requests is not None:
+            self.server_limit = ServerRateLimit(max_requests, period)
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}/".format(self.httpd.server_port)
+
+    @property
+    def harvest_url(self):
+        return self.url + "harvest/v2/"
+
+    @property
+    def forecast_url(self):
+        return self.url + "forecast/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @contextlib.contextmanager
+    def installed(self):
+        """Point api_interface at this server (and give it dummy credentials) until
+        the end of the with block."""
+        urls = (api_interface.HARVEST_API_URL, api_interface.FORECAST_API_URL)
+        env = {
+            name: os.environ.get(name)
+            for name in [
+                "HARVEST_ACCOUNT_ID",
+                "FORECAST_ACCOUNT_ID",
+                "HARVEST_ACCESS_TOKEN",
+            ]
+        }
+
+        api_interface.HARVEST_API_URL = self.harvest_url
+        api_interface.FORECAST_API_URL = self.forecast_url
+        for name in env:
+            os.environ[name] = "mock"
+        try:
+            yield self
+        finally:
+            api_interface.HARVEST_API_URL, api_interface.FORECAST_API_URL = urls
+            for name, value in env.items():
+                if value is None:
+                    del os.environ[name]
+                else:
+                    os.environ[name] = value
+
+    def throttle(self, service):
+        """Seconds until a request to service is within the rate limit (0 if it is,
+        in which case the request is counted)."""
+        if self.server_limit is None:
+            return 0
+        return self.server_limit.throttle(service)
+
+    def handle(self, request):
+        url = urlparse(request.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        service, _, path = url.path.strip("/").partition("/")
+
+        with self._lock:
+            self.requests[service] += 1
+
+        wait = self.throttle(service)
+        if wait > 0:
+            with self._lock:
+                self.requests["429"] += 1
+            request.send_response(429)
+            request.send_header("Retry-After", format_retry_after(wait))
+            request.send_header("Content-Length", "0")
+            request.end_headers()
+            return
+
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        if service == "harvest":
+            body = self.harvest_response(path.replace("v2/", "", 1), params)
+        elif service == "forecast":
+            body = self.forecast_response(path, params)
+        else:
+            body = None
+
+        if body is None:
+            request.send_response(404)
+            request.send_header("Content-Length", "0")
+            request.end_headers()
+            return
+
+        content = json.dumps(body).encode()
+        etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+        if request.headers.get("If-None-Match") == etag:
+            request.send_response(304)
+            request.send_header("ETag", etag)
+            request.end_headers()
+            return
+
+        request.send_response(200)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(content)))
+        request.send_header("ETag", etag)
+        request.end_headers()
+        request.wfile.write(content)
+
+    def harvest_response(self, table, params):
+        if table == "users/me":
+            return {
+                "id": 1,
+                "first_name": "Mock",
+                "last_name": "User",
+                "email": "mock@example.com",
+            }
+        if table not in self.records["harvest"]:
+            return None
+
+        records = self.records["harvest"][table]
+        if table == "time_entries":
+            if "from" in params:
+                records = [r for r in records if r["spent_date"] >= params["from"]]
+            if "to" in params:
+                records = [r for r in records if r["spent_date"] <= params["to"]]
+            if "updated_since" in params:
+                records = [
+                    r for r in records if r["updated_at"] > params["updated_since"]
+                ]
+
+        per_page = int(params.get("per_page", self.per_page))
+        page = int(params.get("page", 1))
+        total_pages = max(1, -(-len(records) // per_page))
+
+        def link(page_number):
+            if page_number < 1 or page_number > total_pages:
+                return None
+            return (
+                self.harvest_url
+                + table
+                + "?"
+                + urlencode({**params, "page": page_number, "per_page": per_page})
+            )
+
+        return {
+            table: records[(page - 1) * per_page : page * per_page],
+            "per_page": per_page,
+            "total_pages": total_pages,
+            "total_entries": len(records),
+            "next_page": page + 1 if page < total_pages else None,
+            "previous_page": page - 1 if page > 1 else None,
+            "page": page,
+            "links": {
+                "first": link(1),
+                "next": link(page + 1),
+                "previous": link(page - 1),
+                "last": link(total_pages),
+            },
+        }
+
+    def forecast_response(self, table, params):
+        if table == "whoami":
+            return {
+                "current_user": {
+                    "id": 1,
+                    "first_name": "Mock",
+                    "last_name": "User",
+                    "email": "mock@example.com",
+                }
+            }
+        if table not in self.records["forecast"]:
+            return None
+
+        records = self.records["forecast"][table]
+        if table == "assignments":
+            if "start_date" in params:
+                records = [r for r in records if r["end_date"] >= params["start_date"]]
+            if "end_date" in params:
+                records = [r for r in records if r["start_date"] <= params["end_date"]]
+
+        return {table: records}
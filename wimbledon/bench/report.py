@@ -0,0 +1,45 @@
+"""
+Json reports of the benchmarks (benchmark.py, sync.py and ingest.py), and parsing
+the options of the scripts that run them.
+"""
+import json
+import platform
+from datetime import datetime
+
+import pandas as pd
+
+
+def new_report(**settings):
+    """Empty report: when and with which versions of Python and pandas it was
+    made, the benchmark's settings, and an empty list of results."""
+    return {
+        "created": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        **settings,
+        "results": [],
+    }
+
+
+def save_report(report, report_path):
+    """Save report as json to report_path (if it isn't None). Benchmarks call this
+    after each scale so a slow/failing large scale doesn't lose the results so
+    far."""
+    if report_path is not None:
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def parse_options(args):
+    """{key: value} of key=value command line arguments"""
+    return dict(arg.split("=", 1) for arg in args if "=" in arg)
+
+
+def parse_limit(options):
+    """(max_requests, period) of a limit=max_requests/period option, or (None,
+    None) if there isn't one."""
+    if "limit" not in options:
+        return None, None
+
+    max_requests, period = options["limit"].split("/")
+    return int(max_requests), float(period)
@@ -0,0 +1,182 @@
+"""
+Benchmark the sync (db_interface.update_db) end to end against the mock Harvest and
+Forecast APIs (see mock_api.py), on synthetic teams of increasing size and with
+artificial latency and rate limits, to find how its throughput scales.
+
+Each scale runs a full sync into an empty in-memory SQLite database followed by an
+incremental sync, recording the wall time, requests made (and throttled) and rows
+in the database.
+"""
+import contextlib
+import tempfile
+import time
+from datetime import date, timedelta
+
+import sqlalchemy as sqla
+
+import wimbledon.config
+import wimbledon.sql.db_utils as db_utils
+import wimbledon.sql.schema as schema
+from wimbledon.bench import synthetic
+from wimbledon.bench.benchmark import BASE_SIZE, scaled_size
+from wimbledon.bench.mock_api import MockAPIServer
+from wimbledon.bench.report import new_report, save_report
+from wimbledon.harvest import rate_limit
+from wimbledon.harvest.db_interface import update_db
+from wimbledon.http_cache import ResponseCache, set_response_cache
+from wimbledon.transport import get_transport
+
+DEFAULT_SCALES = [1, 10]
+
+SYNC_TABLES = [
+    schema.clients,
+    schema.people,
+    schema.projects,
+    schema.assignments,
+    schema.time_entries,
+]
+
+
+def enable_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def make_engine():
+    """Empty in-memory SQLite database with the wimbledon schema, shareable between
+    the sync's threads. Foreign keys are enforced (SQLite doesn't by default), as
+    they are in postgres, so the sync fails if it writes rows before the rows they
+    reference."""
+    engine = db_utils.get_memory_engine()
+    sqla.event.listen(engine, "connect", enable_foreign_keys)
+    schema.metadata.create_all(engine)
+    return engine
+
+
+def run_scale(
+    scale,
+    base_size=BASE_SIZE,
+    latency=0.0,
+    max_requests=None,
+    period=None,
+    client_limits=True,
+    seed=0,
+):
+    """Benchmark a full and an incremental sync at one scale.
+
+    Keyword Arguments:
+        latency {float} -- seconds the mock API waits before each response
+        (default: {0.0})
+        max_requests, period {numeric} -- rate limit of the mock APIs (default:
+        {None}, no limit)
+        client_limits {bool} -- whether to use the real Harvest and Forecast rate
+        limits in the client. If False only the mock API's limit applies (default:
+        {True})
+
+    Returns:
+        list -- one dict per sync with keys scale, step, seconds, requests,
+        throttled, rows, requests_per_second and rows_per_second
+    """
+    # data spanning today, so the incremental sync's assignment window has data
+    years = base_size["years"]
+    size = scaled_size(scale, base_size)
+    data = synthetic.make_dataset(
+        seed=seed, start_date=date.today() - timedelta(days=365 * years // 2), **size
+    )
+    engine = make_engine()
+
+    # keep the benchmark's checkpoints and cached responses out of ~/.wimbledon
+    checkpoint_dir = wimbledon.config.CHECKPOINT_DIR
+    wimbledon.config.CHECKPOINT_DIR = tempfile.mkdtemp()
+    previous_cache = set_response_cache(ResponseCache(tempfile.mkdtemp()))
+    limiters = contextlib.nullcontext() if client_limits else rate_limit.unlimited()
+
+    results = []
+    try:
+        with MockAPIServer(
+            data, latency=latency, max_requests=max_requests, period=period
+        ) as api, api.installed(), limiters:
+            for step, full_sync in [("full_sync", True), ("incremental_sync", False)]:
+                get_transport().reset_stats()
+                n_requests = sum(api.requests.values()) - api.requests["429"]
+                n_throttled = api.requests["429"]
+
+                start = time.perf_counter()
+                update_db(conn=engine.connect(), full_sync=full_sync)
+                seconds = time.perf_counter() - start
+
+                requests = sum(api.requests.values()) - api.requests["429"] - n_requests
+                throttled = api.requests["429"] - n_throttled
+                with engine.connect() as conn:
+                    rows = {
+                        table.name: db_utils.count_rows(table, conn)
+                        for table in SYNC_TABLES
+                    }
+
+                results.append(
+                    {
+                        "scale": scale,
+                        "step": step,
+                        "seconds": seconds,
+                        "requests": requests,
+                        "throttled": throttled,
+                        "rows": rows,
+                        "requests_per_second": requests / seconds,
+                        "rows_per_second": sum(rows.values()) / seconds,
+                    }
+                )
+                print(
+                    "scale {:>5}  {:<18} {:>8.2f}s {:>6d} requests {:>5d} throttled "
+                    "{:>8d} rows".format(
+                        scale, step, seconds, requests, throttled, sum(rows.values())
+                    ),
+                    flush=True,
+                )
+    finally:
+        wimbledon.config.CHECKPOINT_DIR = checkpoint_dir
+        set_response_cache(previous_cache)
+
+    return results
+
+
+def run(
+    scales=DEFAULT_SCALES,
+    base_size=BASE_SIZE,
+    report_path=None,
+    latency=0.0,
+    max_requests=None,
+    period=None,
+    client_limits=True,
+    seed=0,
+):
+    """Benchmark the sync at each scale and optionally save a json report. See
+    run_scale for the other arguments.
+
+    Keyword Arguments:
+        scales {list} -- multiples of base_size to run (default: {[1, 10]})
+        report_path {str} -- save the report as json to this path (default: {None})
+
+    Returns:
+        dict -- the report
+    """
+    report = new_report(
+        base_size=base_size,
+        latency=latency,
+        server_limit=[max_requests, period],
+        client_limits=client_limits,
+    )
+
+    for scale in scales:
+        report["results"] += run_scale(
+            scale,
+            base_size=base_size,
+            latency=latency,
+            max_requests=max_requests,
+            period=period,
+            client_limits=client_limits,
+            seed=seed,
+        )
+        save_report(report, report_path)
+
+    return report
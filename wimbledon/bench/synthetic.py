@@ -0,0 +1,283 @@
+"""
+Generate synthetic Forecast/Harvest-like data in the format of the wimbledon
+database schema, and load it into a (local) database. Used to build Wimbledon
+objects without credentials or the production database, e.g. for the golden
+output harness.
+"""
+import random
+from datetime import date, timedelta
+
+import wimbledon.sql.db_utils as db_utils
+import wimbledon.sql.schema as schema
+from wimbledon.harvest.db_interface import association_groups
+from wimbledon.sql.query_db import PLACEHOLDER_NAMES
+
+# clients and projects Wimbledon and Visualise look up by name
+SPECIAL_CLIENTS = [
+    "UNAVAILABLE",
+    "REG Strategy and Operations",
+    "REG Service Areas",
+    "REG Support to Turing",
+    "REG Development Work",
+    "Turing Service Areas",
+    "Research Computing",
+]
+UNAVAILABLE_PROJECTS = ["Annual Leave", "Sick Leave", "Training"]
+RESERVE_PROJECT = "REG Reserve"
+
+TASKS = ["Development", "Meetings", "Management", "Support"]
+
+# allocations of assignments, as fractions of a full time person
+FTE_CHOICES = [0.2, 0.4, 0.5, 0.6, 1.0]
+
+# allocations that are multiples of 1/4 FTE, so sums of them are exact (demand vs
+# capacity plots can't stack tiny negative values from rounding errors)
+QUARTER_FTE_CHOICES = [0.25, 0.5, 0.75, 1.0]
+
+# seconds in a nominal 8 hour day - Forecast allocations are in seconds per day
+DAY_SECONDS = 8 * 60 * 60
+
+
+def make_dataset(
+    n_people=15,
+    n_projects=20,
+    n_programmes=4,
+    n_placeholders=0,
+    assignments_per_project=3,
+    churn=1,
+    fte_choices=FTE_CHOICES,
+    reserve_client="REG Strategy and Operations",
+    start_date=date(2020, 1, 6),
+    years=2,
+    entries_per_week=3,
+    with_tracked_time=True,
+    seed=0,
+):
+    """Generate a synthetic wimbledon dataset.
+
+    Keyword Arguments:
+        n_people {int} -- number of people, excluding placeholders (default: {15})
+        n_projects {int} -- number of (non-special) projects (default: {20})
+        n_programmes {int} -- number of programme clients for projects (default: {4})
+        n_placeholders {int} -- number of placeholders in addition to the merged
+        placeholders (PEOPLE REQUIRED etc.) (default: {0})
+        assignments_per_project {int} -- mean number of assignments per project
+        (default: {3})
+        churn {int} -- number of consecutive pieces each assignment is split into,
+        each with a different allocation, to mimic assignments that are edited
+        often (default: {1})
+        fte_choices {list} -- allocations to choose from for assignments, as
+        fractions of a full time person (default: {FTE_CHOICES})
+        reserve_client {str} -- client of the REG Reserve project, added to the
+        special clients if it isn't one of them (default: {"REG Strategy and
+        Operations"})
+        start_date {date} -- first date in the data (default: {date(2020, 1, 6)})
+        years {numeric} -- length of the data in years (default: {2})
+        entries_per_week {int} -- time entries per person per week (default: {3})
+        with_tracked_time {bool} -- whether to generate tasks and time entries
+        (default: {True})
+        seed {int} -- random seed, the same seed gives the same data (default: {0})
+
+    Returns:
+        dict -- {table name: list of {column: value} dicts}, in the order the tables
+        must be loaded
+    """
+    rng = random.Random(seed)
+    n_days = int(365 * years)
+    end_date = start_date + timedelta(days=n_days)
+
+    def random_period(min_days=30):
+        first = start_date + timedelta(days=rng.randrange(n_days - min_days))
+        last = first + timedelta(days=rng.randrange(min_days, n_days))
+        return first, min(last, end_date)
+
+    data = {
+        "associations": [
+            {"id": idx, "name": name} for name, idx in association_groups.items()
+        ]
+    }
+
+    # clients
+    special_clients = list(SPECIAL_CLIENTS)
+    if reserve_client not in special_clients:
+        special_clients.append(reserve_client)
+    client_names = special_clients + [
+        "Programme {}".format(i + 1) for i in range(n_programmes)
+    ]
+    data["clients"] = [
+        {"id": 100 + i, "name": name} for i, name in enumerate(client_names)
+    ]
+    client_ids = {client["name"]: client["id"] for client in data["clients"]}
+
+    # people - make sure every association group has at least one person
+    groups = [idx for idx in association_groups.values() if idx > 0]
+    data["people"] = [
+        {
+            "id": 1000 + i,
+            "name": "Person {}".format(i + 1),
+            "capacity": rng.choice([5, 4, 3]) * DAY_SECONDS,
+            "association": groups[i] if i < len(groups) else rng.choice(groups),
+        }
+        for i in range(n_people)
+    ]
+    data["people"] += [
+        {
+            "id": 9000 + i,
+            "name": name,
+            "capacity": None,
+            "association": association_groups["Placeholder"],
+        }
+        for i, name in enumerate(
+            PLACEHOLDER_NAMES
+            + ["Placeholder {}".format(i + 1) for i in range(n_placeholders)]
+        )
+    ]
+    person_ids = [person["id"] for person in data["people"][:n_people]]
+    placeholder_ids = [person["id"] for person in data["people"][n_people:]]
+
+    # projects
+    data["projects"] = []
+
+    def add_project(name, client, github=None, period=None):
+        first, last = random_period() if period is None else period
+        data["projects"].append(
+            {
+                "id": 2000 + len(data["projects"]),
+                "name": name,
+                "client": client_ids[client],
+                "github": github,
+                "start_date": first,
+                "end_date": last,
+            }
+        )
+        return data["projects"][-1]
+
+    for name in UNAVAILABLE_PROJECTS:
+        add_project(name, "UNAVAILABLE", period=(start_date, end_date))
+    add_project(RESERVE_PROJECT, reserve_client)
+    for client in special_clients[1:]:
+        add_project(client + " Project", client)
+    for i in range(n_projects):
+        add_project(
+            "Project {}".format(i + 1),
+            rng.choice(client_names[len(special_clients) :]),
+            github=100 + i if rng.random() < 0.8 else None,
+        )
+
+    # assignments - not to DIRECTOR'S RESERVE
+    data["assignments"] = []
+    assignable_placeholders = placeholder_ids[:4] + placeholder_ids[5:]
+
+    def add_assignment(project, person, first, last, fte, pieces=1):
+        days = (last - first).days
+        piece_days = max(1, days // pieces)
+        for piece in range(pieces):
+            piece_first = first + timedelta(days=piece * piece_days)
+            if piece_first > last:
+                break
+            if piece == pieces - 1:
+                piece_last = last
+            else:
+                piece_last = min(last, piece_first + timedelta(days=piece_days - 1))
+            if piece > 0:
+                fte = rng.choice(fte_choices)
+
+            data["assignments"].append(
+                {
+                    "id": 10000 + len(data["assignments"]),
+                    "project": project["id"],
+                    "person": person,
+                    "start_date": piece_first,
+                    "end_date": piece_last,
+                    "allocation": int(fte * DAY_SECONDS),
+                }
+            )
+
+    for project in data["projects"]:
+        if project["client"] == client_ids["UNAVAILABLE"]:
+            continue
+
+        n_assign = max(1, int(rng.gauss(assignments_per_project, 1)))
+        for _ in range(n_assign):
+            span = (project["end_date"] - project["start_date"]).days
+            first = project["start_date"] + timedelta(days=rng.randrange(span))
+            last = first + timedelta(days=rng.randrange(7, 180))
+            person = rng.choice(
+                person_ids if rng.random() < 0.7 else assignable_placeholders
+            )
+            add_assignment(
+                project,
+                person,
+                first,
+                min(last, project["end_date"]),
+                rng.choice(fte_choices),
+                pieces=churn,
+            )
+
+    unavailable = [p for p in data["projects"] if p["name"] in UNAVAILABLE_PROJECTS]
+    for person in person_ids:
+        for _ in range(int(round(years * 3))):
+            first = start_date + timedelta(days=rng.randrange(n_days))
+            add_assignment(
+                rng.choice(unavailable),
+                person,
+                first,
+                first + timedelta(days=rng.randrange(1, 10)),
+                1.0,
+            )
+
+    if with_tracked_time:
+        data["tasks"] = [{"id": 3000 + i, "name": name} for i, name in enumerate(TASKS)]
+        task_ids = [task["id"] for task in data["tasks"]]
+
+        # people track time against projects they're assigned to
+        person_projects = {person: [] for person in person_ids}
+        for assignment in data["assignments"]:
+            if assignment["person"] in person_projects:
+                person_projects[assignment["person"]].append(assignment)
+
+        data["time_entries"] = []
+        for person, assignments in person_projects.items():
+            for assignment in assignments:
+                weeks = (assignment["end_date"] - assignment["start_date"]).days // 7
+                for week in range(max(1, weeks)):
+                    for _ in range(entries_per_week):
+                        spent = assignment["start_date"] + timedelta(
+                            days=7 * week + rng.randrange(5)
+                        )
+                        data["time_entries"].append(
+                            {
+                                "id": 100000 + len(data["time_entries"]),
+                                "project": assignment["project"],
+                                "person": person,
+                                "task": rng.choice(task_ids),
+                                "date": spent,
+                                "hours": rng.randrange(1, 8),
+                            }
+                        )
+
+    return data
+
+
+def load_dataset(data, engine=None):
+    """Create the wimbledon schema and load data (as returned by make_dataset) into
+    it.
+
+    Keyword Arguments:
+        engine {sqlalchemy.engine.Engine} -- database to load into. If None create
+        an in-memory SQLite database (default: {None})
+
+    Returns:
+        sqlalchemy.engine.Engine -- the engine the data was loaded into
+    """
+    if engine is None:
+        engine = db_utils.get_memory_engine()
+
+    schema.metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        for table_name, rows in data.items():
+            if len(rows) > 0:
+                conn.execute(schema.metadata.tables[table_name].insert(), rows)
+
+    return engine
@@ -0,0 +1,158 @@
+"""
+Record how long each stage of building a Wimbledon object takes, how much memory
+it uses and how many rows it processes.
+"""
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+# number of builds to_jsonl keeps in a profile file by default
+MAX_BUILDS = 20
+
+
+def read_builds(path):
+    """Stages in a json lines profile file (see BuildProfile.to_jsonl), as a list of
+    lists of dicts, one list per build in the order they were written."""
+    builds = []
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            stage = json.loads(line)
+            if len(builds) == 0 or builds[-1][0]["started_at"] != stage["started_at"]:
+                builds.append([])
+            builds[-1].append(stage)
+
+    return builds
+
+
+class BuildProfile:
+    def __init__(self, trace_memory=False):
+        """Wall time, peak memory increase and row counts for each stage of a build.
+
+        Keyword Arguments:
+            trace_memory {bool} -- whether to measure the peak memory increase of
+            each stage with tracemalloc. This slows the build down, so is off by
+            default (default: {False})
+        """
+        self.trace_memory = trace_memory
+        self.started_at = datetime.now()
+        self.stages = []
+        # (name, whether tracing memory, start time) of the stage being recorded
+        self._current = None
+
+    def start(self, name):
+        """Start recording a stage, finishing the current one if there is one (see
+        stop)."""
+        if self._current is not None:
+            self.stop()
+
+        # only trace memory if nobody else is already using tracemalloc
+        trace = self.trace_memory and not tracemalloc.is_tracing()
+        if trace:
+            tracemalloc.start()
+
+        self._current = (name, trace, time.perf_counter())
+
+    def stop(self, rows=None):
+        """Finish recording the current stage, with the number of rows it processed
+        if given, and return its record.
+
+        Example:
+            profile.start("read_db")
+            data = get_data()
+            profile.stop(rows=len(data))
+        """
+        name, trace, start = self._current
+        self._current = None
+
+        record = {
+            "stage": name,
+            "seconds": time.perf_counter() - start,
+            "peak_memory_mb": None,
+            "rows": None if rows is None else int(rows),
+        }
+        if trace:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            record["peak_memory_mb"] = peak / 1e6
+
+        self.stages.append(record)
+        return record
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager recording a stage (see start and stop). Yields a dict
+        whose "rows" value can be set to the number of rows the stage processed.
+
+        Example:
+            with profile.stage("read_db") as stage:
+                data = get_data()
+                stage["rows"] = len(data)
+        """
+        counts = {"rows": None}
+        self.start(name)
+        try:
+            yield counts
+        finally:
+            self.stop(rows=counts["rows"])
+
+    @property
+    def total_seconds(self):
+        return sum(stage["seconds"] for stage in self.stages)
+
+    def to_records(self):
+        """List of dicts, one per stage, with keys stage, seconds, peak_memory_mb
+        and rows."""
+        return [dict(stage) for stage in self.stages]
+
+    def to_frame(self):
+        """Dataframe with one row per stage."""
+        return pd.DataFrame(self.to_records()).set_index("stage")
+
+    def to_jsonl(self, path, max_builds=MAX_BUILDS, **extra):
+        """Append the profile to the file at path as json lines, one per stage,
+        each including the time the build started and any extra keyword arguments
+        (e.g. a description of the build). Only the last max_builds builds are kept
+        in the file (all of them if max_builds is None), so it doesn't grow with
+        every build."""
+        lines = [
+            {"started_at": self.started_at.isoformat(), **extra, **record}
+            for record in self.stages
+        ]
+
+        if max_builds is None or not os.path.isfile(path):
+            with open(path, "a") as f:
+                for line in lines:
+                    f.write(json.dumps(line) + "\n")
+            return
+
+        builds = read_builds(path)[-(max_builds - 1) :] if max_builds > 1 else []
+        # write to a temporary file first, so the file is never half written
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for line in [stage for build in builds for stage in build] + lines:
+                f.write(json.dumps(line) + "\n")
+        os.replace(tmp_path, path)
+
+    def summary(self):
+        """Printable table of the stages."""
+        lines = []
+        for stage in self.stages:
+            line = "{:<25} {:>8.2f}s".format(stage["stage"], stage["seconds"])
+            if stage["peak_memory_mb"] is not None:
+                line += " {:>9.1f}MB".format(stage["peak_memory_mb"])
+            if stage["rows"] is not None:
+                line += " {:>10d} rows".format(stage["rows"])
+            lines.append(line)
+        lines.append("{:<25} {:>8.2f}s".format("TOTAL", self.total_seconds))
+
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return self.summary()
@@ -10,6 +10,9 @@ HARVEST_CREDENTIALS_PATH = CONFIG_DIR + "/.harvest_credentials"
 SQL_CONFIG_PATH = CONFIG_DIR + "/.sql_config"
 WIMBLEDON_CONFIG_PATH = CONFIG_DIR + "/.wimbledon_config"
 GITHUB_CREDENTIALS_PATH = CONFIG_DIR + "/.github_credentials"
+HTTP_CACHE_DIR = CONFIG_DIR + "/http_cache"
+CHECKPOINT_DIR = CONFIG_DIR + "/checkpoints"
+LAKE_DIR = CONFIG_DIR + "/lake"
 
 
 def check_dir(directory):
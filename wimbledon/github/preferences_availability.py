@@ -1,9 +1,10 @@
-import requests
 import pandas as pd
 import math
 from datetime import datetime
 from wimbledon import Wimbledon
 from wimbledon import config
+from wimbledon.transport import get_transport
+from wimbledon.harvest.rate_limit import get_limiter
 
 
 repo_query_template = """
@@ -217,12 +218,16 @@ def build_query(issue_numbers, n_users=30, n_comments=1):
 
 def run_query(query, token):
     """
-    A simple function to use requests.post to make the API call. Note the json= section.
-    Takes as input a string containing a GraphQL query string
+    A simple function to make the API call with the shared HTTP transport, within
+    the GitHub rate limit. Note the json= section. Takes as input a string
+    containing a GraphQL query string
     """
     headers = {"Authorization": "Bearer " + token}
-    request = requests.post(
-        "https://api.github.com/graphql", json={"query": query}, headers=headers
+    request = get_transport().post(
+        "https://api.github.com/graphql",
+        json={"query": query},
+        headers=headers,
+        limiter=get_limiter("github"),
     )
     if request.status_code == 200:
         return request.json()
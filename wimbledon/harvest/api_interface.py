@@ -1,10 +1,16 @@
 import wimbledon.config
+from wimbledon.transport import get_transport
+from wimbledon.http_cache import get_response_cache
+from wimbledon.harvest.pagination import fetch_all_pages, iter_pages
+from wimbledon.harvest.decode import (
+    FORECAST_FIELDS,
+    HARVEST_FIELDS,
+    decode_records,
+)
+from wimbledon.harvest.rate_limit import get_limiter
+from wimbledon.harvest.scheduler import Scheduler
+from wimbledon.harvest.shards import SHARD_FREQ, date_shards, fetch_sharded
 
-import forecast
-import harvest
-
-import json
-import requests
 
 import pandas as pd
 
@@ -13,297 +19,538 @@ import time
 import os
 from datetime import date, timedelta
 
+# earliest date to get time entries from when splitting them into shards (earlier
+# time entries are still fetched, in the first shard)
+TIME_ENTRIES_START_DATE = date(2016, 1, 1)
 
-def check_dir(directory):
-    if not os.path.exists(directory):
-        os.makedirs(directory)
+HARVEST_API_URL = "https://api.harvestapp.com/v2/"
+FORECAST_API_URL = "https://api.forecastapp.com/"
 
+# how far ahead to get forecast assignments by default
+FORECAST_END_OFFSET = timedelta(days=365 * 3)
 
-def get_forecast(
-    start_date=date(2016, 1, 1), end_date=date.today() + timedelta(days=365 * 3)
-):
-    """
-    Extract forecast data from its API using the pyforecast package.
+# date that extraction periods are relative to, if pinned (see set_today)
+_today = None
 
-    NB: The forecast API is not public and is undocumented. See:
-    https://help.getharvest.com/forecast/faqs/faq-list/api/
 
-    start_date, end_date: date range to query assignments between.
-    """
-    start = time.time()
+def today():
+    """The date extraction periods (e.g. which assignments and time entry shards
+    to query) are relative to: the current date, unless another one has been
+    pinned with set_today."""
+    return date.today() if _today is None else _today
 
-    harvest_api_credentials = wimbledon.config.get_harvest_credentials()
 
-    api = forecast.Api(
-        account_id=harvest_api_credentials["forecast_account_id"],
-        auth_token=harvest_api_credentials["access_token"],
-    )
+def set_today(day):
+    """Pin the date returned by today(), e.g. to the date responses were recorded
+    on so that replaying them (see wimbledon.replay) makes the same requests. None
+    unpins it. Returns the previously pinned date."""
+    global _today
+    previous = _today
+    _today = day
+    return previous
 
-    user = api.whoami()
-    print()
-    print("AUTHENTICATED USER:")
-    print(user.first_name, user.last_name, user.email)
-    print()
 
-    def response_to_df(api_response):
-        """Takes an api response in the pyforecast foremat and converts it into a
-        pandas data frame."""
-        results = [json.loads(result.to_json()) for result in api_response]
+def check_dir(directory):
+    if not os.path.exists(directory):
+        os.makedirs(directory)
 
-        df = pd.json_normalize(results)
-        df.set_index("id", inplace=True)
 
-        return df
+def forecast_api_headers():
+    harvest_api_credentials = wimbledon.config.get_harvest_credentials()
 
-    print("CLIENTS")
-    clients = response_to_df(api.get_clients())
+    return {
+        "User-Agent": "Hut23@turing.ac.uk",
+        "Authorization": "Bearer " + harvest_api_credentials["access_token"],
+        "Forecast-Account-ID": harvest_api_credentials["forecast_account_id"],
+    }
 
-    print("PROJECTS")
-    projects = response_to_df(api.get_projects())
 
-    print("ROLES")
-    roles = response_to_df(api.get_roles())
+def forecast_api_get(path, params=None, headers=None, limiter=None, cache=None):
+    """Make a GET request to the forecast API and return the json response.
 
-    print("PEOPLE")
-    people = response_to_df(api.get_people())
+    path: e.g. "assignments"
+    params: query parameters
+    headers: request headers, default from forecast_api_headers()
+    limiter: RateLimiter shared with any other forecast requests being made
+    (default: get_limiter("forecast"))
+    cache: if given, a ResponseCache to revalidate a previous response with
+    rather than downloading it again
+    """
+    if headers is None:
+        headers = forecast_api_headers()
+    if limiter is None:
+        limiter = get_limiter("forecast")
+
+    if cache is not None:
+        return cache.get_json(
+            FORECAST_API_URL + path, headers=headers, params=params, limiter=limiter
+        )
+
+    response = get_transport().get(
+        FORECAST_API_URL + path, headers=headers, params=params, limiter=limiter
+    )
+    response.raise_for_status()
 
-    print("PLACEHOLDERS")
-    placeholders = response_to_df(api.get_placeholders())
+    return response.json()
 
-    print("MILESTONES")
-    milestones = response_to_df(api.get_milestones())
 
-    print("ASSIGNMENTS")
-    assignments = response_to_df(
-        api.get_assignments(start_date=start_date, end_date=end_date)
-    )
+def forecast_to_df(table, params=None, headers=None, limiter=None, cache=None):
+    """Query a table in forecast and decode it into a dataframe. Forecast returns
+    all results at once rather than in pages.
 
-    print("=" * 50)
-    print("DONE! ({:.1f}s)".format(time.time() - start))
-
-    forecast_data = {
-        "clients": clients,
-        "projects": projects,
-        "roles": roles,
-        "people": people,
-        "placeholders": placeholders,
-        "milestones": milestones,
-        "assignments": assignments,
-    }
+    table: name of the table in the forecast API, e.g. "assignments"
+    params: query parameters, e.g. {"start_date": "2020-01-01"}
+    headers: request headers, default from forecast_api_headers()
+    limiter: RateLimiter shared with any other requests being made
+    cache: ResponseCache to use for the request (default: None, not cached)
+    """
+    response = forecast_api_get(
+        table, params=params, headers=headers, limiter=limiter, cache=cache
+    )
 
-    return forecast_data
+    return decode_records(response[table], FORECAST_FIELDS.get(table))
 
 
-def get_harvest(with_tracked_time=True, with_assignments=False):
+def forecast_fetchers(
+    start_date=date(2016, 1, 1),
+    end_date=None,
+    shard_freq=SHARD_FREQ,
+    limiter=None,
+    use_cache=True,
+):
     """
-    Extract harvest data using the python-harvest package.
+    Functions to extract each forecast table from its API. The functions are
+    independent so can be run concurrently.
+
+    NB: The forecast API is not public and is undocumented. See:
+    https://help.getharvest.com/forecast/faqs/faq-list/api/
 
-    NB: The master branch of python-harvest currently seems to be using the v1 version
-    of the api. This version of the API is deprecated. The branch "v2_dev" of
-    python-harvest works with harvests v2 API but doesn't seem to be fully functioning
-    for all tables, most noticeably the time_entries table.
+    start_date, end_date: date range to query assignments between (end_date
+    defaults to FORECAST_END_OFFSET after today()).
+    shard_freq: query assignments in shards of this length (pandas frequency
+    string, e.g. "QS" for quarters) concurrently. If None query the whole date
+    range at once.
+    limiter: RateLimiter shared by all forecast requests (default:
+    get_limiter("forecast"))
+    use_cache: revalidate the reference tables (everything except assignments)
+    against the on-disk response cache rather than always downloading them
+
+    Returns a {table name: function} dict, where each function takes no arguments
+    and returns the table as a dataframe.
     """
+    headers = forecast_api_headers()
 
-    start = time.time()
+    if end_date is None:
+        end_date = today() + FORECAST_END_OFFSET
+    if limiter is None:
+        limiter = get_limiter("forecast")
 
-    harvest_api_credentials = wimbledon.config.get_harvest_credentials()
+    user = forecast_api_get("whoami", headers=headers, limiter=limiter)["current_user"]
+    print()
+    print("AUTHENTICATED USER:")
+    print(user["first_name"], user["last_name"], user["email"])
+    print()
 
-    token = harvest.PersonalAccessToken(
-        account_id=harvest_api_credentials["harvest_account_id"],
-        access_token=harvest_api_credentials["access_token"],
-    )
+    cache = get_response_cache() if use_cache else None
 
-    client = harvest.Harvest("https://api.harvestapp.com/api/v2", token)
+    def table(name):
+        return lambda: forecast_to_df(
+            name, headers=headers, limiter=limiter, cache=cache
+        )
 
-    auth_user = client.get_currently_authenticated_user()
+    def get_assignments_between(shard_start, shard_end):
+        params = {
+            "start_date": shard_start.isoformat(),
+            "end_date": shard_end.isoformat(),
+        }
+        return forecast_to_df(
+            "assignments", params=params, headers=headers, limiter=limiter
+        )
+
+    def get_assignments():
+        if shard_freq is None:
+            return get_assignments_between(start_date, end_date)
+
+        # assignments that overlap several shards are returned by each of them,
+        # fetch_sharded keeps one row per assignment
+        return fetch_sharded(get_assignments_between, start_date, end_date, shard_freq)
+
+    return {
+        "clients": table("clients"),
+        "projects": table("projects"),
+        "roles": table("roles"),
+        "people": table("people"),
+        "placeholders": table("placeholders"),
+        "milestones": table("milestones"),
+        "assignments": get_assignments,
+    }
 
-    print("AUTHENTICATED USER:")
-    print(auth_user.first_name, auth_user.last_name, auth_user.email)
 
-    def objs_to_df(objs, prefix=None):
-        """Convert the attributes of each object in a list of objects into a pandas dataframe."""
-        df = [obj.__dict__ for obj in objs]
-        df = pd.DataFrame.from_dict(df)
+def get_forecast(
+    start_date=date(2016, 1, 1),
+    end_date=None,
+    shard_freq=SHARD_FREQ,
+):
+    """
+    Extract forecast data from its API, fetching all tables concurrently.
 
-        # add prefix to columns if given
-        if prefix is not None:
-            df.columns = prefix + "." + df.columns
+    NB: The forecast API is not public and is undocumented. See:
+    https://help.getharvest.com/forecast/faqs/faq-list/api/
 
-        # unpack any harvest objects into normal columns of values
-        df = unpack_class_columns(df)
+    start_date, end_date: date range to query assignments between (end_date
+    defaults to FORECAST_END_OFFSET after today()).
+    shard_freq: query assignments in shards of this length (pandas frequency
+    string, e.g. "QS" for quarters) concurrently. If None query the whole date
+    range at once.
+    """
+    start = time.time()
 
-        return df
+    fetchers = forecast_fetchers(
+        start_date=start_date, end_date=end_date, shard_freq=shard_freq
+    )
+    forecast_data = run_fetchers(fetchers)
 
-    def unpack_class_columns(df):
-        """python-harvest returns some columns as an instance of another harvest data
-        type. This function unpacks the values of those columns, creating a new column
-        for each of the unpacked attributes (with name <COL_NAME>.<ATTRIBUTE_NAME>)"""
+    print("=" * 50)
+    print("DONE! ({:.1f}s)".format(time.time() - start))
 
-        # all columns which have ambiguous pandas 'object' type
-        obj_cols = df.columns[df.dtypes == "object"]
+    return forecast_data
 
-        # most common type in each of these columns, excluding missing values
-        col_types = {col: df[col].dropna().apply(type).mode() for col in obj_cols}
 
-        # exclude columns which have no most common type (i.e. empty columns)
-        col_types = {
-            col: str(mode[0]) for col, mode in col_types.items() if len(mode) > 0
-        }
+def harvest_fetchers(
+    with_tracked_time=True,
+    with_assignments=False,
+    time_entries_since=None,
+    limiter=None,
+    use_cache=True,
+):
+    """
+    Functions to extract each harvest table from the harvest v2 API. The functions
+    are independent so can be run concurrently.
+
+    time_entries_since: if given, only get time entries updated since this datetime
+    (in UTC), rather than all time entries.
+    limiter: RateLimiter shared by all harvest requests (default:
+    get_limiter("harvest"))
+    use_cache: revalidate the reference tables (everything except time entries)
+    against the on-disk response cache rather than always downloading them
+
+    Returns a {table name: function} dict, where each function takes no arguments
+    and returns the table as a dataframe.
+    """
+    headers = harvest_api_headers()
 
-        # find columns containing some instance from the harvest library
-        harvest_cols = [col for col, mode in col_types.items() if "harvest" in mode]
+    # shared by all requests so concurrent requests stay within the Harvest rate
+    # limit
+    if limiter is None:
+        limiter = get_limiter("harvest")
 
-        # convert each column of harvest objects into a pandas df
-        unpacked_cols = [objs_to_df(df[col], prefix=col) for col in harvest_cols]
+    response = get_transport().get(
+        HARVEST_API_URL + "users/me", headers=headers, limiter=limiter
+    )
+    response.raise_for_status()
+    auth_user = response.json()
 
-        # add new columns to data frame
-        for new_cols in unpacked_cols:
-            df = pd.concat([df, new_cols], axis=1, sort=True)
+    print("AUTHENTICATED USER:")
+    print(auth_user["first_name"], auth_user["last_name"], auth_user["email"])
 
-        # remove original harvest object columns
-        df.drop(harvest_cols, axis=1, inplace=True)
+    cache = get_response_cache() if use_cache else None
 
-        return df
+    def table(name):
+        return lambda: api_to_df(name, headers=headers, limiter=limiter, cache=cache)
 
-    def get_all_pages(client_function):
-        """The harvest API returns max 100 results per query. This function calls the API as many times
-        as necessary to extract all the query results.
+    fetchers = {
+        "clients": table("clients"),
+        "projects": table("projects"),
+        "roles": table("roles"),
+        "users": table("users"),
+        "tasks": table("tasks"),
+    }
 
-        client_function: a function from an initiated python-harvest client, e.g. client.users"""
+    if with_assignments:
+        fetchers["user_assignments"] = table("user_assignments")
+        fetchers["task_assignments"] = table("task_assignments")
 
-        result = client_function()
-        total_pages = result.total_pages
+    if with_tracked_time:
+        fetchers["time_entries"] = lambda: get_time_entries(
+            updated_since=time_entries_since, limiter=limiter
+        )
 
-        # the data to convert is in an attribute of the response, e.g. in a users response the data is in result.users
-        df = objs_to_df(getattr(result, client_function.__name__))
+    return fetchers
 
-        # get the remaining pages, if there are any
-        if result.total_pages > 1:
-            for i in range(2, total_pages + 1):
-                result = client_function(page=i)
-                result = objs_to_df(getattr(result, client_function.__name__))
 
-                df = df.append(result, ignore_index=True)
+def get_harvest(
+    with_tracked_time=True, with_assignments=False, time_entries_since=None
+):
+    """
+    Extract harvest data from the harvest v2 API, fetching all tables concurrently.
 
-        df.set_index("id", inplace=True)
+    time_entries_since: if given, only get time entries updated since this datetime
+    (in UTC), rather than all time entries.
+    """
+    start = time.time()
 
-        return df
+    fetchers = harvest_fetchers(
+        with_tracked_time=with_tracked_time,
+        with_assignments=with_assignments,
+        time_entries_since=time_entries_since,
+    )
+    harvest_data = run_fetchers(fetchers)
 
-    print("CLIENTS")
-    clients = get_all_pages(client.clients)
+    print("=" * 50)
+    print("DONE! ({:.1f}s)".format(time.time() - start))
 
-    print("PROJECTS")
-    projects = get_all_pages(client.projects)
+    return harvest_data
 
-    print("ROLES")
-    roles = get_all_pages(client.roles)
 
-    print("USERS")
-    users = get_all_pages(client.users)
+def run_fetchers(fetchers):
+    """Run a {table name: function} dict of fetchers concurrently, returning a
+    {table name: dataframe} dict."""
+    scheduler = Scheduler()
+    for name, fetch in fetchers.items():
+        scheduler.add(name, lambda results, fetch=fetch: fetch())
 
-    print("TASKS")
-    tasks = get_all_pages(client.tasks)
+    return scheduler.run()
 
-    if with_assignments:
-        print("USER ASSIGNMENTS")
-        user_assignments = get_all_pages(client.user_assignments)
 
-        print("TASK ASSIGNMENTS")
-        task_assignments = get_all_pages(client.task_assignments)
+def harvest_api_headers():
+    harvest_api_credentials = wimbledon.config.get_harvest_credentials()
 
-    if with_tracked_time:
-        """
-        Issues with python-harvest module:
+    return {
+        "User-Agent": "Hut23@turing.ac.uk",
+        "Authorization": "Bearer " + harvest_api_credentials["access_token"],
+        "Harvest-Account-ID": harvest_api_credentials["harvest_account_id"],
+    }
 
-        time_entries: Currently fails due to time_entries.cost_rate should be "float" instead of "NoneType" error
 
-        client_contacts, invoices, estimates, expenses: Also fail, usually due to some missing field error, but not sure we
-        use any of those tables?
+def api_to_df(table, headers=None, params=None, limiter=None, cache=None):
+    """Query all pages of a table in harvest and decode the json records into a
+    dataframe. For tables in decode.HARVEST_FIELDS only the fields used by
+    db_interface are decoded, into typed columns.
 
-        Below is my own quick function to extract the time entries data... it's quite slow requiring 30+ queries, but the API
-        returns max 100 results at a time so probably not a lot that can be done to improve it.
-        """
+    The API returns max 100 results at a time, so e.g. time_entries needs 30+
+    queries, but once the first page has given the total number of pages the rest
+    are fetched concurrently (within the rate limit).
 
-        def api_to_df(table, headers):
-            """Query all pages of a table in harvest."""
+    table: name of the table in the harvest API, e.g. "time_entries"
+    headers: request headers, default from harvest_api_headers()
+    params: extra query parameters, e.g. {"updated_since": "2020-01-01T00:00:00Z"}
+    limiter: RateLimiter shared with any other harvest requests being made
+    (default: get_limiter("harvest"))
+    cache: if given, a ResponseCache to revalidate previous responses with rather
+    than downloading every page again
+    """
+    if headers is None:
+        headers = harvest_api_headers()
+    if params is None:
+        params = {}
+    if limiter is None:
+        limiter = get_limiter("harvest")
+
+    url = HARVEST_API_URL + table
+    print("Querying", url, params, flush=True)
+    req_time = time.time()
+
+    def fetch_page(page):
+        if cache is not None:
+            return cache.get_json(
+                url, headers=headers, params={**params, "page": page}, limiter=limiter
+            )
+
+        response = get_transport().get(
+            url, headers=headers, params={**params, "page": page}, limiter=limiter
+        )
+        response.raise_for_status()
+        return response.json()
+
+    pages = fetch_all_pages(fetch_page, lambda response: response["total_pages"])
+
+    df = decode_records(
+        (record for page in pages for record in page[table]), HARVEST_FIELDS.get(table)
+    )
+    # so callers can check none of the records are missing, e.g. if records were
+    # deleted while the pages were being fetched (see db_interface.fetched_all)
+    df.attrs["total_entries"] = pages[0].get("total_entries", 0)
+
+    print(
+        "{}: {:d} pages, {:.1f} seconds".format(
+            table, len(pages), time.time() - req_time
+        )
+    )
 
-            url = "https://api.harvestapp.com/v2/" + table
-            print("Querying", url, "...", end="")
+    return df
 
-            req_time = time.time()
-            response = requests.get(url, headers=headers)
-            json_response = response.json()
 
-            df = pd.json_normalize(json_response[table])
+def get_time_entries(updated_since=None, limiter=None, shard_freq=SHARD_FREQ):
+    """Get harvest time entries.
 
-            diff = time.time() - req_time
-            print("{:.1f} seconds".format(diff))
+    updated_since: if given, only get time entries created or updated since this
+    datetime (naive datetimes are assumed to be UTC).
+    limiter: RateLimiter shared with any other requests being made
+    shard_freq: when getting all time entries, query them in shards of this
+    length by spent date (pandas frequency string, e.g. "QS" for quarters)
+    concurrently. If None query all time entries at once.
+    """
+    if updated_since is not None:
+        params = {"updated_since": to_harvest_timestamp(updated_since)}
+        return api_to_df("time_entries", params=params, limiter=limiter)
 
-            while json_response["links"]["next"] is not None:
-                url = json_response["links"]["next"]
-                print("Querying", url, "... ", end="")
-                req_time = time.time()
+    if shard_freq is None:
+        return api_to_df("time_entries", limiter=limiter)
 
-                response = requests.get(url, headers=headers)
-                json_response = response.json()
+    def get_shard(shard_start, shard_end):
+        params = spent_date_params(shard_start, shard_end)
+        return api_to_df("time_entries", params=params, limiter=limiter)
 
-                new_entries = pd.json_normalize(json_response[table])
-                df = df.append(new_entries)
+    # open ended so entries before TIME_ENTRIES_START_DATE or in the future are
+    # included
+    return fetch_sharded(
+        get_shard, TIME_ENTRIES_START_DATE, today(), shard_freq, open_ended=True
+    )
 
-                diff = time.time() - req_time
-                print("{:.1f} seconds".format(diff))
 
-                # wait a bit to prevent getting throttled (allowed max 100 requests per 15 seconds)
-                if diff < 0.15:
-                    time.sleep(0.15 - diff)
+def spent_date_params(start_date=None, end_date=None):
+    """Query parameters to get time entries spent between start_date and end_date
+    (either can be None)."""
+    params = {}
+    if start_date is not None:
+        params["from"] = start_date.isoformat()
+    if end_date is not None:
+        params["to"] = end_date.isoformat()
 
-            df.set_index("id", inplace=True)
+    return params
 
-            return df
 
-        api_headers = {
-            "User-Agent": "Hut23@turing.ac.uk",
-            "Authorization": "Bearer " + harvest_api_credentials["access_token"],
-            "Harvest-Account-ID": harvest_api_credentials["harvest_account_id"],
-        }
+def iter_api_pages(table, headers=None, params=None, limiter=None, start_page=1):
+    """Yield the json response of each page of a table in harvest, without keeping
+    more than a few pages in memory. Later pages are downloaded while earlier ones
+    are being consumed. Each response includes its "page" number, the number of
+    "total_pages" and the page's records (under the table's name).
 
-        print("TIME ENTRIES:")
-        time_entries = api_to_df("time_entries", api_headers)
+    table: name of the table in the harvest API, e.g. "time_entries"
+    headers: request headers, default from harvest_api_headers()
+    params: extra query parameters, e.g. {"updated_since": "2020-01-01T00:00:00Z"}
+    limiter: RateLimiter shared with any other harvest requests being made
+    (default: get_limiter("harvest"))
+    start_page: page to start from, e.g. to resume an interrupted query
+    """
+    if headers is None:
+        headers = harvest_api_headers()
+    if params is None:
+        params = {}
+    if limiter is None:
+        limiter = get_limiter("harvest")
+
+    url = HARVEST_API_URL + table
+
+    def fetch_page(page):
+        response = get_transport().get(
+            url, headers=headers, params={**params, "page": page}, limiter=limiter
+        )
+        response.raise_for_status()
+        return response.json()
+
+    yield from iter_pages(
+        fetch_page, lambda response: response["total_pages"], start_page=start_page
+    )
 
-    print("=" * 50)
-    print("DONE! ({:.1f}s)".format(time.time() - start))
 
-    harvest_data = {
-        "clients": clients,
-        "projects": projects,
-        "roles": roles,
-        "users": users,
-        "tasks": tasks,
-    }
+def iter_api_records(table, headers=None, params=None, limiter=None):
+    """Yield the records (json dicts) of all pages of a table in harvest, without
+    keeping more than a few pages in memory. Later pages are downloaded while
+    earlier records are being consumed.
 
-    if with_assignments:
-        harvest_data["user_assignments"] = user_assignments
-        harvest_data["task_assignments"] = task_assignments
+    table: name of the table in the harvest API, e.g. "time_entries"
+    headers: request headers, default from harvest_api_headers()
+    params: extra query parameters, e.g. {"updated_since": "2020-01-01T00:00:00Z"}
+    limiter: RateLimiter shared with any other harvest requests being made
+    (default: get_limiter("harvest"))
+    """
+    for page in iter_api_pages(table, headers=headers, params=params, limiter=limiter):
+        yield from page[table]
 
-    if with_tracked_time:
-        harvest_data["time_entries"] = time_entries
 
-    return harvest_data
+def time_entry_shards(updated_since=None, shard_freq=SHARD_FREQ):
+    """The (start, end) spent date shards iter_time_entry_pages queries one after
+    another. A single unbounded shard if updated_since or shard_freq is None."""
+    if updated_since is not None or shard_freq is None:
+        return [(None, None)]
 
+    return date_shards(TIME_ENTRIES_START_DATE, today(), shard_freq, open_ended=True)
 
-def update_to_csv(data_dir, run_forecast=True, run_harvest=True):
-    if run_forecast:
-        check_dir(data_dir + "/forecast")
 
-        forecast_data = get_forecast()
+def iter_time_entry_pages(
+    updated_since=None, limiter=None, shard_freq=SHARD_FREQ, resume_from=(0, 1)
+):
+    """Yield (next position, time entries) for each page of harvest time entries as
+    they are downloaded, where a position is a (shard index, page number) tuple
+    (see time_entry_shards). The next position is (next shard index, 1) after the
+    last page of a shard. Passing a position as resume_from starts the query from
+    there. Time entries added or deleted after an interrupted query shift the page
+    boundaries, so only (shard index, 1) is a safe place to resume from.
+
+    updated_since: if given, only get time entries created or updated since this
+    datetime (naive datetimes are assumed to be UTC).
+    limiter: RateLimiter shared with any other requests being made
+    shard_freq: when getting all time entries, query them in shards of this
+    length by spent date (pandas frequency string, e.g. "QS" for quarters) one
+    after another, so the pages of only one shard are in flight at a time. If
+    None query all time entries at once.
+    resume_from: (shard index, page number) to start from
+    """
+    shards = time_entry_shards(updated_since, shard_freq)
+    resume_shard, resume_page = resume_from
+
+    # each time entry has one spent date so is in exactly one shard
+    for i, (shard_start, shard_end) in enumerate(shards):
+        if i < resume_shard:
+            continue
+
+        if updated_since is not None:
+            params = {"updated_since": to_harvest_timestamp(updated_since)}
+        else:
+            params = spent_date_params(shard_start, shard_end)
+
+        for response in iter_api_pages(
+            "time_entries",
+            params=params,
+            limiter=limiter,
+            start_page=resume_page if i == resume_shard else 1,
+        ):
+            if response["page"] < response["total_pages"]:
+                next_position = (i, response["page"] + 1)
+            else:
+                next_position = (i + 1, 1)
+
+            yield next_position, response["time_entries"]
+
+
+def iter_time_entries(updated_since=None, limiter=None, shard_freq=SHARD_FREQ):
+    """Yield harvest time entries (json dicts) as they are downloaded. See
+    iter_time_entry_pages for the arguments."""
+    for _, entries in iter_time_entry_pages(
+        updated_since=updated_since, limiter=limiter, shard_freq=shard_freq
+    ):
+        yield from entries
+
+
+def count_time_entries():
+    """Total number of time entries in harvest. Needs a single request, so is a cheap
+    way to check whether any time entries have been deleted."""
+    response = get_transport().get(
+        HARVEST_API_URL + "time_entries",
+        headers=harvest_api_headers(),
+        params={"per_page": 1},
+        limiter=get_limiter("harvest"),
+    )
+    response.raise_for_status()
 
-        for (key, df) in forecast_data.items():
-            df.to_csv(data_dir + "/forecast/" + key + ".csv")
+    return response.json()["total_entries"]
 
-    if run_harvest:
-        check_dir(data_dir + "/harvest")
 
-        harvest_data = get_harvest()
+def to_harvest_timestamp(dt):
+    """Convert a datetime to the ISO 8601 UTC format used by the harvest API."""
+    dt = pd.Timestamp(dt)
+    if dt.tzinfo is not None:
+        dt = dt.tz_convert("UTC")
 
-        for (key, df) in harvest_data.items():
-            df.to_csv(data_dir + "/harvest/" + key + ".csv")
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
@@ -0,0 +1,94 @@
+"""
+Checkpoints to resume an interrupted extraction from where it stopped.
+
+A checkpoint is a json lines file: the first line is a key identifying the run
+(e.g. its query parameters) and every other line is a progress record saved after
+some of its results were safely stored (e.g. a batch of rows committed to the
+database). Records are appended and flushed one at a time, so a crash leaves at
+most one partly written line, which is ignored. If the next run has the same key it
+picks up the previous run's records and continues after the last one, otherwise
+the old checkpoint is discarded. Delete the checkpoint when the run completes.
+"""
+import json
+import os
+
+import wimbledon.config
+
+
+class Checkpoint:
+    def __init__(self, name, key, resume=True, checkpoint_dir=None):
+        """Open the checkpoint called name, resuming it if it was saved by a run with
+        the same key.
+
+        Arguments:
+            name {str} -- name of the checkpoint file, e.g. "time_entries"
+            key {json serializable} -- identifies the run, e.g. its query parameters.
+            Progress is only resumed from a checkpoint with an equal key.
+
+        Keyword Arguments:
+            resume {bool} -- if False discard any saved progress and start again
+            (default: {True})
+            checkpoint_dir {str} -- directory to store checkpoints in (default:
+            {wimbledon.config.CHECKPOINT_DIR})
+        """
+        if checkpoint_dir is None:
+            checkpoint_dir = wimbledon.config.CHECKPOINT_DIR
+        wimbledon.config.check_dir(checkpoint_dir)
+
+        self.path = os.path.join(checkpoint_dir, name + ".jsonl")
+        # round trip through json so the key compares equal to the saved one
+        self.key = json.loads(json.dumps(key, default=str))
+        self.records = self._load() if resume else []
+
+        if len(self.records) == 0:
+            with open(self.path, "w") as f:
+                f.write(json.dumps({"key": self.key}) + "\n")
+
+    def _load(self):
+        """Progress records saved by a previous run with the same key."""
+        try:
+            with open(self.path) as f:
+                lines = f.readlines()
+        except OSError:
+            return []
+
+        try:
+            if len(lines) == 0 or json.loads(lines[0])["key"] != self.key:
+                return []
+        except (ValueError, KeyError, TypeError):
+            return []
+
+        records = []
+        for line in lines[1:]:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # partly written last line
+                break
+
+        return records
+
+    @property
+    def resumed(self):
+        """Whether there is progress from a previous run to resume."""
+        return len(self.records) > 0
+
+    @property
+    def last(self):
+        """The last progress record saved, or None."""
+        return self.records[-1] if self.resumed else None
+
+    def save(self, record):
+        """Append a progress record (json serializable dict) and flush it to disk."""
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.records.append(record)
+
+    def delete(self):
+        """Remove the checkpoint, e.g. once the run has completed."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.records = []
@@ -5,72 +5,53 @@ update our database.
 import wimbledon.sql.schema as schema
 import wimbledon.sql.db_utils as db_utils
 from wimbledon.harvest import api_interface
-
-import re
+from wimbledon.harvest.checkpoint import Checkpoint
+from wimbledon.harvest.decode import HARVEST_FIELDS, decode_records
+from wimbledon.harvest.transform import (
+    Column,
+    convert_table,
+    iter_rows,
+    remap,
+    to_int,
+    to_values,
+)
+from wimbledon.harvest.scheduler import Scheduler
+from wimbledon.transport import get_transport
+from wimbledon.http_cache import get_response_cache
+
+import threading
 import pandas as pd
-from datetime import datetime
-
-
-def to_type_or_none(value, typefn):
-    """performs typefn(value) if possible, else returns None.
-    Warning: if value is float and typefn is int, will get floor(value) back!
-    """
-    try:
-        return typefn(value)
-    except Exception:
-        return None
-
-
-def prep_data(series, typefn, convert_dict=None):
-    """converts each element in series (a pandas series) using
-    to_type_or_none with typefn.
-    optionally change values in given series, e.g. to
-    replace forecast ids with harvest ids.
-    convert_dict is an {old_value:new_value dict}"""
-    if convert_dict:
-        series = series.replace(convert_dict)
-
-    return list(map(lambda x: to_type_or_none(x, typefn), series.values))
-
-
-def string_to_date(string, fmt="%Y-%m-%d"):
-    return datetime.strptime(string, fmt).date()
-
-
-def convert_index(df):
-    """
-    1. If a harvest_user_id column is present, use that instead
-    of the original index.
-    2. If harvest_user_id is not present, or missing/nan, use the
-    original index value.
-    3. Convert the indices to ints.
-    """
-    if "harvest_user_id" in df.columns or "harvest_id" in df.columns:
-        # the original index -> generally forecast ids
-        fc_idx = df.index
-
-        if "harvest_user_id" in df.columns:
-            hv = df["harvest_user_id"]
-        else:
-            hv = df["harvest_id"]
-
-        # the desired index -> the harvest ids
-        ids = hv
-        # also keep a dictionary that can be used to convert
-        # between forecast and harvest ids
-        fc_to_hv_dict = hv.dropna().to_dict()
-
-        # replace any missing harvest ids with the original
-        # (forecast) ids
-        ids[ids.isnull()] = fc_idx[ids.isnull()].values
-
-    else:
-        ids = df.index
-        fc_to_hv_dict = None
-
-    ids = prep_data(ids, int)
-
-    return ids, fc_to_hv_dict
+import sqlalchemy as sqla
+from datetime import date, datetime, timedelta
+
+# how often to fetch every time entry/assignment to find deleted rows, rather than
+# only recently updated rows
+RECONCILE_DAYS = 7
+
+# the time entries watermark is when the fetch started less this, so entries edited
+# while the fetch was running, or just before it started on a clock that's behind
+# harvest's, are fetched again next time (fetching an entry twice is harmless)
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# earliest date to get forecast assignments from when fetching all assignments
+FORECAST_START_DATE = date(2016, 1, 1)
+
+# forecast assignments that can still change, relative to today: ending less than
+# 90 days ago or starting in the next 3 years. Assignments before this window are
+# left alone, except when all assignments are fetched.
+ASSIGNMENT_WINDOW = (timedelta(days=-90), timedelta(days=365 * 3))
+
+# where to find forecast projects' GitHub issue numbers, in order of precedence:
+# (column, regex with the issue number as its group). Projects with tags are
+# checked tag by tag.
+GITHUB_ISSUE_SOURCES = [
+    # "hut23-xxx" project codes
+    ("code", r"^hut23-(\d+)"),
+    # old "GitHub: xxx" tags
+    ("tags", r"(?i)^github:\s*(\d+)"),
+    # issue number in the project name
+    ("name", r"hut23-(\d+)"),
+]
 
 
 def merge_placeholders(
@@ -108,18 +89,6 @@ def merge_placeholders(
     return placeholders, merged_keys_dict
 
 
-def combine_people_placeholders(people, placeholders):
-    """replace all null values in people (pandas series)
-    with value from placeholders. E.g. to get one column
-    of ids for assignments.
-    people and placeholders should share same index, i.e.
-    columns from same dataframe."""
-
-    people[people.isnull()] = placeholders[people.isnull()].values
-
-    return people
-
-
 association_groups = {
     "Placeholder": 0,
     "REG Director": 1,
@@ -141,305 +110,1149 @@ def get_assoc_group(role_str):
     return association_groups["Placeholder"]
 
 
-def update_db(conn=None, with_tracked_time=True):
-    if conn is None:
-        conn = db_utils.get_db_connection()
+def full_name(df, id_maps):
+    return (df["first_name"].fillna("") + " " + df["last_name"].fillna("")).str.strip()
+
 
-    # Association
+def association(df, id_maps):
+    """association group of each row's roles (see get_assoc_group). Groups are
+    checked in order, so a row gets the lowest matching group index."""
+    groups = df["roles"].explode().map(association_groups)
+    return (
+        groups.groupby(level=0)
+        .min()
+        .reindex(df.index)
+        .fillna(association_groups["Placeholder"])
+    )
+
+
+def harvest_capacity(df, id_maps):
+    # people who are archived have no capacity
+    return df["weekly_capacity"].mask(df["is_active"].eq(False), 0)
+
+
+def forecast_capacity(df, id_maps):
+    # people who are archived have no capacity
+    return df["weekly_capacity"].mask(df["archived"].eq(True), 0)
+
+
+def assignment_person(df, id_maps):
+    """person of each assignment: its person, or if it's for a placeholder its
+    (merged) placeholder, as database ids."""
+    people = remap(df["person_id"], id_maps.get("people"))
+    placeholders = remap(df["placeholder_id"], id_maps.get("placeholders"))
+    return people.fillna(placeholders)
+
+
+def extract_github_issues(fc_projects):
+    """
+    GitHub issue numbers of forecast projects, from the first of
+    GITHUB_ISSUE_SOURCES that has one.
+
+    Returns a dataframe with the same index as fc_projects and columns github (the
+    issue number, nullable Int64) and github_source (the column it was found in,
+    or null).
+    """
+    issues = pd.Series(pd.NA, index=fc_projects.index, dtype="Int64")
+    sources = pd.Series(None, index=fc_projects.index, dtype=object)
+
+    for column, pattern in GITHUB_ISSUE_SOURCES:
+        # one row per tag
+        values = fc_projects[column].explode().astype("string")
+        matches = values.str.extract(pattern, expand=False).dropna()
+
+        # first match of each project
+        matches = matches[~matches.index.duplicated()].astype("int64")
+        found = matches.index[issues[matches.index].isna().to_numpy()]
+
+        issues[found] = matches[found]
+        sources[found] = column
+
+    return pd.DataFrame({"github": issues, "github_source": sources})
+
+
+# how the columns of each database table are made from the decoded harvest and
+# forecast tables (decode.HARVEST_FIELDS and FORECAST_FIELDS)
+HARVEST_COLUMNS = {
+    "clients": {"id": Column("id", "int"), "name": Column("name", "str")},
+    "users": {
+        "id": Column("id", "int"),
+        "name": Column(full_name, "str"),
+        "capacity": Column(harvest_capacity, "int"),
+        "association": Column(association, "int"),
+    },
+    "projects": {
+        "id": Column("id", "int"),
+        "name": Column("name", "str"),
+        "client": Column("client.id", "int"),
+        "start_date": Column("starts_on", "date"),
+        "end_date": Column("ends_on", "date"),
+    },
+    "tasks": {"id": Column("id", "int"), "name": Column("name", "str")},
+    "time_entries": {
+        "id": Column("id", "int"),
+        "project": Column("project.id", "int"),
+        "person": Column("user.id", "int"),
+        "task": Column("task.id", "int"),
+        "date": Column("spent_date", "date"),
+        "hours": Column("hours", "int"),
+    },
+}
+
+# NB: forecast client, person, placeholder and project ids are converted to
+# database ids with the crosswalk (see crosswalk_ids)
+FORECAST_COLUMNS = {
+    "clients": {
+        "id": Column("id", "int", ids="crosswalk"),
+        "name": Column("name", "str"),
+    },
+    "people": {
+        "id": Column("id", "int", ids="crosswalk"),
+        "name": Column(full_name, "str"),
+        "association": Column(association, "int"),
+        "capacity": Column(forecast_capacity, "int"),
+    },
+    "placeholders": {
+        "id": Column("id", "int", ids="crosswalk"),
+        "name": Column("name", "str"),
+        "association": Column(association, "int"),
+    },
+    "projects": {
+        "id": Column("id", "int", ids="crosswalk"),
+        "name": Column("name", "str"),
+        "client": Column("client_id", "int", ids="clients"),
+        "start_date": Column("start_date", "date"),
+        "end_date": Column("end_date", "date"),
+        "github": Column("github", "int"),
+    },
+    "assignments": {
+        "id": Column("id", "int"),
+        "project": Column("project_id", "int", ids="projects"),
+        "person": Column(assignment_person, "int"),
+        "start_date": Column("start_date", "date"),
+        "end_date": Column("end_date", "date"),
+        "allocation": Column("allocation", "int"),
+    },
+}
+
+
+def needs_reconciliation(state, reconcile_days=RECONCILE_DAYS):
+    """
+    whether a table with the given sync_state (as returned by
+    db_utils.get_sync_state) needs all its rows fetching, rather than only rows
+    updated recently.
+    """
+    if state is None or state["last_reconciled"] is None:
+        return True
+
+    return datetime.utcnow() - state["last_reconciled"] > timedelta(days=reconcile_days)
+
+
+def latest_update(df, column="updated_at"):
+    """latest time in column of df (ISO 8601 strings), as a naive UTC datetime,
+    or None if df is empty."""
+    if len(df) == 0:
+        return None
+
+    return pd.to_datetime(df[column], utc=True).max().tz_convert(None).to_pydatetime()
+
+
+def assignments_overlapping(start_date=None, end_date=None):
+    """
+    condition (sqlalchemy expression) selecting the assignments in the database
+    that overlap the period start_date to end_date (all assignments if they're
+    None).
+    """
+    table = schema.assignments
+    condition = sqla.true()
+
+    if start_date is not None:
+        condition = condition & sqla.or_(
+            table.c.end_date.is_(None), table.c.end_date >= start_date
+        )
+    if end_date is not None:
+        condition = condition & (table.c.start_date <= end_date)
+
+    return condition
+
+
+def fetched_all(*dfs):
+    """whether all the rows of the fetched tables dfs were fetched, i.e. none of
+    them has fewer rows than its API said it had (see api_interface.api_to_df).
+    Tables without a total (e.g. from forecast or the lake) count as complete."""
+    return all(df.index.nunique() >= df.attrs.get("total_entries", 0) for df in dfs)
+
+
+def forecast_linked_ids(fc_df, link_column):
+    """harvest ids that the forecast rows in fc_df are linked to (in link_column)"""
+    return fc_df[link_column].dropna().tolist()
+
+
+def crosswalk_ids(df, link_column=None, harvest_ids=()):
+    """
+    database ids of forecast rows (df, indexed by forecast id): the id of the
+    harvest row they're linked to (in link_column), otherwise their forecast id,
+    or minus their forecast id if a harvest row (in harvest_ids) already has that
+    id.
+    """
+    forecast_ids = df.index.to_series()
+    own_ids = forecast_ids.where(~forecast_ids.isin(list(harvest_ids)), -forecast_ids)
+
+    if link_column is None:
+        return own_ids
+    return df[link_column].fillna(own_ids)
+
+
+def get_stored_crosswalk(conn, entity):
+    """
+    crosswalk rows of entity in the database, as a {forecast_id: {column: value}}
+    dict.
+    """
+    table = schema.id_crosswalk
+    query = table.select().where(table.c.entity == entity)
+
+    return {row["forecast_id"]: dict(row) for row in conn.execute(query)}
+
+
+def update_crosswalk(entity, ids, conn, harvest_ids=None):
+    """
+    Store the database ids of all the forecast rows of entity ("clients",
+    "people", "placeholders" or "projects") in the id_crosswalk table. Only new or
+    changed rows are written, and rows for forecast ids that are no longer in ids
+    are deleted.
+
+    ids: series of database ids indexed by forecast id, e.g. from crosswalk_ids
+    harvest_ids: series of the ids of the linked harvest rows, with the same
+    index (default: no rows are linked)
+
+    Returns a {forecast id: database id} dict.
+    """
+    forecast_ids = ids.index.to_numpy(dtype="int64").tolist()
+    db_ids = to_values(to_int(ids), "int")
+    if harvest_ids is None:
+        linked_ids = [None] * len(forecast_ids)
+    else:
+        linked_ids = to_values(to_int(harvest_ids), "int")
+
+    rows = [
+        dict(entity=entity, forecast_id=forecast_id, harvest_id=linked_id, id=db_id)
+        for forecast_id, linked_id, db_id in zip(forecast_ids, linked_ids, db_ids)
+    ]
+    changed_rows, deleted_ids = db_utils.diff_rows(
+        rows,
+        get_stored_crosswalk(conn, entity),
+        ["harvest_id", "id"],
+        id_column="forecast_id",
+    )
+    print(len(changed_rows), entity, "crosswalk rows new or changed")
+
+    db_utils.upsert(
+        schema.id_crosswalk,
+        changed_rows,
+        conn,
+        index_elements=["entity", "forecast_id"],
+        exclude_columns=["entity", "forecast_id"],
+    )
+    if len(deleted_ids) > 0:
+        table = schema.id_crosswalk
+        r = conn.execute(
+            table.delete().where(
+                (table.c.entity == entity) & table.c.forecast_id.in_(deleted_ids)
+            )
+        )
+        print(r.rowcount, entity, "crosswalk rows deleted")
+
+    return dict(zip(forecast_ids, db_ids))
+
+
+def load_associations(conn, run_id=None):
     print("-" * 50)
     print("ASSOCIATIONS")
     print("-" * 50)
     associations = [dict(id=idx, name=name) for name, idx in association_groups.items()]
 
-    db_utils.upsert(schema.associations, associations, conn)
+    db_utils.diff_upsert(schema.associations, associations, conn, run_id=run_id)
 
-    # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-    print("=" * 50)
-    print("HARVEST")
-    print("=" * 50)
-    hv = api_interface.get_harvest(with_tracked_time=with_tracked_time)
 
-    # Client
+def load_harvest_clients(hv_clients, conn, linked_ids=(), run_id=None):
+    """Returns the ids of the clients. Rows with linked_ids (harvest ids that forecast
+    rows are linked to) aren't written, as the forecast load overwrites them."""
     print("-" * 50)
-    print("CLIENTS")
+    print("HARVEST CLIENTS")
     print("-" * 50)
 
-    client_hv_ids, _ = convert_index(hv["clients"])
-    names = prep_data(hv["clients"].name, str)
+    clients = convert_table(hv_clients, HARVEST_COLUMNS["clients"], schema.clients)
 
-    clients = [
-        {"id": client_hv_ids[i], "name": names[i]} for i in range(len(client_hv_ids))
-    ]
+    linked_ids = set(linked_ids)
+    db_utils.diff_upsert(
+        schema.clients,
+        [row for row in iter_rows(clients) if row["id"] not in linked_ids],
+        conn,
+        run_id=run_id,
+    )
 
-    db_utils.upsert(schema.clients, clients, conn)
+    return clients["id"]
 
-    # Person
+
+def load_harvest_people(hv_users, conn, linked_ids=(), run_id=None):
+    """Returns the ids of the people. Rows with linked_ids (harvest ids that forecast
+    rows are linked to) aren't written, as the forecast load overwrites them."""
     print("-" * 50)
-    print("PEOPLE")
+    print("HARVEST PEOPLE")
     print("-" * 50)
 
-    people_hv_ids, fc_to_hv_people = convert_index(hv["users"])
-    names = prep_data(hv["users"].first_name + " " + hv["users"].last_name, str)
-    associations = prep_data(hv["users"].roles.apply(get_assoc_group), int)
+    people = convert_table(hv_users, HARVEST_COLUMNS["users"], schema.people)
 
-    # set capacities to zero for people who are archived
-    hv["users"].loc[hv["users"].is_active == False, "weekly_capacity"] = 0
-    capacities = prep_data(hv["users"].weekly_capacity, int)
+    linked_ids = set(linked_ids)
+    db_utils.diff_upsert(
+        schema.people,
+        [row for row in iter_rows(people) if row["id"] not in linked_ids],
+        conn,
+        run_id=run_id,
+    )
 
-    people = [
-        dict(
-            id=people_hv_ids[i],
-            name=names[i],
-            capacity=capacities[i],
-            association=associations[i],
-        )
-        for i in range(len(people_hv_ids))
-    ]
+    return people["id"]
 
-    db_utils.upsert(schema.people, people, conn)
 
-    # Project
+def load_harvest_projects(hv_projects, conn, linked_ids=(), run_id=None):
+    """Returns the ids of the projects. Rows with linked_ids (harvest ids that forecast
+    rows are linked to) aren't written, as the forecast load overwrites them."""
     print("-" * 50)
-    print("PROJECTS")
+    print("HARVEST PROJECTS")
     print("-" * 50)
 
-    project_hv_ids, _ = convert_index(hv["projects"])
-    names = prep_data(hv["projects"].name, str)
-    # NB: convert forecast client idx to harvest idx
-    clients = prep_data(hv["projects"]["client.id"], int)
-    start_dates = prep_data(hv["projects"]["starts_on"], string_to_date)
-    end_dates = prep_data(hv["projects"]["ends_on"], string_to_date)
-
-    projects = [
-        dict(
-            id=project_hv_ids[i],
-            name=names[i],
-            client=clients[i],
-            start_date=start_dates[i],
-            end_date=end_dates[i],
-        )
-        for i in range(len(project_hv_ids))
-    ]
+    projects = convert_table(hv_projects, HARVEST_COLUMNS["projects"], schema.projects)
 
-    db_utils.upsert(schema.projects, projects, conn)
+    linked_ids = set(linked_ids)
+    db_utils.diff_upsert(
+        schema.projects,
+        [row for row in iter_rows(projects) if row["id"] not in linked_ids],
+        conn,
+        run_id=run_id,
+    )
 
-    if with_tracked_time:
-        # Task
-        print("-" * 50)
-        print("TASKS")
-        print("-" * 50)
-        task_ids, _ = convert_index(hv["tasks"])
-        names = prep_data(hv["tasks"].name, str)
+    return projects["id"]
 
-        tasks = [dict(id=task_ids[i], name=names[i]) for i in range(len(task_ids))]
 
-        db_utils.upsert(schema.tasks, tasks, conn)
+def load_tasks(hv_tasks, conn, run_id=None):
+    """Returns the ids of the tasks."""
+    print("-" * 50)
+    print("TASKS")
+    print("-" * 50)
+    tasks = convert_table(hv_tasks, HARVEST_COLUMNS["tasks"], schema.tasks)
 
-        # TimeEntry
-        print("-" * 50)
-        print("TIME ENTRIES")
-        print("-" * 50)
-        time_entry_ids, _ = convert_index(hv["time_entries"])
-        projects = prep_data(hv["time_entries"]["project.id"], int)
-        people = prep_data(hv["time_entries"]["user.id"], int)
-        tasks = prep_data(hv["time_entries"]["task.id"], int)
-        dates = prep_data(hv["time_entries"]["spent_date"], string_to_date)
-        hours = prep_data(hv["time_entries"]["hours"], int)
-
-        time_entries = [
-            dict(
-                id=time_entry_ids[i],
-                project=projects[i],
-                person=people[i],
-                task=tasks[i],
-                date=dates[i],
-                hours=hours[i],
-            )
-            for i in range(len(time_entry_ids))
-        ]
+    db_utils.diff_upsert(schema.tasks, list(iter_rows(tasks)), conn, run_id=run_id)
 
-        db_utils.upsert(schema.time_entries, time_entries, conn)
+    return tasks["id"]
 
-    # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-    # Get Forecast data
-    print("=" * 50)
-    print("FORECAST")
-    print("=" * 50)
-    fc = api_interface.get_forecast()
 
-    # Client
+def load_harvest_time_entries(
+    hv_time_entries, conn, batch_size=db_utils.BATCH_SIZE, run_id=None
+):
+    """Load a dataframe of time entries (columns as in
+    decode.HARVEST_FIELDS["time_entries"]), staging them batch_size at a time and
+    merging them into the database in one go. Returns the ids of the time
+    entries."""
     print("-" * 50)
-    print("CLIENTS")
+    print("TIME ENTRIES")
     print("-" * 50)
 
-    client_fc_ids, fc_to_hv_clients = convert_index(fc["clients"])
-    names = prep_data(fc["clients"].name, str)
+    time_entries = convert_table(
+        hv_time_entries, HARVEST_COLUMNS["time_entries"], schema.time_entries
+    )
 
-    clients = [
-        {"id": client_fc_ids[i], "name": names[i]} for i in range(len(client_fc_ids))
-    ]
+    counts = db_utils.diff_upsert(
+        schema.time_entries,
+        list(iter_rows(time_entries)),
+        conn,
+        batch_size=batch_size,
+        run_id=run_id,
+    )
+    print(sum(counts.values()), "time entries added/updated")
+
+    return time_entries["id"]
 
-    db_utils.upsert(schema.clients, clients, conn)
 
-    # Person
+def load_time_entries(
+    conn,
+    updated_since=None,
+    limiter=None,
+    batch_size=db_utils.BATCH_SIZE,
+    db_lock=None,
+    resume=True,
+    run_id=None,
+):
+    """Stream time entries from harvest into the database: each page of entries is
+    converted into rows as it arrives and written in batches of batch_size while
+    later pages are downloading, so memory use doesn't grow with the number of
+    entries. Then move the time_entries watermark to the time the fetch started,
+    less WATERMARK_OVERLAP, so entries edited while it was running are fetched
+    again next time.
+
+    After each batch is written the position of the next page is saved to a
+    checkpoint, with the ids of the entries written so far and when the fetch
+    started. Batches don't span shards (see api_interface.time_entry_shards). If
+    the update is interrupted (e.g. by a network error), running it again with the
+    same updated_since continues from the first shard that wasn't finished, from
+    its first page. Entries added or deleted since the interrupted run shift the
+    page boundaries, so the shard isn't resumed from the page it got to, which
+    could skip entries. As entries are upserted, entries that are fetched twice
+    are harmless.
+
+    updated_since: only get time entries updated since this datetime (UTC)
+    limiter: RateLimiter shared with other harvest requests
+    db_lock: lock to hold while writing each batch, if conn is shared with other
+    threads
+    resume: continue from the checkpoint of an interrupted run, if there is one
+    run_id: id of the sync run to log changes to (see db_utils.sync_run)
+
+    Returns the ids of the time entries."""
     print("-" * 50)
-    print("PEOPLE")
+    print("TIME ENTRIES")
+    if updated_since is not None:
+        print("(updated since {})".format(updated_since))
     print("-" * 50)
 
-    people_fc_ids, fc_to_hv_people = convert_index(fc["people"])
-    names = prep_data(fc["people"].first_name + " " + fc["people"].last_name, str)
+    shards = api_interface.time_entry_shards(updated_since=updated_since)
+    checkpoint = Checkpoint(
+        "time_entries",
+        key={"updated_since": updated_since, "shards": shards},
+        resume=resume,
+    )
+
+    # when the fetch started (when the interrupted run started if resuming, as
+    # entries edited since then may be in the pages it already got), the first
+    # shard that wasn't finished and the ids of the entries in the shards before it
+    started = datetime.utcnow()
+    resume_shard = 0
+    for record in checkpoint.records:
+        started = min(started, datetime.fromisoformat(record["started"]))
+        next_shard, next_page = record["next"]
+        if next_page == 1:
+            resume_shard = next_shard
+    time_entry_ids = [
+        idx
+        for record in checkpoint.records
+        if record["shard"] < resume_shard
+        for idx in record["ids"]
+    ]
 
-    associations = prep_data(fc["people"].roles.apply(get_assoc_group), int)
+    if checkpoint.resumed:
+        print(
+            "Resuming from shard {} ({} entries in earlier shards already "
+            "loaded)".format(resume_shard, len(time_entry_ids))
+        )
 
-    # set capacities to zero for people who are archived
-    fc["people"].loc[fc["people"].archived == True, "weekly_capacity"] = 0
-    capacities = prep_data(fc["people"].weekly_capacity, int)
+    n_rows = 0
+    entries = []
+
+    def write(shard, next_position):
+        nonlocal n_rows, entries
+        if len(entries) > 0:
+            time_entries = convert_table(
+                decode_records(entries, HARVEST_FIELDS["time_entries"]),
+                HARVEST_COLUMNS["time_entries"],
+                schema.time_entries,
+            )
+            n_rows += db_utils.stream_upsert(
+                schema.time_entries,
+                iter_rows(time_entries),
+                conn,
+                batch_size=batch_size,
+                lock=db_lock,
+                run_id=run_id,
+            )
 
-    people = [
-        dict(
-            id=people_fc_ids[i],
-            name=names[i],
-            association=associations[i],
-            capacity=capacities[i],
+        ids = [entry["id"] for entry in entries]
+        checkpoint.save(
+            {
+                "shard": shard,
+                "next": next_position,
+                "ids": ids,
+                "started": started.isoformat(),
+            }
         )
-        for i in range(len(people_fc_ids))
-    ]
 
-    db_utils.upsert(schema.people, people, conn)
+        time_entry_ids.extend(ids)
+        entries = []
+
+    shard = resume_shard
+    for next_position, page in api_interface.iter_time_entry_pages(
+        updated_since=updated_since,
+        limiter=limiter,
+        resume_from=(resume_shard, 1),
+    ):
+        entries += page
+        shard_finished = next_position[1] == 1
+        # only checkpoint whole pages, once they're in the database, and write
+        # each shard's last page before starting the next shard
+        if len(entries) >= batch_size or shard_finished:
+            write(shard, next_position)
+        if shard_finished:
+            shard = next_position[0]
+
+    print(n_rows, "time entries added/updated")
+
+    watermark = started - WATERMARK_OVERLAP
+    if db_lock is None:
+        db_utils.set_sync_state("time_entries", conn, watermark=watermark)
+    else:
+        with db_lock:
+            db_utils.set_sync_state("time_entries", conn, watermark=watermark)
+
+    checkpoint.delete()
+
+    return time_entry_ids
+
+
+def load_forecast_clients(fc_clients, conn, harvest_ids=(), run_id=None):
+    """Returns the ids of the clients and a dict to convert forecast client ids to
+    database ids. harvest_ids are the ids of the harvest clients, which clients only
+    in forecast mustn't reuse."""
+    print("-" * 50)
+    print("FORECAST CLIENTS")
+    print("-" * 50)
+
+    crosswalk = update_crosswalk(
+        "clients",
+        crosswalk_ids(fc_clients, "harvest_id", harvest_ids),
+        conn,
+        harvest_ids=fc_clients["harvest_id"],
+    )
+    clients = convert_table(
+        fc_clients,
+        FORECAST_COLUMNS["clients"],
+        schema.clients,
+        id_maps={"crosswalk": crosswalk},
+    )
+
+    db_utils.diff_upsert(schema.clients, list(iter_rows(clients)), conn, run_id=run_id)
+
+    return clients["id"], crosswalk
+
+
+def load_forecast_people(fc_people, conn, harvest_ids=(), run_id=None):
+    """Returns the ids of the people and a dict to convert forecast person ids to
+    database ids. harvest_ids are the ids of the harvest people, which people only
+    in forecast mustn't reuse."""
+    print("-" * 50)
+    print("FORECAST PEOPLE")
+    print("-" * 50)
+
+    crosswalk = update_crosswalk(
+        "people",
+        crosswalk_ids(fc_people, "harvest_user_id", harvest_ids),
+        conn,
+        harvest_ids=fc_people["harvest_user_id"],
+    )
+    people = convert_table(
+        fc_people,
+        FORECAST_COLUMNS["people"],
+        schema.people,
+        id_maps={"crosswalk": crosswalk},
+    )
+
+    db_utils.diff_upsert(schema.people, list(iter_rows(people)), conn, run_id=run_id)
 
-    # Placeholders
+    return people["id"], crosswalk
+
+
+def load_placeholders(fc_placeholders, conn, harvest_ids=(), run_id=None):
+    """Returns the ids of the (merged) placeholders and a dict to convert forecast
+    placeholder ids to database ids, which gives placeholders that were merged the
+    id of the placeholder they were merged into. harvest_ids are the ids of the
+    harvest people, which placeholders mustn't reuse."""
     print("-" * 50)
     print("PLACHEOLDERS")
     print("-" * 50)
 
     # consolidate placeholder names
-    placeholders, merged_placeholders = merge_placeholders(fc["placeholders"])
-    placeholder_ids, _ = convert_index(placeholders)
-    names = prep_data(placeholders.name, str)
-    associations = prep_data(placeholders.roles.apply(get_assoc_group), int)
-
-    placeholders = [
-        dict(id=placeholder_ids[i], name=names[i], association=associations[i])
-        for i in range(len(placeholder_ids))
-    ]
+    placeholders, merged_placeholders = merge_placeholders(fc_placeholders)
+
+    ids = crosswalk_ids(fc_placeholders, harvest_ids=harvest_ids)
+    ids[list(merged_placeholders)] = ids[list(merged_placeholders.values())].values
+    crosswalk = update_crosswalk("placeholders", ids, conn)
+
+    placeholders = convert_table(
+        placeholders,
+        FORECAST_COLUMNS["placeholders"],
+        schema.people,
+        id_maps={"crosswalk": crosswalk},
+    )
+
+    db_utils.diff_upsert(
+        schema.people, list(iter_rows(placeholders)), conn, run_id=run_id
+    )
+
+    return placeholders["id"], crosswalk
 
-    db_utils.upsert(schema.people, placeholders, conn)
 
-    # Project
+def load_forecast_projects(
+    fc_projects, fc_to_db_clients, conn, harvest_ids=(), run_id=None
+):
+    """Returns the ids of the projects and a dict to convert forecast project ids to
+    database ids. harvest_ids are the ids of the harvest projects, which projects
+    only in forecast mustn't reuse."""
     print("-" * 50)
-    print("PROJECTS")
+    print("FORECAST PROJECTS")
     print("-" * 50)
 
-    project_fc_ids, fc_to_hv_projects = convert_index(fc["projects"])
-    names = prep_data(fc["projects"].name, str)
-    # NB: convert forecast client idx to harvest idx
-    clients = prep_data(fc["projects"].client_id, int, convert_dict=fc_to_hv_clients)
-    start_dates = prep_data(fc["projects"].start_date, string_to_date)
-    end_dates = prep_data(fc["projects"].end_date, string_to_date)
-
-    # extract issue numbers from project codes or tags
-    githubs = []
-    for i, idx_and_row in enumerate(fc["projects"].iterrows()):
-        row = idx_and_row[1]
-        issue_number = None
-
-        if row["code"] is not None and "hut23-" in row["code"]:
-            # First check project codes for "hut23-xxx" labels
-            try:
-                issue_number = int(re.match(r"hut23-(\d+)", row["code"]).groups()[0])
-            except AttributeError:
-                pass
-        if issue_number is None and len(row["tags"]) > 0:
-            # check for old "GitHub: xxx" tags
-            tags = re.findall(
-                r"(?<=\'github:)(.*?)(?=[\'\,])", str(row["tags"]).lower()
-            )
-            if len(tags) > 0:
-                issue_number = int(tags[0])
-                break  # found an issue number - don't need to check more tags
-
-        if issue_number is None and len(names[i]) > 0:
-            # check whether issue number in project name
-            match = re.findall(r"hut23-(\d+)", names[i])
-            if match:
-                issue_number = int(match[0])
-
-        githubs.append(issue_number)
-
-    projects = [
-        dict(
-            id=project_fc_ids[i],
-            name=names[i],
-            client=clients[i],
-            start_date=start_dates[i],
-            end_date=end_dates[i],
-            github=githubs[i],
-        )
-        for i in range(len(project_fc_ids))
-    ]
+    crosswalk = update_crosswalk(
+        "projects",
+        crosswalk_ids(fc_projects, "harvest_id", harvest_ids),
+        conn,
+        harvest_ids=fc_projects["harvest_id"],
+    )
+    issues = extract_github_issues(fc_projects)
+    print(
+        "GitHub issues found in",
+        ", ".join(
+            "{} {}".format(count, source)
+            for source, count in issues["github_source"].value_counts().items()
+        ),
+        "({} projects without one)".format(issues["github"].isna().sum()),
+    )
+
+    projects = convert_table(
+        fc_projects.join(issues),
+        FORECAST_COLUMNS["projects"],
+        schema.projects,
+        id_maps={"crosswalk": crosswalk, "clients": fc_to_db_clients},
+    )
 
-    db_utils.upsert(schema.projects, projects, conn)
+    db_utils.diff_upsert(
+        schema.projects, list(iter_rows(projects)), conn, run_id=run_id
+    )
 
-    # Assignment
+    return projects["id"], crosswalk
+
+
+def load_assignments(
+    fc_assignments,
+    fc_to_db_placeholders,
+    fc_to_db_projects,
+    fc_to_db_people,
+    conn,
+    run_id=None,
+):
+    """Upsert assignments that are new or have changed since they were last stored.
+    Returns the ids of the assignments."""
     print("-" * 50)
     print("ASSIGNMENTS")
     print("-" * 50)
 
-    # replace keys for previously merged placeholders
-    fc["assignments"]["placeholder_id"].replace(merged_placeholders, inplace=True)
+    assignments = convert_table(
+        fc_assignments,
+        FORECAST_COLUMNS["assignments"],
+        schema.assignments,
+        id_maps={
+            "projects": fc_to_db_projects,
+            "people": fc_to_db_people,
+            # also replaces keys for previously merged placeholders
+            "placeholders": fc_to_db_placeholders,
+        },
+    )
+    assignments = list(iter_rows(assignments))
 
-    assignment_ids, _ = convert_index(fc["assignments"])
+    db_utils.diff_upsert(schema.assignments, assignments, conn, run_id=run_id)
 
-    # NB: convert forecast project idx to harvest idx
-    projects = prep_data(
-        fc["assignments"].project_id, int, convert_dict=fc_to_hv_projects
-    )
+    return [row["id"] for row in assignments]
 
-    # NB: combine people and placeholder ids
-    # and convert forecast person idx to harvest idx
-    people = combine_people_placeholders(
-        fc["assignments"].person_id, fc["assignments"].placeholder_id
+
+def load_frames(
+    harvest_data,
+    forecast_data,
+    conn,
+    with_tracked_time=True,
+    batch_size=db_utils.BATCH_SIZE,
+    run_id=None,
+):
+    """
+    Load complete Harvest and Forecast tables into the database without making any
+    API requests, e.g. from the data lake (see wimbledon.harvest.lake). Rows that
+    aren't in the tables are deleted.
+
+    harvest_data, forecast_data: {table name: dataframe} dicts, as returned by
+    api_interface.get_harvest and get_forecast
+    run_id: id of the sync run to log changes to, if any (see db_utils.sync_run)
+    """
+    # NB: ORDER IS IMPORTANT!! Harvest rows that forecast rows are linked to are
+    # only written by the forecast loads, so e.g. all clients must be loaded before
+    # harvest projects, and all people and projects before time entries.
+    load_associations(conn, run_id=run_id)
+    client_hv_ids = load_harvest_clients(
+        harvest_data["clients"],
+        conn,
+        linked_ids=forecast_linked_ids(forecast_data["clients"], "harvest_id"),
+        run_id=run_id,
     )
-    people = prep_data(people, int, convert_dict=fc_to_hv_people)
-
-    start_dates = prep_data(fc["assignments"].start_date, string_to_date)
-    end_dates = prep_data(fc["assignments"].end_date, string_to_date)
-    allocations = prep_data(fc["assignments"].allocation, int)
-
-    assignments = [
-        dict(
-            id=assignment_ids[i],
-            project=projects[i],
-            person=people[i],
-            start_date=start_dates[i],
-            end_date=end_dates[i],
-            allocation=allocations[i],
+    client_fc_ids, fc_to_db_clients = load_forecast_clients(
+        forecast_data["clients"], conn, harvest_ids=client_hv_ids, run_id=run_id
+    )
+    people_hv_ids = load_harvest_people(
+        harvest_data["users"],
+        conn,
+        linked_ids=forecast_linked_ids(forecast_data["people"], "harvest_user_id"),
+        run_id=run_id,
+    )
+    people_fc_ids, fc_to_db_people = load_forecast_people(
+        forecast_data["people"], conn, harvest_ids=people_hv_ids, run_id=run_id
+    )
+    placeholder_ids, fc_to_db_placeholders = load_placeholders(
+        forecast_data["placeholders"], conn, harvest_ids=people_hv_ids, run_id=run_id
+    )
+    project_hv_ids = load_harvest_projects(
+        harvest_data["projects"],
+        conn,
+        linked_ids=forecast_linked_ids(forecast_data["projects"], "harvest_id"),
+        run_id=run_id,
+    )
+    project_fc_ids, fc_to_db_projects = load_forecast_projects(
+        forecast_data["projects"],
+        fc_to_db_clients,
+        conn,
+        harvest_ids=project_hv_ids,
+        run_id=run_id,
+    )
+    if with_tracked_time:
+        task_ids = load_tasks(harvest_data["tasks"], conn, run_id=run_id)
+        time_entry_ids = load_harvest_time_entries(
+            harvest_data["time_entries"], conn, batch_size=batch_size, run_id=run_id
         )
-        for i in range(len(assignment_ids))
-    ]
 
-    db_utils.upsert(schema.assignments, assignments, conn)
+    assignment_ids = load_assignments(
+        forecast_data["assignments"],
+        fc_to_db_placeholders,
+        fc_to_db_projects,
+        fc_to_db_people,
+        conn,
+        run_id=run_id,
+    )
 
-    # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
     print("-" * 50)
-    print("DELETIONS - Rows no longer in Harvest or Forecast")
+    print("DELETIONS - Rows not in the Harvest or Forecast tables")
     print("-" * 50)
-    # Delete ids that are no longer in Forecast/Harvest
     # NB: ORDER IS IMPORTANT!! E.g. Must delete assignments to a project before
     # that project can be deleted.
-    db_utils.delete_not_in(schema.assignments, assignment_ids, conn)
+    with db_utils.transaction(conn):
+        db_utils.delete_not_in(schema.assignments, assignment_ids, conn, run_id=run_id)
+
+        if with_tracked_time:
+            db_utils.delete_not_in(
+                schema.time_entries,
+                time_entry_ids,
+                conn,
+                complete=fetched_all(harvest_data["time_entries"]),
+                run_id=run_id,
+            )
+            db_utils.delete_not_in(
+                schema.tasks,
+                task_ids,
+                conn,
+                complete=fetched_all(harvest_data["tasks"]),
+                run_id=run_id,
+            )
 
-    if with_tracked_time:
-        db_utils.delete_not_in(schema.time_entries, time_entry_ids, conn)
-        db_utils.delete_not_in(schema.tasks, task_ids, conn)
+        db_utils.delete_not_in(
+            schema.projects,
+            project_fc_ids + project_hv_ids,
+            conn,
+            cascade=[schema.assignments.c.project],
+            complete=fetched_all(harvest_data["projects"], forecast_data["projects"]),
+            run_id=run_id,
+        )
+        db_utils.delete_not_in(
+            schema.people,
+            placeholder_ids + people_fc_ids + people_hv_ids,
+            conn,
+            cascade=[schema.assignments.c.person],
+            complete=fetched_all(
+                harvest_data["users"],
+                forecast_data["people"],
+                forecast_data["placeholders"],
+            ),
+            run_id=run_id,
+        )
+        db_utils.delete_not_in(
+            schema.clients,
+            client_fc_ids + client_hv_ids,
+            conn,
+            complete=fetched_all(harvest_data["clients"], forecast_data["clients"]),
+            run_id=run_id,
+        )
 
-    db_utils.delete_not_in(schema.projects, project_fc_ids + project_hv_ids, conn)
 
-    db_utils.delete_not_in(
-        schema.people, placeholder_ids + people_fc_ids + people_hv_ids, conn
-    )
+def update_db(
+    conn=None,
+    with_tracked_time=True,
+    full_sync=False,
+    reconcile_days=RECONCILE_DAYS,
+    assignment_window=ASSIGNMENT_WINDOW,
+    batch_size=db_utils.BATCH_SIZE,
+):
+    """
+    Update the database with the latest data from Harvest and Forecast.
+
+    All the Harvest and Forecast tables are fetched concurrently (each service
+    with its own rate limit), and each table is loaded into the database as soon
+    as its data and the tables it references have been loaded.
+
+    Time entries are updated incrementally: only entries updated since the last
+    update (the watermark in the sync_state table) are fetched. Deleted entries
+    are found by comparing the number of entries in harvest and in the database,
+    and every reconcile_days all entries are fetched.
+
+    Forecast assignments are also updated incrementally: only assignments in
+    assignment_window (relative to today) are fetched, and only those that are
+    new or different to the ones stored are written. Stored assignments in the
+    window that are no longer in forecast are deleted, and assignments before the
+    window are left alone. Every reconcile_days all assignments are fetched.
+
+    conn: database connection (default: new connection from db_utils)
+    with_tracked_time: whether to update tasks and time entries
+    full_sync: fetch all time entries and assignments, not just the ones
+    updated since the last update or in assignment_window
+    reconcile_days: max days between fetching all time entries/assignments
+    assignment_window: (start, end) timedeltas relative to today of the
+    assignments to fetch
+    batch_size: number of time entries to write at a time while they are
+    downloading
+
+    Every row inserted, updated or deleted is logged to the change_log table
+    under the id of this run (see query_db.changes_since).
+    """
+    if conn is None:
+        conn = db_utils.get_db_connection()
+
+    db_utils.reset_write_stats()
+    # rows changed by the update are logged to the change_log table with this
+    # run's id, see query_db.changes_since. The run is marked as failed if the
+    # update raises an exception.
+    with db_utils.sync_run(conn) as run_id:
+
+        if with_tracked_time:
+            time_entries_state = db_utils.get_sync_state("time_entries", conn)
+            reconcile_time_entries = (
+                full_sync
+                or needs_reconciliation(time_entries_state, reconcile_days)
+                or time_entries_state["watermark"] is None
+            )
+        else:
+            reconcile_time_entries = False
+
+        if with_tracked_time and not reconcile_time_entries:
+            time_entries_since = time_entries_state["watermark"]
+        else:
+            time_entries_since = None
+
+        reconcile_assignments = full_sync or needs_reconciliation(
+            db_utils.get_sync_state("assignments", conn), reconcile_days
+        )
+        if reconcile_assignments:
+            assignments_start = FORECAST_START_DATE
+        else:
+            assignments_start = api_interface.today() + assignment_window[0]
+        assignments_end = api_interface.today() + assignment_window[1]
+
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+        # Fetch all Harvest and Forecast tables concurrently
+        scheduler = Scheduler()
+
+        # time entries are streamed into the database by load_time_entries rather
+        # than fetched here. All requests to each service share its rate limiter
+        # (rate_limit.get_limiter).
+        hv_fetchers = api_interface.harvest_fetchers(with_tracked_time=False)
+        fc_fetchers = api_interface.forecast_fetchers(
+            start_date=assignments_start, end_date=assignments_end
+        )
+        for prefix, fetchers in [("harvest", hv_fetchers), ("forecast", fc_fetchers)]:
+            for name, fetch in fetchers.items():
+                scheduler.add(prefix + "/" + name, lambda results, fetch=fetch: fetch())
+
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+        # Load each table as soon as its data and the tables it references are ready.
+        # NB: Loads that write to the same table (e.g. harvest and forecast people)
+        # keep the order of the original sequential update, so forecast values
+        # overwrite harvest ones. Harvest rows that forecast rows are linked to aren't
+        # written by the harvest loads, so unchanged rows aren't rewritten twice, and
+        # loads of rows that reference them (foreign keys) wait for the forecast loads.
+        # The connection is shared so only one load can use it at a time.
+        db_lock = threading.Lock()
+
+        def add_load(name, fn, after):
+            def load(results):
+                with db_lock:
+                    return fn(results)
+
+            scheduler.add(name, load, after=after)
+
+        add_load(
+            "load/associations",
+            lambda r: load_associations(conn, run_id=run_id),
+            after=[],
+        )
+        add_load(
+            "load/harvest_clients",
+            lambda r: load_harvest_clients(
+                r["harvest/clients"],
+                conn,
+                linked_ids=forecast_linked_ids(r["forecast/clients"], "harvest_id"),
+                run_id=run_id,
+            ),
+            after=["harvest/clients", "forecast/clients"],
+        )
+        add_load(
+            "load/harvest_people",
+            lambda r: load_harvest_people(
+                r["harvest/users"],
+                conn,
+                linked_ids=forecast_linked_ids(r["forecast/people"], "harvest_user_id"),
+                run_id=run_id,
+            ),
+            after=["harvest/users", "forecast/people", "load/associations"],
+        )
+        add_load(
+            "load/harvest_projects",
+            lambda r: load_harvest_projects(
+                r["harvest/projects"],
+                conn,
+                linked_ids=forecast_linked_ids(r["forecast/projects"], "harvest_id"),
+                run_id=run_id,
+            ),
+            # harvest projects can belong to clients only the forecast load writes
+            after=[
+                "harvest/projects",
+                "forecast/projects",
+                "load/harvest_clients",
+                "load/forecast_clients",
+            ],
+        )
+        if with_tracked_time:
+            add_load(
+                "load/tasks",
+                lambda r: load_tasks(r["harvest/tasks"], conn, run_id=run_id),
+                after=["harvest/tasks"],
+            )
+            # streams pages into the database batch by batch, so only holds the lock
+            # while writing each batch
+            scheduler.add(
+                "load/time_entries",
+                lambda r: load_time_entries(
+                    conn,
+                    updated_since=time_entries_since,
+                    batch_size=batch_size,
+                    db_lock=db_lock,
+                    run_id=run_id,
+                ),
+                # time entries can reference people and projects that only the
+                # forecast loads write
+                after=[
+                    "load/harvest_projects",
+                    "load/harvest_people",
+                    "load/forecast_projects",
+                    "load/forecast_people",
+                    "load/tasks",
+                ],
+            )
+        add_load(
+            "load/forecast_clients",
+            lambda r: load_forecast_clients(
+                r["forecast/clients"],
+                conn,
+                harvest_ids=r["load/harvest_clients"],
+                run_id=run_id,
+            ),
+            after=["forecast/clients", "load/harvest_clients"],
+        )
+        add_load(
+            "load/forecast_people",
+            lambda r: load_forecast_people(
+                r["forecast/people"],
+                conn,
+                harvest_ids=r["load/harvest_people"],
+                run_id=run_id,
+            ),
+            after=["forecast/people", "load/associations", "load/harvest_people"],
+        )
+        add_load(
+            "load/placeholders",
+            lambda r: load_placeholders(
+                r["forecast/placeholders"],
+                conn,
+                harvest_ids=r["load/harvest_people"],
+                run_id=run_id,
+            ),
+            after=["forecast/placeholders", "load/associations", "load/harvest_people"],
+        )
+        add_load(
+            "load/forecast_projects",
+            lambda r: load_forecast_projects(
+                r["forecast/projects"],
+                r["load/forecast_clients"][1],
+                conn,
+                harvest_ids=r["load/harvest_projects"],
+                run_id=run_id,
+            ),
+            after=[
+                "forecast/projects",
+                "load/forecast_clients",
+                "load/harvest_projects",
+            ],
+        )
+        add_load(
+            "load/assignments",
+            lambda r: load_assignments(
+                r["forecast/assignments"],
+                r["load/placeholders"][1],
+                r["load/forecast_projects"][1],
+                r["load/forecast_people"][1],
+                conn,
+                run_id=run_id,
+            ),
+            after=[
+                "forecast/assignments",
+                "load/placeholders",
+                "load/forecast_projects",
+                "load/forecast_people",
+            ],
+        )
+
+        print("=" * 50)
+        print("HARVEST & FORECAST")
+        print("=" * 50)
+        results = scheduler.run()
+
+        client_hv_ids = results["load/harvest_clients"]
+        people_hv_ids = results["load/harvest_people"]
+        project_hv_ids = results["load/harvest_projects"]
+        client_fc_ids, _ = results["load/forecast_clients"]
+        people_fc_ids, _ = results["load/forecast_people"]
+        placeholder_ids, _ = results["load/placeholders"]
+        project_fc_ids, _ = results["load/forecast_projects"]
+        assignment_ids = results["load/assignments"]
+        if with_tracked_time:
+            task_ids = results["load/tasks"]
+            time_entry_ids = results["load/time_entries"]
+
+            # find out whether any time entries have been deleted before starting the
+            # deletions, so no requests are made while they're in progress
+            n_harvest = api_interface.count_time_entries()
+            if not reconcile_time_entries:
+                # cheap check for deleted or missing time entries - after adding the
+                # updated entries the database should have as many entries as
+                # harvest. If it doesn't all entries are loaded again, which also
+                # inserts any that are missing (only new or changed rows are
+                # written, see db_utils.diff_upsert).
+                n_db = db_utils.count_rows(schema.time_entries, conn)
+                if n_harvest != n_db:
+                    print(
+                        n_harvest,
+                        "time entries in harvest but",
+                        n_db,
+                        "in database, loading all time entries",
+                    )
+                    time_entry_ids = load_time_entries(
+                        conn, batch_size=batch_size, run_id=run_id
+                    )
+                    reconcile_time_entries = True
+
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+        print("-" * 50)
+        print("DELETIONS - Rows no longer in Harvest or Forecast")
+        print("-" * 50)
+        # Delete ids that are no longer in Forecast/Harvest, in one transaction. Rows
+        # are only deleted if all the tables they could have come from were fetched
+        # in full (see db_utils.delete_not_in).
+        # NB: ORDER IS IMPORTANT!! E.g. Must delete assignments to a project before
+        # that project can be deleted.
+        with db_utils.transaction(conn):
+            # only assignments in the fetched period, assignments before it are left
+            # alone
+            n_deleted = db_utils.delete_not_in(
+                schema.assignments,
+                assignment_ids,
+                conn,
+                condition=assignments_overlapping(assignments_start, assignments_end),
+                run_id=run_id,
+            )
+            if reconcile_assignments and n_deleted is not None:
+                db_utils.set_sync_state(
+                    "assignments", conn, last_reconciled=datetime.utcnow()
+                )
+
+            if with_tracked_time:
+                if reconcile_time_entries:
+                    # entries added since the count was made can make it look like
+                    # some weren't fetched, they'll be reconciled next time
+                    n_deleted = db_utils.delete_not_in(
+                        schema.time_entries,
+                        time_entry_ids,
+                        conn,
+                        complete=len(set(time_entry_ids)) >= n_harvest,
+                        run_id=run_id,
+                    )
+                    if n_deleted is not None:
+                        db_utils.set_sync_state(
+                            "time_entries", conn, last_reconciled=datetime.utcnow()
+                        )
+
+                db_utils.delete_not_in(
+                    schema.tasks,
+                    task_ids,
+                    conn,
+                    complete=fetched_all(results["harvest/tasks"]),
+                    run_id=run_id,
+                )
+
+            # also deletes assignments before the fetched period to projects/people
+            # that are being deleted (forecast deletes these when the project/person
+            # is deleted)
+            db_utils.delete_not_in(
+                schema.projects,
+                project_fc_ids + project_hv_ids,
+                conn,
+                cascade=[schema.assignments.c.project],
+                complete=fetched_all(
+                    results["harvest/projects"], results["forecast/projects"]
+                ),
+                run_id=run_id,
+            )
+
+            db_utils.delete_not_in(
+                schema.people,
+                placeholder_ids + people_fc_ids + people_hv_ids,
+                conn,
+                cascade=[schema.assignments.c.person],
+                complete=fetched_all(
+                    results["harvest/users"],
+                    results["forecast/people"],
+                    results["forecast/placeholders"],
+                ),
+                run_id=run_id,
+            )
+
+            db_utils.delete_not_in(
+                schema.clients,
+                client_fc_ids + client_hv_ids,
+                conn,
+                complete=fetched_all(
+                    results["harvest/clients"], results["forecast/clients"]
+                ),
+                run_id=run_id,
+            )
+
+        print("-" * 50)
+        print("HTTP REQUESTS")
+        print("-" * 50)
+        print(get_transport().summary())
+        print("Response cache:", get_response_cache().summary())
+
+        print("-" * 50)
+        print("DATABASE WRITES")
+        print("-" * 50)
+        print(db_utils.write_summary())
 
-    db_utils.delete_not_in(schema.clients, client_fc_ids + client_hv_ids, conn)
+        print("Changes logged as sync run", run_id)
 
     conn.close()
 
@@ -0,0 +1,123 @@
+"""
+Decode json records from the Harvest and Forecast APIs straight into dataframes of
+typed columns, for the fields db_interface uses.
+
+Each table has a {column: dtype} spec. Nested fields are named by their path with
+dots, e.g. "client.id" is record["client"]["id"], matching the column names
+pd.json_normalize would give. Fields missing from a record are null.
+"""
+import pandas as pd
+
+# ids are nullable integers, everything else that isn't a number (strings,
+# dates, booleans and lists) is kept as an object
+HARVEST_FIELDS = {
+    "clients": {"id": "Int64", "name": "object"},
+    "users": {
+        "id": "Int64",
+        "first_name": "object",
+        "last_name": "object",
+        "roles": "object",
+        "is_active": "object",
+        "weekly_capacity": "float64",
+    },
+    "projects": {
+        "id": "Int64",
+        "name": "object",
+        "client.id": "Int64",
+        "starts_on": "object",
+        "ends_on": "object",
+    },
+    "tasks": {"id": "Int64", "name": "object"},
+    "time_entries": {
+        "id": "Int64",
+        "project.id": "Int64",
+        "user.id": "Int64",
+        "task.id": "Int64",
+        "spent_date": "object",
+        "hours": "float64",
+        "updated_at": "object",
+    },
+}
+
+FORECAST_FIELDS = {
+    "clients": {"id": "Int64", "name": "object", "harvest_id": "Int64"},
+    "people": {
+        "id": "Int64",
+        "first_name": "object",
+        "last_name": "object",
+        "roles": "object",
+        "archived": "object",
+        "weekly_capacity": "float64",
+        "harvest_user_id": "Int64",
+    },
+    "placeholders": {"id": "Int64", "name": "object", "roles": "object"},
+    "projects": {
+        "id": "Int64",
+        "name": "object",
+        "client_id": "Int64",
+        "start_date": "object",
+        "end_date": "object",
+        "code": "object",
+        "tags": "object",
+        "harvest_id": "Int64",
+    },
+    "assignments": {
+        "id": "Int64",
+        "project_id": "Int64",
+        "person_id": "Int64",
+        "placeholder_id": "Int64",
+        "start_date": "object",
+        "end_date": "object",
+        "allocation": "float64",
+    },
+}
+
+
+def _get_path(record, path):
+    """value at path (list of keys) in nested dicts, or None if it's missing"""
+    value = record
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+
+    return value
+
+
+def decode_records(records, fields=None, index="id"):
+    """Convert json records (dicts) into a dataframe with one column per field.
+
+    Arguments:
+        records {iterable} -- json dicts, e.g. the "users" list of a Harvest
+        response
+
+    Keyword Arguments:
+        fields {dict} -- {column: dtype} of the fields to extract, e.g.
+        HARVEST_FIELDS["users"]. If None, all fields are extracted with
+        pd.json_normalize (default: {None})
+        index {str} -- column to use as the index (default: {"id"})
+
+    Returns:
+        pd.DataFrame -- one row per record
+    """
+    if fields is None:
+        df = pd.json_normalize(list(records))
+        if len(df) > 0:
+            df.set_index(index, inplace=True)
+        return df
+
+    paths = {column: column.split(".") for column in fields}
+    values = {column: [] for column in fields}
+
+    for record in records:
+        for column, path in paths.items():
+            values[column].append(_get_path(record, path))
+
+    df = pd.DataFrame(
+        {
+            column: pd.Series(values[column], dtype=dtype)
+            for column, dtype in fields.items()
+        }
+    )
+
+    return df.set_index(index)
@@ -0,0 +1,323 @@
+"""
+Raw data lake: the Harvest and Forecast tables as extracted from their APIs, saved
+as Parquet so their dtypes are kept, and so reads only touch the columns and
+partitions they need.
+
+Layout (under wimbledon.config.LAKE_DIR by default):
+    <source>/<table>/part-0.parquet
+        one file per table, e.g. harvest/users/part-0.parquet
+    <source>/<table>/year=<year>/month=<month>/<file>.parquet
+        harvest time entries (by spent date) and forecast assignments (by start
+        date) are partitioned by month, so incremental pulls only rewrite the
+        months that changed and reads of a date range skip the other months.
+
+Every table has an id column, which is the index of the dataframes read and written.
+The model can be built from the lake without the Postgres database, e.g.
+    Wimbledon(conn=build_db().connect())
+"""
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import wimbledon.config
+import wimbledon.sql.db_utils as db_utils
+import wimbledon.sql.schema as schema
+from wimbledon.harvest import api_interface, db_interface
+from wimbledon.harvest.decode import FORECAST_FIELDS, HARVEST_FIELDS
+
+# tables partitioned by the year and month of a date column
+PARTITION_DATES = {
+    ("harvest", "time_entries"): "spent_date",
+    ("forecast", "assignments"): "start_date",
+}
+PARTITION_COLUMNS = ["year", "month"]
+
+
+def table_path(lake_dir, source, table):
+    return os.path.join(lake_dir, source, table)
+
+
+def month_filters(start_date=None, end_date=None):
+    """Filters (for read_table) selecting the month partitions from start_date to
+    end_date (either can be None for no limit), or None if both are None."""
+    # each bound is (a or b): later year, or same year and later month
+    lower = [[]]
+    if start_date is not None:
+        start = pd.Timestamp(start_date)
+        lower = [
+            [("year", ">", start.year)],
+            [("year", "=", start.year), ("month", ">=", start.month)],
+        ]
+    upper = [[]]
+    if end_date is not None:
+        end = pd.Timestamp(end_date)
+        upper = [
+            [("year", "<", end.year)],
+            [("year", "=", end.year), ("month", "<=", end.month)],
+        ]
+
+    # (a or b) and (c or d) = ac or ad or bc or bd
+    filters = [a + b for a in lower for b in upper]
+
+    return None if filters == [[]] else filters
+
+
+def with_partitions(df, date_column):
+    """df with year and month columns from date_column (ISO date strings), and the
+    id index as a column."""
+    dates = pd.to_datetime(df[date_column])
+    df = df.reset_index()
+    df["year"] = dates.dt.year.fillna(0).astype(int).values
+    df["month"] = dates.dt.month.fillna(0).astype(int).values
+
+    return df
+
+
+def read_table(lake_dir, source, table, columns=None, filters=None):
+    """Read a table from the lake, only reading the columns and partitions that are
+    needed.
+
+    Arguments:
+        lake_dir {str} -- the lake's directory
+        source {str} -- "harvest" or "forecast"
+        table {str} -- table name, e.g. "time_entries"
+
+    Keyword Arguments:
+        columns {list} -- columns to read (the id index is always read). The year
+        and month partition columns of partitioned tables are only returned if
+        they're included here (default: {None}, all columns)
+        filters {list} -- pyarrow filters: a list of (column, op, value) tuples to
+        AND, or a list of such lists to OR. Filters on year and month (see
+        month_filters) skip whole partitions, filters on other columns skip rows
+        (default: {None})
+
+    Returns:
+        pd.DataFrame -- the table, indexed by id
+    """
+    path = table_path(lake_dir, source, table)
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            "{}/{} is not in the lake {}".format(source, table, lake_dir)
+        )
+
+    read_columns = None
+    if columns is not None:
+        read_columns = ["id"] + [column for column in columns if column != "id"]
+
+    df = pd.read_parquet(path, engine="pyarrow", columns=read_columns, filters=filters)
+
+    # pyarrow reads list columns (e.g. roles) as numpy arrays, convert them back
+    for column in df.columns[df.dtypes == object]:
+        values = df[column].dropna()
+        if len(values) > 0 and isinstance(values.iloc[0], np.ndarray):
+            df[column] = df[column].map(
+                lambda value: list(value) if isinstance(value, np.ndarray) else value
+            )
+
+    for column in PARTITION_COLUMNS:
+        if column in df.columns:
+            if columns is not None and column in columns:
+                df[column] = df[column].astype(int)
+            else:
+                df = df.drop(columns=column)
+
+    return df.set_index("id")
+
+
+def write_table(df, lake_dir, source, table, mode="overwrite"):
+    """Write a table (indexed by id) to the lake.
+
+    Arguments:
+        df {pd.DataFrame} -- the table, e.g. as returned by api_interface.api_to_df
+        lake_dir {str} -- the lake's directory
+        source {str} -- "harvest" or "forecast"
+        table {str} -- table name, e.g. "time_entries"
+
+    Keyword Arguments:
+        mode {str} -- "overwrite" to replace the table, or "merge" to add df's rows
+        to it, replacing rows with the same id (e.g. for incremental pulls of
+        updated rows). For partitioned tables merging only rewrites the partitions
+        that contain df's rows or the old versions of them (default: {"overwrite"})
+    """
+    if mode not in ["overwrite", "merge"]:
+        raise ValueError("mode must be 'overwrite' or 'merge', not " + repr(mode))
+
+    path = table_path(lake_dir, source, table)
+    date_column = PARTITION_DATES.get((source, table))
+    df = df.rename_axis("id")
+
+    if mode == "merge" and os.path.exists(path):
+        if date_column is None:
+            existing = read_table(lake_dir, source, table)
+            df = pd.concat([existing[~existing.index.isin(df.index)], df])
+        else:
+            new = with_partitions(df, date_column)
+            stored = read_table(lake_dir, source, table, columns=PARTITION_COLUMNS)
+            # partitions with new rows, or old versions of rows whose date changed
+            partitions = set(zip(new["year"], new["month"])) | set(
+                zip(
+                    stored.loc[stored.index.isin(df.index), "year"],
+                    stored.loc[stored.index.isin(df.index), "month"],
+                )
+            )
+            partitions = [(int(year), int(month)) for year, month in partitions]
+
+            existing = read_table(
+                lake_dir,
+                source,
+                table,
+                filters=[
+                    [("year", "=", year), ("month", "=", month)]
+                    for year, month in partitions
+                ],
+            )
+            existing = existing[~existing.index.isin(df.index)]
+
+            for year, month in partitions:
+                partition_path = os.path.join(
+                    path, "year={}".format(year), "month={}".format(month)
+                )
+                if os.path.exists(partition_path):
+                    shutil.rmtree(partition_path)
+
+            pd.concat([existing, df]).pipe(with_partitions, date_column).to_parquet(
+                path, engine="pyarrow", index=False, partition_cols=PARTITION_COLUMNS
+            )
+            return
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+
+    if date_column is None:
+        wimbledon.config.check_dir(path)
+        df.reset_index().to_parquet(
+            os.path.join(path, "part-0.parquet"), engine="pyarrow", index=False
+        )
+    else:
+        with_partitions(df, date_column).to_parquet(
+            path, engine="pyarrow", index=False, partition_cols=PARTITION_COLUMNS
+        )
+
+
+def latest_update(lake_dir=None):
+    """Latest updated_at of the time entries in the lake (naive UTC datetime), or
+    None if there are none. Only reads the updated_at column."""
+    if lake_dir is None:
+        lake_dir = wimbledon.config.LAKE_DIR
+
+    try:
+        time_entries = read_table(
+            lake_dir, "harvest", "time_entries", columns=["updated_at"]
+        )
+    except FileNotFoundError:
+        return None
+
+    return db_interface.latest_update(time_entries)
+
+
+def update_lake(
+    lake_dir=None, run_forecast=True, run_harvest=True, time_entries_since=None
+):
+    """Extract all Harvest and Forecast tables from their APIs and write them to the
+    lake.
+
+    Keyword Arguments:
+        lake_dir {str} -- the lake's directory (default: {wimbledon.config.LAKE_DIR})
+        run_forecast {bool} -- extract the Forecast tables (default: {True})
+        run_harvest {bool} -- extract the Harvest tables (default: {True})
+        time_entries_since {datetime} -- if given, only get time entries updated
+        since this time (UTC) and merge them into the lake's time entries, e.g.
+        latest_update(lake_dir). Otherwise all time entries are replaced (default:
+        {None})
+    """
+    if lake_dir is None:
+        lake_dir = wimbledon.config.LAKE_DIR
+
+    if run_forecast:
+        forecast_data = api_interface.get_forecast()
+
+        for table, df in forecast_data.items():
+            write_table(df, lake_dir, "forecast", table)
+
+    if run_harvest:
+        harvest_data = api_interface.get_harvest(time_entries_since=time_entries_since)
+
+        for table, df in harvest_data.items():
+            mode = "overwrite"
+            if table == "time_entries" and time_entries_since is not None:
+                mode = "merge"
+            write_table(df, lake_dir, "harvest", table, mode=mode)
+
+
+def read_model_tables(lake_dir=None, with_tracked_time=True, start_date=None):
+    """Read the tables db_interface.load_frames needs to build the database, with
+    only the columns it uses.
+
+    Keyword Arguments:
+        lake_dir {str} -- the lake's directory (default: {wimbledon.config.LAKE_DIR})
+        with_tracked_time {bool} -- read tasks and time entries (default: {True})
+        start_date {date} -- only read time entries spent from this month onwards
+        (default: {None}, all time entries)
+
+    Returns:
+        tuple -- ({table: dataframe} of harvest tables, same for forecast)
+    """
+    if lake_dir is None:
+        lake_dir = wimbledon.config.LAKE_DIR
+
+    harvest_tables = ["clients", "users", "projects"]
+    if with_tracked_time:
+        harvest_tables += ["tasks", "time_entries"]
+    forecast_tables = ["clients", "people", "placeholders", "projects", "assignments"]
+
+    harvest_data = {
+        table: read_table(
+            lake_dir,
+            "harvest",
+            table,
+            columns=list(HARVEST_FIELDS[table]),
+            filters=month_filters(start_date) if table == "time_entries" else None,
+        )
+        for table in harvest_tables
+    }
+    forecast_data = {
+        table: read_table(
+            lake_dir, "forecast", table, columns=list(FORECAST_FIELDS[table])
+        )
+        for table in forecast_tables
+    }
+
+    return harvest_data, forecast_data
+
+
+def build_db(lake_dir=None, engine=None, with_tracked_time=True, start_date=None):
+    """Build a wimbledon database from the lake, without the API or the Postgres
+    database.
+
+    Keyword Arguments:
+        lake_dir {str} -- the lake's directory (default: {wimbledon.config.LAKE_DIR})
+        engine {sqlalchemy.engine.Engine} -- database to load into. If None create
+        an in-memory SQLite database (default: {None})
+        with_tracked_time {bool} -- load tasks and time entries (default: {True})
+        start_date {date} -- only load time entries spent from this month onwards
+        (default: {None}, all time entries)
+
+    Returns:
+        sqlalchemy.engine.Engine -- the engine the data was loaded into
+    """
+    if engine is None:
+        engine = db_utils.get_memory_engine()
+
+    schema.metadata.create_all(engine)
+
+    harvest_data, forecast_data = read_model_tables(
+        lake_dir, with_tracked_time=with_tracked_time, start_date=start_date
+    )
+    with engine.begin() as conn:
+        db_interface.load_frames(
+            harvest_data, forecast_data, conn, with_tracked_time=with_tracked_time
+        )
+
+    return engine
@@ -0,0 +1,94 @@
+"""
+Fetch all pages of a paginated API response concurrently. The first page is
+fetched to find out how many pages there are, then the remaining pages are
+independent so are fetched in a thread pool (subject to a shared rate limiter).
+"""
+import collections
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+# max pages to request at once. At ~1s per request this is enough to reach the
+# Harvest rate limit.
+DEFAULT_WORKERS = 8
+
+
+def iter_pages(
+    fetch_page, get_total_pages, limiter=None, max_workers=None, start_page=1
+):
+    """Yield every page of a paginated query in page order, as soon as each page is
+    available. At most max_workers pages are fetched ahead of the page being
+    consumed, so pages keep downloading while the caller processes earlier ones but
+    memory use doesn't grow with the number of pages.
+
+    Arguments:
+        fetch_page {callable} -- fetch_page(page) returns the response for page
+        number page (starting from 1)
+        get_total_pages {callable} -- get_total_pages(response) returns the total
+        number of pages from the first page's response
+
+    Keyword Arguments:
+        limiter {RateLimiter} -- rate limiter to wait on before each request
+        (default: {None}, no limit)
+        max_workers {int} -- max number of pages to fetch at once (default:
+        {DEFAULT_WORKERS})
+        start_page {int} -- first page to fetch, e.g. to resume an interrupted
+        query. The total number of pages is taken from this page's response
+        (default: {1})
+    """
+    if max_workers is None:
+        max_workers = DEFAULT_WORKERS
+
+    def limited_fetch(page):
+        if limiter is not None:
+            limiter.wait()
+        return fetch_page(page)
+
+    first = limited_fetch(start_page)
+    total_pages = get_total_pages(first)
+    yield first
+
+    if total_pages is None or total_pages <= start_page:
+        return
+
+    remaining = iter(range(start_page + 1, total_pages + 1))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        in_flight = collections.deque(
+            pool.submit(limited_fetch, page)
+            for page in itertools.islice(remaining, max_workers)
+        )
+
+        while len(in_flight) > 0:
+            response = in_flight.popleft().result()
+
+            # request the next page before handing this one over
+            next_page = next(remaining, None)
+            if next_page is not None:
+                in_flight.append(pool.submit(limited_fetch, next_page))
+
+            yield response
+
+
+def fetch_all_pages(fetch_page, get_total_pages, limiter=None, max_workers=None):
+    """Fetch every page of a paginated query.
+
+    Arguments:
+        fetch_page {callable} -- fetch_page(page) returns the response for page
+        number page (starting from 1)
+        get_total_pages {callable} -- get_total_pages(response) returns the total
+        number of pages from the first page's response
+
+    Keyword Arguments:
+        limiter {RateLimiter} -- rate limiter to wait on before each request
+        (default: {None}, no limit)
+        max_workers {int} -- max number of pages to fetch at once (default:
+        {DEFAULT_WORKERS})
+
+    Returns:
+        list -- the response for each page, in page order
+    """
+    return list(
+        iter_pages(
+            fetch_page, get_total_pages, limiter=limiter, max_workers=max_workers
+        )
+    )
@@ -0,0 +1,292 @@
+"""
+Rate limiting for API requests that may be made from several threads at once.
+
+Each service (Harvest, Forecast, GitHub) has one shared token bucket limiter (see
+get_limiter). As well as spacing requests to stay within the service's quota, the
+limiter adapts to the responses it sees: if the API says the limit has been hit
+(a 429 response, a Retry-After header or an exhausted X-RateLimit-Remaining) all
+requests to that service pause until it says to continue, and requests that fail
+with a 429 or a 5xx error are retried with exponential backoff and jitter.
+"""
+import collections
+import contextlib
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Harvest allows 100 requests per 15 seconds:
+# https://help.getharvest.com/api-v2/introduction/overview/general/#rate-limiting
+HARVEST_MAX_REQUESTS = 100
+HARVEST_PERIOD = 15
+
+# Forecast's API is undocumented, assume it has the same limit as Harvest
+FORECAST_MAX_REQUESTS = 100
+FORECAST_PERIOD = 15
+
+# GitHub allows 5000 requests (GraphQL points) per hour:
+# https://docs.github.com/en/graphql/overview/resource-limitations
+GITHUB_MAX_REQUESTS = 5000
+GITHUB_PERIOD = 3600
+
+SERVICE_LIMITS = {
+    "harvest": (HARVEST_MAX_REQUESTS, HARVEST_PERIOD),
+    "forecast": (FORECAST_MAX_REQUESTS, FORECAST_PERIOD),
+    "github": (GITHUB_MAX_REQUESTS, GITHUB_PERIOD),
+}
+
+# responses that are worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 5
+
+# exponential backoff: the nth retry waits a random time up to
+# min(BACKOFF_CAP, BACKOFF_BASE * 2 ** n) seconds
+BACKOFF_BASE = 1
+BACKOFF_CAP = 60
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Seconds to wait before retry number attempt (starting from 0), with "full
+    jitter" so that threads that fail together don't all retry together."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header, which is either a number of
+    seconds or an HTTP date. None if the header is missing or can't be parsed."""
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def format_retry_after(seconds):
+    """Retry-After header value for a wait of seconds (fractional, which
+    parse_retry_after accepts)."""
+    return "{:.3f}".format(seconds)
+
+
+class RateLimiter:
+    def __init__(
+        self, max_requests=HARVEST_MAX_REQUESTS, period=HARVEST_PERIOD, burst=None
+    ):
+        """Token bucket allowing at most max_requests requests in any period seconds.
+        Safe to share between threads.
+
+        Tokens are added at a steady rate and up to burst of them can be saved up.
+        The rate is (max_requests - burst) / period, so that even a full burst
+        followed by requests at the steady rate stays within the quota.
+
+        Keyword Arguments:
+            max_requests {int} -- max requests per period (default: {100})
+            period {numeric} -- length of the period in seconds (default: {15})
+            burst {int} -- max requests that can be made at once (default: 10% of
+            max_requests)
+        """
+        if burst is None:
+            burst = max(1, max_requests // 10)
+        if not 0 < burst < max_requests:
+            raise ValueError("burst must be between 0 and max_requests")
+
+        self.max_requests = max_requests
+        self.period = period
+        self.burst = burst
+        self.rate = (max_requests - burst) / period
+
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def unlimited(cls):
+        """Limiter that never makes requests wait (unless the API asks it to), e.g.
+        to find how fast requests can go against recorded or mock APIs."""
+        return cls(10**9, 1)
+
+    def wait(self):
+        """Block until a request can be made without exceeding the limit (or while
+        the API has asked for requests to pause), and take a token for it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+
+                if now < self._paused_until:
+                    wait_time = self._paused_until - now
+                else:
+                    self._tokens = min(
+                        self.burst, self._tokens + (now - self._updated) * self.rate
+                    )
+                    self._updated = now
+
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+
+                    wait_time = (1 - self._tokens) / self.rate
+
+            time.sleep(wait_time)
+
+    def pause(self, seconds):
+        """Stop all requests for seconds, e.g. after the API says the limit has been
+        reached. Saved up tokens are discarded so requests restart slowly."""
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = max(self._updated, self._paused_until)
+
+    def update(self, response):
+        """Adapt to the rate limit information in a response (an object with
+        status_code and headers attributes, e.g. a requests.Response).
+
+        Returns:
+            float -- seconds requests have been paused for, or None if not paused
+        """
+        headers = response.headers
+        retry_after = parse_retry_after(headers.get("Retry-After"))
+
+        if retry_after is not None and (
+            response.status_code == 429 or response.status_code >= 500
+        ):
+            self.pause(retry_after)
+            return retry_after
+
+        # e.g. GitHub: X-RateLimit-Reset is the time the quota resets (epoch
+        # seconds)
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is not None and reset is not None:
+            try:
+                if int(remaining) <= 0:
+                    seconds = max(0.0, float(reset) - time.time())
+                    self.pause(seconds)
+                    return seconds
+            except ValueError:
+                pass
+
+        return None
+
+    def send(self, send_request, retries=MAX_RETRIES):
+        """Make a request within the limit, retrying it if it fails with a 429 or 5xx
+        response or a connection error.
+
+        Arguments:
+            send_request {callable} -- makes the request and returns the response
+
+        Keyword Arguments:
+            retries {int} -- max times to retry (default: {5})
+
+        Returns:
+            the response of the last attempt
+        """
+        for attempt in range(retries + 1):
+            self.wait()
+
+            try:
+                response = send_request()
+            except (ConnectionError, TimeoutError, OSError) as err:
+                if attempt == retries:
+                    raise
+                delay = backoff_delay(attempt)
+                print("Request failed ({!r}), retrying in {:.1f}s".format(err, delay))
+                time.sleep(delay)
+                continue
+
+            paused = self.update(response)
+
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+
+            if paused is None:
+                delay = backoff_delay(attempt)
+                if response.status_code == 429:
+                    # over the limit but the API didn't say for how long, slow
+                    # everyone down
+                    self.pause(delay)
+                else:
+                    time.sleep(delay)
+            print(
+                "Got {} response, retrying (attempt {} of {})".format(
+                    response.status_code, attempt + 1, retries
+                )
+            )
+
+        return response
+
+
+class ServerRateLimit:
+    def __init__(self, max_requests, period):
+        """The server side of a rate limit, to simulate an API's limit offline (see
+        replay.ReplayTransport and bench.mock_api): at most max_requests requests
+        for each key (e.g. a host) in any period seconds, with requests over the
+        limit to be refused with a 429 response. Safe to share between threads.
+
+        Arguments:
+            max_requests {int} -- max requests per period for each key
+            period {float} -- length of the period in seconds
+        """
+        self.max_requests = max_requests
+        self.period = period
+
+        self._request_times = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+
+    def throttle(self, key):
+        """Seconds until a request for key would be within the limit (0 if it is,
+        in which case the request is counted)."""
+        with self._lock:
+            now = time.monotonic()
+            times = self._request_times[key]
+            while len(times) > 0 and now - times[0] >= self.period:
+                times.popleft()
+
+            if len(times) >= self.max_requests:
+                return self.period - (now - times[0])
+
+            times.append(now)
+            return 0
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(service):
+    """The rate limiter shared by all requests to service ("harvest", "forecast" or
+    "github"), created the first time it's needed."""
+    with _limiters_lock:
+        if service not in _limiters:
+            _limiters[service] = RateLimiter(*SERVICE_LIMITS[service])
+        return _limiters[service]
+
+
+def set_limiter(service, limiter):
+    """Replace the shared rate limiter for service, e.g. with a faster one when
+    replaying recorded responses. Returns the previous limiter (or None)."""
+    with _limiters_lock:
+        previous = _limiters.get(service)
+        _limiters[service] = limiter
+        return previous
+
+
+@contextlib.contextmanager
+def unlimited():
+    """Replace the shared limiters of all services with unlimited ones (see
+    RateLimiter.unlimited) until the end of the with block."""
+    previous = {service: get_limiter(service) for service in SERVICE_LIMITS}
+    for service in SERVICE_LIMITS:
+        set_limiter(service, RateLimiter.unlimited())
+    try:
+        yield
+    finally:
+        for service, limiter in previous.items():
+            set_limiter(service, limiter)
@@ -0,0 +1,105 @@
+"""
+Run tasks that depend on each other concurrently, starting each task as soon as
+the tasks it depends on have finished. Used to fetch all the Harvest and Forecast
+endpoints at once, and to load each table into the database as soon as its data
+and the tables it has foreign keys to are ready.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# max tasks to run at once. Most tasks are waiting on API requests, and requests
+# are limited by each service's rate limiter rather than by this.
+DEFAULT_WORKERS = 16
+
+
+class Scheduler:
+    def __init__(self, max_workers=DEFAULT_WORKERS):
+        """Run a set of tasks in a thread pool, respecting their dependencies.
+
+        Keyword Arguments:
+            max_workers {int} -- max tasks to run at once (default: {16})
+
+        Example:
+            scheduler = Scheduler()
+            scheduler.add("users", lambda results: get_users())
+            scheduler.add(
+                "load_users", lambda results: load(results["users"]), after=["users"]
+            )
+            results = scheduler.run()
+        """
+        self.max_workers = max_workers
+        self.tasks = {}
+
+    def add(self, name, fn, after=()):
+        """Add a task.
+
+        Arguments:
+            name {str} -- unique name of the task, its result is saved with this key
+            fn {callable} -- fn(results) runs the task, where results is a dict of
+            {task name: result} including the results of all the tasks in after
+
+        Keyword Arguments:
+            after {list} -- names of tasks that must finish before this one starts
+            (default: {()})
+        """
+        if name in self.tasks:
+            raise ValueError("Task {} has already been added".format(name))
+
+        self.tasks[name] = (fn, list(after))
+
+    def _check_dependencies(self):
+        for name, (_, after) in self.tasks.items():
+            missing = [dep for dep in after if dep not in self.tasks]
+            if len(missing) > 0:
+                raise ValueError(
+                    "Task {} depends on unknown tasks {}".format(name, missing)
+                )
+
+    def run(self):
+        """Run all the tasks. If a task fails no new tasks are started, and its error is
+        raised once the running tasks have finished.
+
+        Returns:
+            dict -- {task name: result}
+        """
+        self._check_dependencies()
+
+        results = {}
+        pending = dict(self.tasks)
+        running = {}
+
+        def timed(name, fn, task_results):
+            start = time.time()
+            result = fn(task_results)
+            print("{} done ({:.1f}s)".format(name, time.time() - start), flush=True)
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while len(pending) > 0 or len(running) > 0:
+                ready = [
+                    name
+                    for name, (_, after) in pending.items()
+                    if all(dep in results for dep in after)
+                ]
+                for name in ready:
+                    fn, _ = pending.pop(name)
+                    future = pool.submit(timed, name, fn, dict(results))
+                    running[future] = name
+
+                if len(running) == 0:
+                    raise ValueError(
+                        "Tasks {} have circular dependencies".format(list(pending))
+                    )
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        # stop starting new tasks
+                        pending = {}
+                        for other in running:
+                            other.cancel()
+                        raise future.exception()
+                    results[name] = future.result()
+
+        return results
@@ -0,0 +1,176 @@
+"""
+Fetch a large date range from an API as several smaller date ranges (shards, e.g.
+one per quarter) concurrently, and merge the results. Shards that fail can be
+retried on their own without fetching the others again.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pandas as pd
+
+# length of each shard, as a pandas frequency string (quarter starts)
+SHARD_FREQ = "QS"
+
+# max shards to fetch at once
+DEFAULT_WORKERS = 4
+
+
+def date_shards(start_date, end_date, freq=SHARD_FREQ, open_ended=False):
+    """Split the period start_date to end_date (inclusive) into consecutive shards
+    with boundaries at freq.
+
+    Arguments:
+        start_date {date} -- start of the period
+        end_date {date} -- end of the period (inclusive)
+
+    Keyword Arguments:
+        freq {str} -- pandas frequency string of the shard boundaries, e.g. "QS" for
+        quarters or "MS" for months (default: {"QS"})
+        open_ended {bool} -- if True the first shard has no start and the last
+        shard has no end (None), so data outside the period isn't missed
+        (default: {False})
+
+    Returns:
+        list -- (start, end) tuples of dates, inclusive
+    """
+    boundaries = [
+        boundary.date()
+        for boundary in pd.date_range(start_date, end_date, freq=freq)
+        if boundary.date() > start_date
+    ]
+    starts = [start_date] + boundaries
+    ends = [boundary - timedelta(days=1) for boundary in boundaries] + [end_date]
+    shards = list(zip(starts, ends))
+
+    if open_ended:
+        shards[0] = (None, shards[0][1])
+        shards[-1] = (shards[-1][0], None)
+
+    return shards
+
+
+class ShardFetchError(Exception):
+    def __init__(self, fetch):
+        """Raised when some shards still fail after retrying. The ShardedFetch is kept
+        in the fetch attribute so the failed shards can be retried later."""
+        self.fetch = fetch
+        super().__init__(
+            "{} shards failed: {}".format(
+                len(fetch.errors),
+                ", ".join(
+                    "{}: {!r}".format(shard, err) for shard, err in fetch.errors.items()
+                ),
+            )
+        )
+
+
+class ShardedFetch:
+    def __init__(self, fetch_shard, shards, max_workers=None):
+        """Fetch each shard of a date range concurrently.
+
+        Arguments:
+            fetch_shard {callable} -- fetch_shard(start, end) returns a dataframe of
+            the rows between start and end, indexed by id
+            shards {list} -- (start, end) tuples, e.g. from date_shards
+
+        Keyword Arguments:
+            max_workers {int} -- max shards to fetch at once (default:
+            {DEFAULT_WORKERS})
+
+        Example:
+            fetch = ShardedFetch(get_rows, date_shards(start, end))
+            fetch.run()
+            if len(fetch.errors) > 0:
+                fetch.retry()
+            df = fetch.result()
+        """
+        self.fetch_shard = fetch_shard
+        self.shards = list(shards)
+        self.max_workers = DEFAULT_WORKERS if max_workers is None else max_workers
+        self.results = {}
+        self.errors = {}
+
+    @property
+    def pending(self):
+        """Shards that haven't been fetched successfully."""
+        return [shard for shard in self.shards if shard not in self.results]
+
+    def _fetch(self, shard):
+        try:
+            self.results[shard] = self.fetch_shard(*shard)
+            self.errors.pop(shard, None)
+        except Exception as err:
+            self.errors[shard] = err
+
+    def run(self, retries=0):
+        """Fetch every shard that hasn't been fetched yet, then retry failed shards up
+        to retries more times.
+
+        Returns:
+            ShardedFetch -- self
+        """
+        for _ in range(retries + 1):
+            pending = self.pending
+            if len(pending) == 0:
+                break
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                list(pool.map(self._fetch, pending))
+
+        return self
+
+    def retry(self, shard=None):
+        """Fetch shard again, or all failed shards if shard is None.
+
+        Returns:
+            ShardedFetch -- self
+        """
+        if shard is None:
+            return self.run()
+
+        self._fetch(shard)
+        return self
+
+    def result(self):
+        """Combine the shards into one dataframe, keeping one row per id (rows that
+        overlap several shards, e.g. assignments, are returned by each of them).
+
+        Raises:
+            ShardFetchError: if any shards haven't been fetched successfully
+
+        Returns:
+            pd.DataFrame -- rows from all shards, in shard order. If the shards have
+            a "total_entries" attr (see api_interface.api_to_df) the result's is
+            their sum, as concat drops attrs.
+        """
+        if len(self.pending) > 0:
+            raise ShardFetchError(self)
+
+        frames = [self.results[shard] for shard in self.shards]
+        df = pd.concat(frames)
+        df = df[~df.index.duplicated(keep="last")]
+
+        totals = [frame.attrs.get("total_entries") for frame in frames]
+        if any(total is not None for total in totals):
+            df.attrs["total_entries"] = sum(total or 0 for total in totals)
+
+        return df
+
+
+def fetch_sharded(
+    fetch_shard, start_date, end_date, freq=SHARD_FREQ, open_ended=False, retries=2
+):
+    """Fetch start_date to end_date in shards of length freq, retrying failed shards
+    up to retries times, and combine the results.
+
+    Raises:
+        ShardFetchError: if some shards still fail. Its fetch attribute can be used
+        to retry them later without fetching the others again.
+
+    Returns:
+        pd.DataFrame -- rows from all shards, one per id
+    """
+    shards = date_shards(start_date, end_date, freq=freq, open_ended=open_ended)
+    print("Fetching", len(shards), "shards")
+
+    return ShardedFetch(fetch_shard, shards).run(retries=retries).result()
@@ -0,0 +1,132 @@
+"""
+Convert decoded Harvest and Forecast tables (see decode.py) into rows of the
+database tables, a whole column at a time.
+
+Each database column is declared as a Column: where its values come from in the
+decoded dataframe, its type, and optionally the name of an id map used to replace
+its values, e.g. Forecast client ids with the Harvest ids of the same clients.
+Whether a column can be null is taken from the database schema. For example
+
+    spec = {"id": Column("id", "int"), "client": Column("client_id", "int", "clients")}
+    columns = convert_table(fc_projects, spec, schema.projects, {"clients": fc_to_hv})
+    db_utils.upsert(schema.projects, list(iter_rows(columns)), conn)
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# format of all dates in the Harvest and Forecast APIs
+DATE_FORMAT = "%Y-%m-%d"
+
+# source: name of a column of the decoded dataframe ("id" is its index), or a
+# function of (dataframe, id maps) returning a series, for derived columns
+# type: "int", "str" or "date"
+# ids: name of the id map to replace values with, None to keep them
+Column = namedtuple("Column", ["source", "type", "ids"], defaults=[None])
+
+
+def to_int(series):
+    """Convert series to nullable integers (Int64). Floats are truncated (as int()
+    would) and values that aren't numbers are null."""
+    numbers = pd.to_numeric(series, errors="coerce")
+    if pd.api.types.is_float_dtype(numbers):
+        numbers = np.trunc(numbers)
+    return numbers.astype("Int64")
+
+
+def to_str(series):
+    """Convert series to strings, keeping nulls."""
+    return series.astype("string")
+
+
+def to_date(series):
+    """Convert series of DATE_FORMAT strings to datetimes. Values in any other
+    format are null."""
+    return pd.to_datetime(series, format=DATE_FORMAT, errors="coerce")
+
+
+CONVERTERS = {"int": to_int, "str": to_str, "date": to_date}
+
+
+def to_values(series, type):
+    """Python values of a converted series (ints, strs or dates), with None for
+    nulls, ready to be written to the database."""
+    if type == "int":
+        values = series.to_numpy(dtype="int64", na_value=0).tolist()
+    elif type == "date":
+        values = series.dt.date.tolist()
+    else:
+        values = series.astype(object).tolist()
+
+    for i in np.flatnonzero(series.isna().to_numpy()):
+        values[i] = None
+
+    return values
+
+
+def remap(series, mapping):
+    """Replace the values of series that are keys in mapping (a dict or series) with
+    their values in mapping. Other values are kept."""
+    if mapping is None or len(mapping) == 0:
+        return series
+    return series.map(mapping).fillna(series)
+
+
+def convert_table(df, columns, table, id_maps=None):
+    """Convert a decoded table into the columns of a database table.
+
+    Arguments:
+        df {pd.DataFrame} -- decoded table, indexed by id
+        columns {dict} -- {database column: Column}
+        table {sqlalchemy.Table} -- the database table, which says which columns
+        can be null
+
+    Keyword Arguments:
+        id_maps {dict} -- {name: {old id: new id}} maps named by the columns' ids
+        (default: {None})
+
+    Raises:
+        ValueError: if a column that can't be null has null values
+
+    Returns:
+        dict -- {database column: list of values}, the same length as df
+    """
+    if id_maps is None:
+        id_maps = {}
+
+    converted = {}
+    for name, column in columns.items():
+        if callable(column.source):
+            values = column.source(df, id_maps)
+        elif column.source == "id":
+            values = df.index.to_series()
+        else:
+            values = df[column.source]
+
+        if column.ids is not None:
+            values = remap(values, id_maps.get(column.ids))
+
+        values = CONVERTERS[column.type](values)
+
+        if not table.c[name].nullable and values.isna().any():
+            raise ValueError(
+                "{} rows of {} have no {} (ids {})".format(
+                    values.isna().sum(),
+                    table.name,
+                    name,
+                    df.index[values.isna().to_numpy()].tolist(),
+                )
+            )
+
+        converted[name] = to_values(values, column.type)
+
+    return converted
+
+
+def iter_rows(columns):
+    """{column: value} dicts of the rows of converted columns (as returned by
+    convert_table), e.g. for db_utils.stream_upsert."""
+    names = list(columns)
+    for values in zip(*columns.values()):
+        yield dict(zip(names, values))
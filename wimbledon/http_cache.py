@@ -0,0 +1,197 @@
+"""
+On-disk cache of json API responses, revalidated with conditional requests.
+
+Reference tables (clients, roles, tasks, people etc.) rarely change, so rather than
+downloading them in full every sync the cache stores each response with its ETag and
+Last-Modified validators and sends them back as If-None-Match and If-Modified-Since
+headers. If the resource hasn't changed the API replies 304 Not Modified with no
+body and the cached json is used instead.
+
+Use get_response_cache() to get the shared cache, e.g.
+    data = get_response_cache().get_json(url, headers=headers, params=params)
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import wimbledon.config
+from wimbledon.transport import get_transport
+
+# request headers (lower case) that identify the account a response is for, so
+# responses for different accounts or tokens don't share cache entries
+ACCOUNT_HEADERS = ["authorization", "harvest-account-id", "forecast-account-id"]
+
+
+class ResponseCache:
+    def __init__(self, cache_dir=None):
+        """Cache of json responses keyed by URL, query parameters and account (see
+        ACCOUNT_HEADERS), with one file per response in cache_dir. Safe to share
+        between threads.
+
+        Keyword Arguments:
+            cache_dir {str} -- directory to store responses in (default:
+            {wimbledon.config.HTTP_CACHE_DIR})
+        """
+        if cache_dir is None:
+            cache_dir = wimbledon.config.HTTP_CACHE_DIR
+        self.cache_dir = cache_dir
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, url, params=None, headers=None):
+        """Name of the cache file for a GET of url with query parameters params and
+        request headers headers. Only the headers in ACCOUNT_HEADERS are part of
+        the key. It's a hash, so tokens aren't stored."""
+        if params is None:
+            params = {}
+        if headers is None:
+            headers = {}
+        account = sorted(
+            (name.lower(), value)
+            for name, value in headers.items()
+            if name.lower() in ACCOUNT_HEADERS
+        )
+        request = json.dumps([url, sorted(params.items()), account], default=str)
+
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def load(self, key):
+        """Cached entry (dict of url, params, etag, last_modified and body) for
+        key, or None if it isn't cached."""
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, key, entry):
+        """Write an entry to the cache. Written to a temporary file then renamed, so
+        concurrent readers never see a partial entry."""
+        wimbledon.config.check_dir(self.cache_dir)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def get_json(self, url, headers=None, params=None, limiter=None):
+        """GET url and return its json response, using the cached response if the
+        server says it hasn't changed (304 Not Modified).
+
+        Arguments:
+            url {str} -- URL to get
+
+        Keyword Arguments:
+            headers {dict} -- request headers (default: {None})
+            params {dict} -- query parameters (default: {None})
+            limiter {RateLimiter} -- rate limiter to make the request within
+            (default: {None})
+
+        Returns:
+            json response (dict)
+        """
+        key = self.key(url, params, headers)
+        entry = self.load(key)
+
+        request_headers = dict(headers) if headers is not None else {}
+        if entry is not None:
+            if entry.get("etag") is not None:
+                request_headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified") is not None:
+                request_headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = get_transport().get(
+            url, headers=request_headers, params=params, limiter=limiter
+        )
+
+        if response.status_code == 304 and entry is not None:
+            with self._lock:
+                self.hits += 1
+            return entry["body"]
+
+        response.raise_for_status()
+        with self._lock:
+            self.misses += 1
+
+        body = response.json()
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+
+        # without a validator the response can't be revalidated, so isn't worth
+        # storing
+        if etag is not None or last_modified is not None:
+            self.save(
+                key,
+                {
+                    "url": url,
+                    "params": params,
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "body": body,
+                },
+            )
+
+        return body
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def summary(self):
+        """Printable line of the cache hits and misses."""
+        stats = self.stats()
+        total = stats["hits"] + stats["misses"]
+        hit_rate = stats["hits"] / total if total > 0 else 0
+
+        return "{:d} hits {:d} misses ({:.0%} hit rate), cache in {}".format(
+            stats["hits"], stats["misses"], hit_rate, self.cache_dir
+        )
+
+    def clear(self):
+        """Delete all cached responses."""
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """The response cache shared by all API clients, created the first time it's
+    needed."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+
+def set_response_cache(cache):
+    """Replace the shared response cache, e.g. with one in a different directory.
+    Returns the previous cache."""
+    global _cache
+    with _cache_lock:
+        previous = _cache
+        _cache = cache
+        return previous
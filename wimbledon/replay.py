@@ -0,0 +1,271 @@
+"""
+Record API responses to a fixture directory and replay them offline.
+
+RecordingTransport makes real requests (like Transport) and saves each response -
+status, headers and body, which includes Harvest's pagination links - to a json
+file in the fixture directory. ReplayTransport serves the saved responses without
+credentials or a network connection, optionally with artificial latency and a
+simulated server-side rate limit that returns 429 responses, so the whole ingestion
+path (get_harvest, get_forecast, update_db, get_reactions) can be timed
+reproducibly and its concurrency tuned locally.
+
+Install either with wimbledon.transport.set_transport, e.g.
+    set_transport(ReplayTransport("data/fixtures", latency=0.2))
+
+Which requests are made depends on the date (e.g. assignments are fetched up to
+three years ahead, time entries in quarterly shards up to today), so also pin the
+date with pin_recording_date when recording and replaying.
+"""
+import hashlib
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import wimbledon.config
+from wimbledon.harvest import api_interface
+from wimbledon.harvest.rate_limit import ServerRateLimit, format_retry_after
+from wimbledon.transport import Transport
+
+# request headers that make the server's reply depend on what the client has cached,
+# so aren't sent while recording (fixtures must be full responses)
+CONDITIONAL_HEADERS = ["If-None-Match", "If-Modified-Since"]
+
+# file in a fixture directory with the date the responses were recorded on
+RECORDED_ON_FILE = "recorded_on.json"
+
+# response headers not worth saving, or wrong once the body has been decoded
+SKIP_RESPONSE_HEADERS = {
+    "content-encoding",
+    "content-length",
+    "transfer-encoding",
+    "connection",
+    "set-cookie",
+}
+
+
+def fixture_key(method, url, params=None, json_body=None):
+    """Name of the fixture file for a request: a hash of its method, URL, query
+    parameters (from the URL and params) and json body. Headers (e.g. credentials)
+    aren't part of the key."""
+    parsed = urlparse(url)
+    query = parse_qsl(parsed.query)
+    if params is not None:
+        query += [(str(key), str(value)) for key, value in params.items()]
+
+    request = json.dumps(
+        [
+            method.upper(),
+            parsed.scheme + "://" + parsed.netloc + parsed.path,
+            sorted(query),
+            json_body,
+        ],
+        sort_keys=True,
+        default=str,
+    )
+
+    return hashlib.sha256(request.encode()).hexdigest()
+
+
+def pin_recording_date(fixture_dir, record=False):
+    """Pin the date extraction periods are relative to (api_interface.set_today),
+    so a replay makes the same requests as the recording, whatever day it's run
+    on. When recording pin today's date and save it in fixture_dir (in
+    RECORDED_ON_FILE), when replaying pin the saved date.
+
+    Arguments:
+        fixture_dir {str} -- directory the responses are saved in
+
+    Keyword Arguments:
+        record {bool} -- whether responses are being recorded (default: {False})
+
+    Returns:
+        date -- the pinned date, or None if replaying fixtures without a saved date
+        (which only replay on the day they were recorded)
+    """
+    path = os.path.join(fixture_dir, RECORDED_ON_FILE)
+
+    if record:
+        recorded_on = date.today()
+        wimbledon.config.check_dir(fixture_dir)
+        with open(path, "w") as f:
+            json.dump({"recorded_on": recorded_on.isoformat()}, f)
+    elif os.path.isfile(path):
+        with open(path) as f:
+            recorded_on = date.fromisoformat(json.load(f)["recorded_on"])
+    else:
+        print("No", RECORDED_ON_FILE, "in", fixture_dir, "- not pinning the date")
+        return None
+
+    api_interface.set_today(recorded_on)
+    return recorded_on
+
+
+def to_response(fixture, url):
+    """Build a requests.Response from a saved fixture."""
+    response = requests.Response()
+    response.status_code = fixture["status_code"]
+    response.reason = fixture.get("reason")
+    response.headers = CaseInsensitiveDict(fixture["headers"])
+    response._content = fixture["body"].encode("utf-8")
+    response.encoding = "utf-8"
+    response.url = url
+
+    return response
+
+
+class RecordingTransport(Transport):
+    def __init__(self, fixture_dir, **kwargs):
+        """Transport that makes real requests and saves every response to
+        fixture_dir, for ReplayTransport. 429 responses aren't saved (replays
+        simulate rate limiting separately), so retried requests keep the response
+        that eventually succeeded. Takes the same keyword arguments as Transport.
+
+        Arguments:
+            fixture_dir {str} -- directory to save the responses in
+        """
+        super().__init__(**kwargs)
+        self.fixture_dir = fixture_dir
+        wimbledon.config.check_dir(fixture_dir)
+
+    def send(self, method, url, **kwargs):
+        headers = dict(kwargs.get("headers") or {})
+        for header in CONDITIONAL_HEADERS:
+            headers.pop(header, None)
+        kwargs["headers"] = headers
+
+        start = time.perf_counter()
+        response = super().send(method, url, **kwargs)
+        seconds = time.perf_counter() - start
+
+        if response.status_code != 429:
+            self.save(
+                fixture_key(method, url, kwargs.get("params"), kwargs.get("json")),
+                {
+                    "method": method.upper(),
+                    "url": url,
+                    "params": kwargs.get("params"),
+                    "status_code": response.status_code,
+                    "reason": response.reason,
+                    "headers": {
+                        name: value
+                        for name, value in response.headers.items()
+                        if name.lower() not in SKIP_RESPONSE_HEADERS
+                    },
+                    "body": response.text,
+                    "seconds": seconds,
+                },
+            )
+
+        return response
+
+    def save(self, key, fixture):
+        """Write a fixture (via a temporary file, so replays never see a partial
+        one)."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.fixture_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(fixture, f, default=str)
+            os.replace(tmp_path, os.path.join(self.fixture_dir, key + ".json"))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+class ReplayTransport(Transport):
+    def __init__(
+        self,
+        fixture_dir,
+        latency=0.0,
+        jitter=0.0,
+        max_requests=None,
+        period=None,
+        retry_after=None,
+        **kwargs
+    ):
+        """Transport that serves responses saved by RecordingTransport instead of
+        making requests. Takes the same keyword arguments as Transport (and keeps
+        the same per-host statistics).
+
+        Arguments:
+            fixture_dir {str} -- directory the responses were saved in
+
+        Keyword Arguments:
+            latency {float or str} -- seconds to wait before each response, or
+            "recorded" to wait as long as the request took when it was recorded
+            (default: {0.0})
+            jitter {float} -- add a random extra wait of up to jitter seconds to
+            each response (default: {0.0})
+            max_requests {int} -- simulate a server rate limit of max_requests per
+            period seconds for each host: requests over the limit get a 429
+            response (default: {None}, no limit)
+            period {float} -- length of the rate limit period in seconds (default:
+            {None})
+            retry_after {float} -- Retry-After header (seconds) of 429 responses,
+            or None to give the time until a request would be allowed (default:
+            {None})
+        """
+        super().__init__(**kwargs)
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.max_requests = max_requests
+        self.period = period
+        self.retry_after = retry_after
+
+        self.server_limit = None
+        if max_requests is not None:
+            self.server_limit = ServerRateLimit(max_requests, period)
+
+    def load(self, key):
+        path = os.path.join(self.fixture_dir, key + ".json")
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(
+                "No recorded response for this request in {}, record it with "
+                "RecordingTransport first".format(self.fixture_dir)
+            )
+
+    def throttle(self, host):
+        """Seconds until a request to host would be within the simulated rate limit
+        (0 if it is, in which case the request is counted)."""
+        if self.server_limit is None:
+            return 0
+        return self.server_limit.throttle(host)
+
+    def send(self, method, url, **kwargs):
+        full_url = url
+        if kwargs.get("params"):
+            full_url += ("&" if "?" in url else "?") + urlencode(kwargs["params"])
+
+        wait = self.throttle(urlparse(url).netloc)
+        if wait > 0:
+            retry_after = self.retry_after if self.retry_after is not None else wait
+            return to_response(
+                {
+                    "status_code": 429,
+                    "reason": "Too Many Requests",
+                    "headers": {"Retry-After": format_retry_after(retry_after)},
+                    "body": "",
+                },
+                full_url,
+            )
+
+        fixture = self.load(
+            fixture_key(method, url, kwargs.get("params"), kwargs.get("json"))
+        )
+
+        delay = fixture["seconds"] if self.latency == "recorded" else self.latency
+        delay += random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        return to_response(fixture, full_url)
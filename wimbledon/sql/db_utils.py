@@ -1,8 +1,20 @@
+import contextlib
+import hashlib
+import io
+import itertools
+import json
+import threading
+from datetime import datetime
+
 import sqlalchemy as sqla
 from sqlalchemy.dialects.postgresql import insert as psql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 import wimbledon.config
 
+# number of rows to write to the database in each statement when streaming rows
+BATCH_SIZE = 1000
+
 
 def get_db_connection():
     engine = get_db_engine()
@@ -22,6 +34,17 @@ def get_db_engine():
     return sqla.create_engine(url)
 
 
+def get_memory_engine():
+    """Engine for a new, empty in-memory SQLite database. All connections share a
+    single DBAPI connection (which may be used from any thread), so the database
+    persists between connections."""
+    return sqla.create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=sqla.pool.StaticPool,
+    )
+
+
 def upsert(table, data, conn, index_elements=["id"], exclude_columns=["id"]):
     """
     table: sqlalchemy table ojbect
@@ -29,29 +52,612 @@ def upsert(table, data, conn, index_elements=["id"], exclude_columns=["id"]):
     conn: db connection to execute upsert on
     index_elements: index columns to check for conflicts on
     exclude_columns: don't update these columns
+    Works with postgres and (e.g. for databases built from the data lake) sqlite.
+    Rows are written in statements of at most BATCH_SIZE rows.
     """
+    if len(data) == 0:
+        print("No rows to add/update in", table.name)
+        return
+
     print("First row in data:", data[0])
 
-    insert_stmt = psql_insert(table).values(data)
+    rowcount = 0
+    for batch in batched(data, BATCH_SIZE):
+        r = conn.execute(
+            upsert_statement(table, batch, conn, index_elements, exclude_columns)
+        )
+        rowcount += r.rowcount
+
+    print(rowcount, "rows added/updated in", table.name)
+
+
+def upsert_statement(table, data, conn, index_elements=["id"], exclude_columns=["id"]):
+    """
+    INSERT ... ON CONFLICT DO UPDATE statement for data (see upsert), for postgres
+    or sqlite depending on conn. data can also be a select, whose columns are
+    inserted in the order of the table's columns.
+    """
+    if conn.dialect.name == "sqlite":
+        insert_stmt = sqlite_insert(table)
+    else:
+        insert_stmt = psql_insert(table)
+
+    if isinstance(data, sqla.sql.Select):
+        insert_stmt = insert_stmt.from_select([col.name for col in table.columns], data)
+    else:
+        insert_stmt = insert_stmt.values(data)
 
     update_columns = {
         col.name: col for col in insert_stmt.excluded if col.name not in exclude_columns
     }
 
-    upsert_stmt = insert_stmt.on_conflict_do_update(
+    return insert_stmt.on_conflict_do_update(
         index_elements=index_elements, set_=update_columns
     )
 
-    r = conn.execute(upsert_stmt)
 
-    print(r.rowcount, "rows added/updated in", table.name)
+def transaction(conn):
+    """
+    context manager for a transaction on conn, or for nothing if conn is already
+    in one (whose commit or rollback then includes the statements in the block).
+    """
+    if conn.in_transaction():
+        return contextlib.nullcontext()
+    return conn.begin()
+
+
+# staging tables of diff_upsert and load_ids, one per table
+_staging_metadata = sqla.MetaData()
+
+
+def temporary_table(name, columns, conn):
+    """
+    temporary table with columns (list of sqlalchemy Columns), created the first
+    time it's needed in conn's database session. It's private to the session, so
+    concurrent updates don't share it, and (in postgres) isn't written to the
+    write-ahead log.
+    """
+    if name in _staging_metadata.tables:
+        temp_table = _staging_metadata.tables[name]
+    else:
+        temp_table = sqla.Table(
+            name, _staging_metadata, *columns, prefixes=["TEMPORARY"]
+        )
+
+    temp_table.create(conn, checkfirst=True)
+    return temp_table
+
+
+def get_staging_table(table, conn):
+    """
+    temporary table (see temporary_table) with the columns of table and a row_hash
+    column, to load rows into before merging them into table. It's emptied by
+    load_staging.
+    """
+    return temporary_table(
+        "staging_" + table.name,
+        [sqla.Column(col.name, col.type) for col in table.columns]
+        + [sqla.Column("row_hash", sqla.String)],
+        conn,
+    )
+
+
+def copy_value(value):
+    """value in the text format of postgres' COPY"""
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_rows(table, rows, conn):
+    """
+    write rows (list of {colname: value} dicts with all of table's columns) to
+    table with postgres' COPY, which is much faster than INSERTs. conn must use
+    the psycopg2 driver.
+    """
+    columns = [col.name for col in table.columns]
+    data = io.StringIO()
+    for row in rows:
+        data.write("\t".join(copy_value(row[col]) for col in columns) + "\n")
+    data.seek(0)
+
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(
+            "COPY {} ({}) FROM STDIN".format(table.name, ", ".join(columns)), data
+        )
+    finally:
+        cursor.close()
+
+
+def load_staging(staging, rows, conn, batch_size=BATCH_SIZE):
+    """
+    replace the contents of a staging table (see get_staging_table) with rows,
+    written batch_size rows at a time: with COPY in postgres (with psycopg2),
+    otherwise with executemany INSERTs.
+    """
+    conn.execute(staging.delete())
+
+    for batch in batched(rows, batch_size):
+        if conn.dialect.driver == "psycopg2":
+            copy_rows(staging, batch, conn)
+        else:
+            conn.execute(staging.insert(), batch)
+
+
+def diff_upsert(table, data, conn, batch_size=BATCH_SIZE, run_id=None):
+    """
+    upsert only the rows of data (list of {colname: value} dicts, with an id) that
+    are new or have changed since they were last written, by comparing a hash of
+    each row's values with the hash stored in the row_hashes table when it was
+    written. Rows are only compared with what this function last wrote, so changes
+    made to the database by other means aren't detected.
+    The rows and their hashes are bulk loaded into a staging table (see
+    load_staging, batch_size rows at a time) and merged into table with a few
+    set-based statements, all in one transaction, so the size of each statement
+    doesn't grow with the number of rows.
+    Inserted and updated rows are added to the change log of the sync run with id
+    run_id, if given (see sync_run).
+    Returns a dict of the number of rows unchanged, updated and inserted, which are
+    also added to the write stats (see write_summary).
+    """
+    from wimbledon.sql.schema import row_hashes
+
+    columns = [col.name for col in table.columns]
+    hash_columns = [col for col in columns if col != "id"]
+
+    # a row can't be upserted twice in one statement, keep the last version
+    rows = {row["id"]: row for row in data}
+    staged = (
+        {
+            **{col: row.get(col) for col in columns},
+            "row_hash": row_hash(row, hash_columns),
+        }
+        for row in rows.values()
+    )
+
+    with transaction(conn):
+        staging = get_staging_table(table, conn)
+        load_staging(staging, staged, conn, batch_size=batch_size)
+
+        # staged rows with the current version of the row and its stored hash
+        joined = staging.outerjoin(table, table.c.id == staging.c.id).outerjoin(
+            row_hashes,
+            (row_hashes.c.table_name == table.name) & (row_hashes.c.id == staging.c.id),
+        )
+        inserted = table.c.id.is_(None)
+        changed = inserted | row_hashes.c.hash.is_(None)
+        changed = changed | (row_hashes.c.hash != staging.c.row_hash)
+
+        n_rows, n_inserted, n_changed = conn.execute(
+            sqla.select(
+                [
+                    sqla.func.count(),
+                    sqla.func.coalesce(
+                        sqla.func.sum(sqla.case([(inserted, 1)], else_=0)), 0
+                    ),
+                    sqla.func.coalesce(
+                        sqla.func.sum(sqla.case([(changed, 1)], else_=0)), 0
+                    ),
+                ]
+            ).select_from(joined)
+        ).fetchone()
+
+        if n_changed > 0:
+            log_changes(
+                table,
+                sqla.select(
+                    [
+                        staging.c.id,
+                        sqla.case([(inserted, "insert")], else_="update"),
+                        row_hashes.c.hash,
+                        staging.c.row_hash,
+                    ]
+                )
+                .select_from(joined)
+                .where(changed),
+                conn,
+                run_id,
+            )
+
+            # hashes are compared before either statement, so the second one still
+            # sees which rows have changed
+            conn.execute(
+                upsert_statement(
+                    table,
+                    sqla.select([staging.c[col] for col in columns])
+                    .select_from(joined)
+                    .where(changed),
+                    conn,
+                )
+            )
+            conn.execute(
+                upsert_statement(
+                    row_hashes,
+                    sqla.select(
+                        [
+                            sqla.literal(table.name, sqla.String),
+                            staging.c.id,
+                            staging.c.row_hash,
+                        ]
+                    )
+                    .select_from(joined)
+                    .where(changed),
+                    conn,
+                    index_elements=["table_name", "id"],
+                    exclude_columns=["table_name", "id"],
+                )
+            )
+
+    counts = {
+        "unchanged": n_rows - n_changed,
+        "updated": n_changed - n_inserted,
+        "inserted": n_inserted,
+    }
+    print(
+        "{}: {unchanged} unchanged, {updated} updated, {inserted} inserted".format(
+            table.name, **counts
+        )
+    )
+
+    record_writes(table.name, **counts)
+
+    return counts
+
+
+def batched(rows, batch_size=BATCH_SIZE):
+    """
+    split an iterable of rows into lists of at most batch_size rows, without
+    reading more than batch_size rows from it at a time.
+    """
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if len(batch) == 0:
+            return
+        yield batch
+
+
+def stream_upsert(table, rows, conn, batch_size=BATCH_SIZE, lock=None, run_id=None):
+    """
+    upsert an iterable (e.g. generator) of {colname: value} dicts in batches of
+    batch_size rows, so only one batch needs to be in memory at a time. Only rows
+    that are new or have changed are written (see diff_upsert).
+    lock: if given, lock to hold while writing each batch (e.g. if conn is
+    shared with other threads)
+    run_id: id of the sync run to log changes to (see diff_upsert)
+    Returns the number of rows in the stream (written or not).
+    """
+    n_rows = 0
+
+    for batch in batched(rows, batch_size):
+        if lock is None:
+            counts = diff_upsert(
+                table, batch, conn, batch_size=batch_size, run_id=run_id
+            )
+        else:
+            with lock:
+                counts = diff_upsert(
+                    table, batch, conn, batch_size=batch_size, run_id=run_id
+                )
+
+        n_rows += sum(counts.values())
+
+    return n_rows
 
 
-def delete_not_in(table, ids, conn):
+def load_ids(table, ids, conn, batch_size=BATCH_SIZE):
+    """
+    temporary table (see temporary_table) with an id column holding ids, e.g. the
+    ids of the rows of table that were just fetched, for anti-joins against table
+    (see delete_not_in). It's emptied before ids are loaded, batch_size at a time.
+    """
+    id_table = temporary_table(
+        "staging_" + table.name + "_ids",
+        [sqla.Column("id", sqla.Integer, primary_key=True)],
+        conn,
+    )
+    load_staging(id_table, ({"id": idx} for idx in set(ids)), conn, batch_size)
+
+    return id_table
+
+
+def delete_not_in(
+    table,
+    ids,
+    conn,
+    condition=None,
+    cascade=(),
+    complete=True,
+    batch_size=BATCH_SIZE,
+    run_id=None,
+):
     """
     delete rows in table that have an id which is not
     present in ids.
+    ids: list of ids, or a table of ids returned by load_ids. A list is loaded into
+    a staging table (see load_ids) and rows are deleted with an anti-join against
+    it, all in one transaction, so the statement doesn't grow with the number of
+    ids.
+    condition: if given, only delete rows that also match this sqlalchemy
+    expression (e.g. assignments in the period that was fetched)
+    cascade: columns of other tables that reference table's ids. Their rows that
+    reference ids not in ids are deleted first.
+    complete: set to False if ids may be missing some of the ids that are still in
+    the source, e.g. because a fetch came back with fewer rows than the API said it
+    had. Then nothing is deleted. Nothing is deleted if ids is empty either.
+    run_id: id of the sync run to log the deleted rows to (see delete_where)
+    Returns the number of rows deleted from table, or None if deleting was skipped.
     """
-    delete_stmt = table.delete().where(table.c.id.notin_(ids))
-    r = conn.execute(delete_stmt)
-    print(r.rowcount, "rows deleted from", table.name)
+    if not complete:
+        print("Not deleting from", table.name, "as not all its rows were fetched")
+        return None
+
+    with transaction(conn):
+        if not isinstance(ids, sqla.Table):
+            ids = load_ids(table, ids, conn, batch_size=batch_size)
+
+        if count_rows(ids, conn) == 0:
+            print("Not deleting from", table.name, "as no rows were fetched")
+            return None
+
+        for column in cascade:
+            n_deleted = delete_where(
+                column.table,
+                column.isnot(None) & ~sqla.exists().where(ids.c.id == column),
+                conn,
+                run_id=run_id,
+            )
+            print(
+                n_deleted,
+                "rows deleted from",
+                column.table.name,
+                "referencing deleted",
+                table.name,
+            )
+
+        not_in_ids = ~sqla.exists().where(ids.c.id == table.c.id)
+        if condition is not None:
+            not_in_ids = condition & not_in_ids
+        n_deleted = delete_where(table, not_in_ids, conn, run_id=run_id)
+
+    print(n_deleted, "rows deleted from", table.name)
+
+    return n_deleted
+
+
+def delete_ids(table, ids, conn, run_id=None):
+    """
+    delete rows in table that have an id in ids (logged to the sync run with id
+    run_id, if given).
+    """
+    if len(ids) == 0:
+        print("0 rows deleted from", table.name)
+        return
+
+    n_deleted = delete_where(table, table.c.id.in_(ids), conn, run_id=run_id)
+    print(n_deleted, "rows deleted from", table.name)
+
+
+def delete_where(table, condition, conn, run_id=None):
+    """
+    delete rows in table that match condition (a sqlalchemy expression). They're
+    added to the change log of the sync run with id run_id, if given (see
+    sync_run).
+    Returns the number of rows deleted.
+    """
+    from wimbledon.sql.schema import row_hashes
+
+    log_changes(
+        table,
+        sqla.select(
+            [table.c.id, sqla.literal("delete"), row_hashes.c.hash, sqla.null()]
+        )
+        .select_from(
+            table.outerjoin(
+                row_hashes,
+                (row_hashes.c.table_name == table.name)
+                & (row_hashes.c.id == table.c.id),
+            )
+        )
+        .where(condition),
+        conn,
+        run_id,
+    )
+
+    r = conn.execute(table.delete().where(condition))
+
+    record_writes(table.name, deleted=r.rowcount)
+    delete_orphan_hashes(table, conn)
+
+    return r.rowcount
+
+
+def delete_orphan_hashes(table, conn):
+    """
+    delete the stored hashes (see diff_upsert) of rows that are no longer in
+    table.
+    """
+    from wimbledon.sql.schema import row_hashes
+
+    conn.execute(
+        row_hashes.delete().where(
+            (row_hashes.c.table_name == table.name)
+            & ~sqla.exists().where(table.c.id == row_hashes.c.id)
+        )
+    )
+
+
+def row_hash(row, columns):
+    """
+    hash of the values of columns in row (a {colname: value} dict, missing
+    columns are None), for checking whether a row has changed.
+    """
+    values = json.dumps([str(row.get(col)) for col in columns])
+    return hashlib.md5(values.encode()).hexdigest()
+
+
+def diff_rows(new_rows, old_rows, columns, id_column="id"):
+    """
+    compare new_rows (list of {colname: value} dicts) with old_rows
+    ({id: {colname: value}} dict), e.g. rows from an API with rows already in
+    the database.
+
+    Returns a tuple of:
+    - the rows in new_rows that are not in old_rows, or that have different
+    values in columns
+    - the ids in old_rows that are not in new_rows
+    """
+    old_hashes = {idx: row_hash(row, columns) for idx, row in old_rows.items()}
+
+    changed = [
+        row
+        for row in new_rows
+        if old_hashes.get(row[id_column]) != row_hash(row, columns)
+    ]
+
+    new_ids = set(row[id_column] for row in new_rows)
+    deleted = [idx for idx in old_rows if idx not in new_ids]
+
+    return changed, deleted
+
+
+def count_rows(table, conn):
+    """number of rows in table"""
+    query = sqla.select([sqla.func.count()]).select_from(table)
+    return conn.execute(query).scalar()
+
+
+def get_sync_state(table_name, conn):
+    """
+    get the incremental update state of table_name from the sync_state table,
+    as a dict with keys table_name, watermark and last_reconciled, or None if
+    the table has never been synced.
+    """
+    from wimbledon.sql.schema import sync_state
+
+    query = sync_state.select().where(sync_state.c.table_name == table_name)
+    row = conn.execute(query).fetchone()
+
+    if row is None:
+        return None
+    return dict(row)
+
+
+def set_sync_state(table_name, conn, **values):
+    """
+    update the incremental update state of table_name, e.g.
+    set_sync_state("time_entries", conn, watermark=datetime(2020, 1, 1))
+    """
+    from wimbledon.sql.schema import sync_state
+
+    state = get_sync_state(table_name, conn)
+
+    if state is None:
+        conn.execute(sync_state.insert().values(table_name=table_name, **values))
+    else:
+        conn.execute(
+            sync_state.update()
+            .where(sync_state.c.table_name == table_name)
+            .values(**values)
+        )
+
+
+@contextlib.contextmanager
+def sync_run(conn):
+    """
+    context manager for a run of the update: adds a run to the sync_runs table and
+    gives its id, to pass to diff_upsert and the delete functions so the changes
+    they make are logged to it (in the change_log table). When the block ends the
+    run is marked as finished, or as failed if the block raised an exception.
+    Each run has its own id, so runs that overlap (e.g. on different connections)
+    log their changes separately.
+    """
+    from wimbledon.sql.schema import sync_runs
+
+    r = conn.execute(
+        sync_runs.insert().values(started=datetime.utcnow(), status="running")
+    )
+    run_id = r.inserted_primary_key[0]
+
+    status = "failed"
+    try:
+        yield run_id
+        status = "finished"
+    finally:
+        conn.execute(
+            sync_runs.update()
+            .where(sync_runs.c.id == run_id)
+            .values(finished=datetime.utcnow(), status=status)
+        )
+
+
+def log_changes(table, changes, conn, run_id):
+    """
+    add changes to rows of table to the change_log of the sync run with id run_id
+    (see sync_run), if it isn't None. changes is a select of the columns id,
+    operation ("insert", "update" or "delete"), old_hash and new_hash, in that
+    order.
+    """
+    from wimbledon.sql.schema import change_log
+
+    if run_id is None:
+        return
+
+    changes = changes.alias("changes")
+    conn.execute(
+        change_log.insert().from_select(
+            ["run_id", "table_name", "id", "operation", "old_hash", "new_hash"],
+            sqla.select(
+                [
+                    sqla.literal(run_id, sqla.Integer),
+                    sqla.literal(table.name, sqla.String),
+                    *changes.c,
+                ]
+            ),
+        )
+    )
+
+
+# number of rows unchanged, updated, inserted and deleted in each table since the
+# last reset_write_stats, e.g. in the last update of the database
+_write_stats = {}
+_write_stats_lock = threading.Lock()
+
+WRITE_COUNTS = ["unchanged", "updated", "inserted", "deleted"]
+
+
+def record_writes(table_name, **counts):
+    """add counts (unchanged, updated, inserted or deleted rows) to the write
+    stats of table_name"""
+    with _write_stats_lock:
+        stats = _write_stats.setdefault(table_name, dict.fromkeys(WRITE_COUNTS, 0))
+        for name, count in counts.items():
+            stats[name] += count
+
+
+def get_write_stats():
+    """{table name: {"unchanged", "updated", "inserted", "deleted": count}}"""
+    with _write_stats_lock:
+        return {name: dict(stats) for name, stats in _write_stats.items()}
+
+
+def reset_write_stats():
+    with _write_stats_lock:
+        _write_stats.clear()
+
+
+def write_summary():
+    """Printable table of the write stats of each table."""
+    return "\n".join(
+        "{:<16} {:>8d} unchanged {:>7d} updated {:>7d} inserted {:>7d} deleted".format(
+            name, *[stats[count] for count in WRITE_COUNTS]
+        )
+        for name, stats in sorted(get_write_stats().items())
+    )
@@ -1,5 +1,19 @@
+import warnings
+
 from wimbledon.sql import db_utils
+from wimbledon.sql import schema
 import pandas as pd
+import sqlalchemy as sqla
+
+# merged placeholder names created by db_interface.merge_placeholders, which
+# Wimbledon always needs to be able to look up
+PLACEHOLDER_NAMES = [
+    "PEOPLE REQUIRED",
+    "UNCONFIRMED",
+    "DEFERRED",
+    "NOT FUNDED",
+    "DIRECTOR'S RESERVE",
+]
 
 
 def get_data(conn=None, with_tracked_time=True):
@@ -40,4 +54,297 @@ def get_data(conn=None, with_tracked_time=True):
 
         data["tasks"] = pd.read_sql_table("tasks", conn, index_col="id")
 
+    data["id_crosswalk"] = get_crosswalk(conn=conn)
+
+    return data
+
+
+def get_crosswalk(conn=None, entity=None):
+    """Get the Forecast to Harvest id crosswalk (see schema.id_crosswalk), e.g. to
+    join Forecast data to the database tables.
+
+    Keyword Arguments:
+        conn {sqlalchemy.engine.Connection} -- Connection to a wimbledon
+        database. If none get from wimbledon config (default: {None})
+
+        entity {str} -- only get the rows for "clients", "people", "placeholders"
+        or "projects" (default: {None}, all rows)
+
+    Returns:
+        pd.DataFrame -- columns entity, forecast_id, harvest_id (nullable) and id
+        (the database id). Empty if the database doesn't have a crosswalk yet.
+    """
+    if conn is None:
+        conn = db_utils.get_db_connection()
+
+    table = schema.id_crosswalk
+    if not sqla.inspect(conn).has_table(table.name):
+        return pd.DataFrame(
+            {
+                "entity": pd.Series(dtype=object),
+                "forecast_id": pd.Series(dtype="Int64"),
+                "harvest_id": pd.Series(dtype="Int64"),
+                "id": pd.Series(dtype="Int64"),
+            }
+        )
+
+    query = table.select()
+    if entity is not None:
+        query = query.where(table.c.entity == entity)
+
+    crosswalk = pd.read_sql(query, conn)
+    for column in ["forecast_id", "harvest_id", "id"]:
+        crosswalk[column] = crosswalk[column].astype("Int64")
+
+    return crosswalk
+
+
+# statuses of runs of the update that have ended (see schema.sync_runs). Failed
+# runs are included as the changes they made before failing are in the database.
+ENDED_STATUSES = ["finished", "failed"]
+
+
+def last_sync_run(conn=None):
+    """Get the id of the last run of the update (see schema.sync_runs) that every
+    earlier run has also ended before, to pass to changes_since next time. Runs
+    after the first one that is still running aren't counted even if they've
+    finished, so that run's changes aren't skipped once it finishes.
+
+    Keyword Arguments:
+        conn {sqlalchemy.engine.Connection} -- Connection to a wimbledon
+        database. If none get from wimbledon config (default: {None})
+
+    Returns:
+        int -- the run's id, or None if no update has ended yet
+    """
+    if conn is None:
+        conn = db_utils.get_db_connection()
+
+    table = schema.sync_runs
+    query = sqla.select([sqla.func.max(table.c.id)]).where(
+        table.c.status.in_(ENDED_STATUSES)
+    )
+
+    running = first_running_sync_run(conn)
+    if running is not None:
+        query = query.where(table.c.id < running)
+
+    return conn.execute(query).scalar()
+
+
+def first_running_sync_run(conn):
+    """id of the first run of the update that hasn't ended (the low-water mark of
+    the runs whose changes can be processed), or None if they all have. Warns if
+    it holds back the changes of later runs that have ended, e.g. because its
+    process was killed."""
+    table = schema.sync_runs
+    running = conn.execute(
+        sqla.select([sqla.func.min(table.c.id)]).where(
+            table.c.status.notin_(ENDED_STATUSES)
+        )
+    ).scalar()
+    if running is None:
+        return None
+
+    n_later = conn.execute(
+        sqla.select([sqla.func.count()])
+        .select_from(table)
+        .where(table.c.id > running)
+        .where(table.c.status.in_(ENDED_STATUSES))
+    ).scalar()
+    if n_later > 0:
+        warnings.warn(
+            "Sync run {} hasn't ended, so the changes of the {} run(s) that ended "
+            "after it are left out until it does. If its process was killed, set "
+            "its status to failed in the sync_runs table.".format(running, n_later)
+        )
+
+    return running
+
+
+def changes_since(run_id=None, conn=None, tables=None):
+    """Get the rows inserted, updated or deleted by the runs of the update after
+    run_id (see schema.change_log), e.g. to only redo the work affected by them.
+    Only the changes of runs that have ended (finished, or failed after making
+    some changes) are included, and none from the first run that is still running
+    onwards, even if later runs have ended. Keep last_sync_run as the run_id for
+    next time, so no run's changes are skipped.
+
+    Keyword Arguments:
+        run_id {int} -- id of the last run whose changes have already been
+        processed (default: {None}, all changes)
+
+        conn {sqlalchemy.engine.Connection} -- Connection to a wimbledon
+        database. If none get from wimbledon config (default: {None})
+
+        tables {list} -- only get changes to these tables, e.g. ["assignments"]
+        (default: {None}, all tables)
+
+    Returns:
+        pd.DataFrame -- columns run_id, table_name, id, operation ("insert",
+        "update" or "delete"), old_hash and new_hash, sorted by run. A row
+        changed by several runs has one row per run.
+    """
+    if conn is None:
+        conn = db_utils.get_db_connection()
+
+    table = schema.change_log
+    runs = schema.sync_runs
+    ended_runs = sqla.select([runs.c.id]).where(runs.c.status.in_(ENDED_STATUSES))
+
+    query = table.select().where(table.c.run_id.in_(ended_runs))
+    running = first_running_sync_run(conn)
+    if running is not None:
+        query = query.where(table.c.run_id < running)
+    if run_id is not None:
+        query = query.where(table.c.run_id > run_id)
+    if tables is not None:
+        query = query.where(table.c.table_name.in_(tables))
+
+    return pd.read_sql(query.order_by(table.c.run_id), conn)
+
+
+def get_entity_data(
+    conn=None,
+    person=None,
+    project=None,
+    start_date=None,
+    end_date=None,
+    with_tracked_time=True,
+):
+    """Extract only the wimbledon data needed to model one person or one project,
+    in the same format as get_data.
+
+    For a person: their assignments and time entries, the projects those refer to
+    and the merged placeholders. For a project: its assignments and time entries,
+    the people those refer to, and those people's assignments to UNAVAILABLE
+    projects (so their capacities match the full model). All clients, tasks and
+    associations are always loaded as they are small.
+
+    Keyword Arguments:
+        conn {sqlalchemy.engine.Connection} -- Connection to a wimbledon
+        database. If none get from wimbledon config (default: {None})
+
+        person {int or str} -- id or name of the person to extract (default: {None})
+
+        project {int or str} -- id or name of the project to extract
+        (default: {None})
+
+        start_date, end_date {datetime} -- only get assignments overlapping, and
+        time entries within, this window (default: {None}, no limit)
+
+        with_tracked_time {bool} -- whether to get time entries data
+        (default: {True})
+
+    Returns:
+        dict -- dictionary of pandas dataframes
+    """
+    if (person is None) == (project is None):
+        raise ValueError("exactly one of person or project must be given")
+
+    if conn is None:
+        conn = db_utils.get_db_connection()
+
+    if person is not None:
+        id_column = "person"
+        entity_id = _resolve_id(schema.people, person, conn)
+    else:
+        id_column = "project"
+        entity_id = _resolve_id(schema.projects, project, conn)
+
+    assignments = schema.assignments
+    assign_filter = assignments.c[id_column] == entity_id
+    if start_date is not None:
+        assign_filter &= sqla.or_(
+            assignments.c.end_date.is_(None), assignments.c.end_date >= start_date
+        )
+    if end_date is not None:
+        assign_filter &= assignments.c.start_date <= end_date
+
+    if id_column == "project":
+        # people on the project may be unavailable for part of the time, which
+        # affects their capacities
+        unavail_projects = (
+            sqla.select(schema.projects.c.id)
+            .join(schema.clients, schema.projects.c.client == schema.clients.c.id)
+            .where(schema.clients.c.name == "UNAVAILABLE")
+        )
+        project_people = sqla.select(assignments.c.person).where(assign_filter)
+        assign_filter = sqla.or_(
+            assign_filter,
+            assignments.c.person.in_(project_people)
+            & assignments.c.project.in_(unavail_projects),
+        )
+
+    data = {
+        "assignments": pd.read_sql(
+            assignments.select().where(assign_filter),
+            conn,
+            index_col="id",
+            parse_dates=["start_date", "end_date"],
+        )
+    }
+
+    people_ids = {entity_id} if id_column == "person" else set()
+    project_ids = {entity_id} if id_column == "project" else set()
+    people_ids.update(data["assignments"]["person"])
+    project_ids.update(data["assignments"]["project"])
+
+    if with_tracked_time:
+        time_entries = schema.time_entries
+        entry_filter = time_entries.c[id_column] == entity_id
+        if start_date is not None:
+            entry_filter &= time_entries.c.date >= start_date
+        if end_date is not None:
+            entry_filter &= time_entries.c.date <= end_date
+
+        data["time_entries"] = pd.read_sql(
+            time_entries.select().where(entry_filter),
+            conn,
+            index_col="id",
+            parse_dates=["date"],
+        )
+        people_ids.update(data["time_entries"]["person"])
+        project_ids.update(data["time_entries"]["project"])
+
+        data["tasks"] = pd.read_sql_table("tasks", conn, index_col="id")
+
+    people = schema.people
+    data["people"] = pd.read_sql(
+        people.select().where(
+            people.c.id.in_([int(idx) for idx in people_ids])
+            | people.c.name.in_(PLACEHOLDER_NAMES)
+        ),
+        conn,
+        index_col="id",
+    )
+
+    projects = schema.projects
+    data["projects"] = pd.read_sql(
+        projects.select().where(projects.c.id.in_([int(idx) for idx in project_ids])),
+        conn,
+        index_col="id",
+        parse_dates=["start_date", "end_date"],
+    )
+
+    data["associations"] = pd.read_sql_table("associations", conn, index_col="id")
+
+    data["clients"] = pd.read_sql_table("clients", conn, index_col="id")
+
+    data["id_crosswalk"] = get_crosswalk(conn=conn)
+
     return data
+
+
+def _resolve_id(table, value, conn):
+    """Get the id of a person or project given either its id or its name."""
+    if not isinstance(value, str):
+        return int(value)
+
+    ids = conn.execute(sqla.select(table.c.id).where(table.c.name == value)).fetchall()
+    if len(ids) != 1:
+        raise KeyError(
+            "Could not find unique row in {} with name {}".format(table.name, value)
+        )
+
+    return ids[0][0]
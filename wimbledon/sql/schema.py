@@ -70,6 +70,75 @@ time_entries = sqla.Table(
     sqla.Column("hours", sqla.Integer, nullable=False),
 )
 
+# database ids of forecast clients, people, placeholders and projects (entity), and
+# the harvest rows they're linked to, so data from the two systems can be joined
+# without re-deriving the mapping. Linked rows have their harvest id, rows only in
+# forecast keep their forecast id unless a harvest row already has it, in which
+# case they get minus their forecast id. Merged placeholders have the id of the
+# placeholder they were merged into.
+id_crosswalk = sqla.Table(
+    "id_crosswalk",
+    metadata,
+    sqla.Column("entity", sqla.String, primary_key=True),
+    sqla.Column("forecast_id", sqla.Integer, primary_key=True),
+    sqla.Column("harvest_id", sqla.Integer),
+    sqla.Column("id", sqla.Integer, nullable=False),
+    sqla.Index("ix_id_crosswalk_harvest_id", "entity", "harvest_id"),
+    sqla.Index("ix_id_crosswalk_id", "entity", "id"),
+)
+
+# hash of the values of each row last written by the update (see
+# db_utils.diff_upsert), so rows that haven't changed aren't written again
+row_hashes = sqla.Table(
+    "row_hashes",
+    metadata,
+    sqla.Column("table_name", sqla.String, primary_key=True),
+    sqla.Column("id", sqla.Integer, primary_key=True),
+    sqla.Column("hash", sqla.String, nullable=False),
+)
+
+# each run of the update (db_interface.update_db, see db_utils.sync_run). status is
+# "running", "finished" or "failed", and finished is when it finished or failed
+# (null while it's running, or if the process was killed)
+sync_runs = sqla.Table(
+    "sync_runs",
+    metadata,
+    sqla.Column("id", sqla.Integer, primary_key=True),
+    sqla.Column("started", sqla.DateTime, nullable=False),
+    sqla.Column("finished", sqla.DateTime),
+    sqla.Column("status", sqla.String, nullable=False),
+)
+
+# rows inserted, updated or deleted by each run of the update, with the hashes of
+# the rows' values before and after (see db_utils.diff_upsert), so later stages
+# can only redo the work affected by the changes (see query_db.changes_since).
+# operation is "insert", "update" or "delete".
+change_log = sqla.Table(
+    "change_log",
+    metadata,
+    sqla.Column(
+        "run_id", sqla.Integer, sqla.ForeignKey("sync_runs.id"), nullable=False
+    ),
+    sqla.Column("table_name", sqla.String, nullable=False),
+    sqla.Column("id", sqla.Integer, nullable=False),
+    sqla.Column("operation", sqla.String, nullable=False),
+    sqla.Column("old_hash", sqla.String),
+    sqla.Column("new_hash", sqla.String),
+    sqla.Index("ix_change_log_run_id", "run_id"),
+)
+
+# state of incremental updates from the APIs, one row per table:
+# watermark - when the last fetch started (less an overlap), only rows updated after
+# this need to be fetched next time
+# last_reconciled - when all rows were last fetched (to find deleted rows)
+sync_state = sqla.Table(
+    "sync_state",
+    metadata,
+    sqla.Column("table_name", sqla.String, primary_key=True),
+    sqla.Column("watermark", sqla.DateTime),
+    sqla.Column("last_reconciled", sqla.DateTime),
+)
+
 
 def create_schema(engine=None):
     if engine is None:
@@ -0,0 +1,203 @@
+"""
+Shared HTTP transport for the Harvest, Forecast and GitHub APIs.
+
+All requests go through one requests.Session, so connections to each host are
+pooled and kept alive between requests (rather than a new TCP+TLS handshake per
+request), responses are gzip compressed, and every request has a timeout. The
+transport also counts the requests made to each host and records a histogram of
+their latencies.
+
+Use get_transport() to get the shared transport, e.g.
+    response = get_transport().get(url, headers=headers)
+"""
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (10, 60)
+
+# max connections to keep open to each host - enough for the concurrent page
+# fetches in wimbledon.harvest.pagination and scheduler
+POOL_MAXSIZE = 16
+
+# upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf")]
+
+
+class HostStats:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Request count, errors and latency histogram for one host."""
+        self.buckets = buckets
+        self.requests = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.status_codes = {}
+        self.histogram = [0] * len(buckets)
+
+    def record(self, seconds, status_code=None):
+        """Record a request that took seconds and returned status_code (None if
+        the request failed without a response)."""
+        self.requests += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+        if status_code is None or status_code >= 400:
+            self.errors += 1
+        self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+
+        for i, upper in enumerate(self.buckets):
+            if seconds <= upper:
+                self.histogram[i] += 1
+                break
+
+    @property
+    def mean_seconds(self):
+        return self.total_seconds / self.requests if self.requests > 0 else None
+
+    def to_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "mean_seconds": self.mean_seconds,
+            "max_seconds": self.max_seconds,
+            "status_codes": dict(self.status_codes),
+            "latency_histogram": {
+                bucket_label(self.buckets, i): count
+                for i, count in enumerate(self.histogram)
+            },
+        }
+
+
+def bucket_label(buckets, i):
+    """Label of the i-th histogram bucket, e.g. "<=0.5s", or ">10s" for the last
+    (unbounded) bucket."""
+    if buckets[i] == float("inf"):
+        return ">{}s".format(buckets[i - 1])
+    return "<={}s".format(buckets[i])
+
+
+class Transport:
+    def __init__(self, timeout=DEFAULT_TIMEOUT, pool_maxsize=POOL_MAXSIZE):
+        """A pooled, keep-alive HTTP session that records per-host statistics. Safe
+        to share between threads.
+
+        Keyword Arguments:
+            timeout {float or tuple} -- default timeout for requests, in seconds, or
+            a (connect, read) tuple (default: {(10, 60)})
+            pool_maxsize {int} -- max connections to keep open to each host
+            (default: {16})
+        """
+        self.timeout = timeout
+        self.session = requests.Session()
+
+        adapter = HTTPAdapter(pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.session.headers.update(
+            {"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"}
+        )
+
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, url, limiter=None, **kwargs):
+        """Make a request with the shared session, using the default timeout unless
+        one is given. Takes the same arguments as requests.request, plus limiter: a
+        wimbledon.harvest.rate_limit.RateLimiter to make the request within, which
+        also retries it on 429 and 5xx responses."""
+        if limiter is not None:
+            return limiter.send(lambda: self.request(method, url, **kwargs))
+
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlparse(url).netloc
+
+        start = time.perf_counter()
+        status_code = None
+        try:
+            response = self.send(method, url, **kwargs)
+            status_code = response.status_code
+            return response
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                if host not in self._stats:
+                    self._stats[host] = HostStats()
+                self._stats[host].record(seconds, status_code)
+
+    def send(self, method, url, **kwargs):
+        """Send one request over the network and return its requests.Response.
+        Subclasses override this to record or replay responses (see
+        wimbledon.replay)."""
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        """{host: dict of request count, errors, latencies and latency histogram}"""
+        with self._lock:
+            return {host: stats.to_dict() for host, stats in self._stats.items()}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {}
+
+    def summary(self):
+        """Printable table of the requests made to each host."""
+        row = "{:<28} {:>6d} requests {:>4d} errors {:>7.3f}s mean {:>7.3f}s max"
+        lines = []
+        for host, stats in sorted(self.stats().items()):
+            lines.append(
+                row.format(
+                    host,
+                    stats["requests"],
+                    stats["errors"],
+                    stats["mean_seconds"],
+                    stats["max_seconds"],
+                )
+            )
+            lines.append(
+                "    "
+                + " ".join(
+                    "{}:{}".format(bucket, count)
+                    for bucket, count in stats["latency_histogram"].items()
+                )
+            )
+
+        return "\n".join(lines)
+
+    def close(self):
+        self.session.close()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """The transport shared by all API clients, created the first time it's
+    needed."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport()
+        return _transport
+
+
+def set_transport(transport):
+    """Replace the shared transport, e.g. with one that has different timeouts.
+    Returns the previous transport."""
+    global _transport
+    with _transport_lock:
+        previous = _transport
+        _transport = transport
+        return previous
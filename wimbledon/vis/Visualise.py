@@ -33,7 +33,22 @@ class Visualise:
         freq=None,
         work_hrs_per_day=None,
         proj_hrs_per_day=None,
+        wim=None,
+        profile_memory=False,
+        profile_path=None,
     ):
+        """Visualisations of Wimbledon data.
+
+        Keyword Arguments:
+            wim {Wimbledon} -- use this Wimbledon object instead of building a new
+            one, in which case conn, update_db, with_tracked_time, work_hrs_per_day,
+            proj_hrs_per_day, profile_memory and profile_path are ignored
+            (default: {None})
+            profile_memory {bool} -- whether to record peak memory in the Wimbledon
+            build profile (default: {False})
+            profile_path {str} -- append the Wimbledon build profile to this file as
+            json lines (default: {None})
+        """
 
         # location of this file: used to find reg_capacity.csv
         self.script_dir = os.path.dirname(os.path.realpath(__file__))
@@ -53,13 +68,17 @@ class Visualise:
 
         # TODO: Deal with case where time tracking not initiated but a
         # TODO: function tries to use them.
-        self.wim = Wimbledon(
-            conn=conn,
-            update_db=update_db,
-            with_tracked_time=with_tracked_time,
-            work_hrs_per_day=work_hrs_per_day,
-            proj_hrs_per_day=proj_hrs_per_day,
-        )
+        if wim is None:
+            wim = Wimbledon(
+                conn=conn,
+                update_db=update_db,
+                with_tracked_time=with_tracked_time,
+                work_hrs_per_day=work_hrs_per_day,
+                proj_hrs_per_day=proj_hrs_per_day,
+                profile_memory=profile_memory,
+                profile_path=profile_path,
+            )
+        self.wim = wim
 
         #  set default time parameters
         if start_date is None:
@@ -74,6 +93,12 @@ class Visualise:
 
         self.FREQ = "MS" if freq is None else freq
 
+    @property
+    def build_profile(self):
+        """Timings, memory and row counts of each stage of building the Wimbledon
+        object (see wimbledon.build_profile.BuildProfile)."""
+        return self.wim.build_profile
+
     def get_time_parameters(self, start_date=None, end_date=None, freq=None):
 
         if start_date is None:
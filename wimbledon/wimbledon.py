@@ -7,6 +7,7 @@ import pandas as pd
 
 import wimbledon.config
 import wimbledon.harvest.db_interface
+from wimbledon.build_profile import BuildProfile
 from wimbledon.sql import query_db
 
 
@@ -51,6 +52,9 @@ class Wimbledon:
         with_tracked_time=True,
         work_hrs_per_day=None,
         proj_hrs_per_day=None,
+        data=None,
+        profile_memory=False,
+        profile_path=None,
     ):
         """Load and group Wimbledon data.
 
@@ -60,19 +64,42 @@ class Wimbledon:
             proj_hrs_per_day {numeric} -- nominal hours spent on projects per day (default: 6.4)
             conn {SQLAlchemy connection} -- connection to database (default: get from wimbledon config)
             with_tracked_time {bool} -- whether to load and process timesheet data (default: {True})
+            data {dict} -- pre-loaded tables in the format returned by
+                query_db.get_data, used instead of querying the database
+                (default: {None})
+            profile_memory {bool} -- whether to record the peak memory increase of
+                each build stage in build_profile, slows the build down
+                (default: {False})
+            profile_path {str} -- append build_profile to this file as json lines,
+                keeping the last build_profile.MAX_BUILDS builds (default: {None})
         """
+        # wall time, memory and rows of each stage of the build
+        self.build_profile = BuildProfile(trace_memory=profile_memory)
+
         if update_db:
+            self.build_profile.start("update_db")
             wimbledon.harvest.db_interface.update_db(
                 conn=conn, with_tracked_time=with_tracked_time
             )
-
-        data = query_db.get_data(conn=conn, with_tracked_time=with_tracked_time)
-        self.people = data["people"]
-        self.people["capacity"].fillna(0, inplace=True)
+            self.build_profile.stop()
+
+        self.build_profile.start("read_db")
+        if data is None:
+            data = query_db.get_data(conn=conn, with_tracked_time=with_tracked_time)
+        self.build_profile.stop(rows=sum(len(df) for df in data.values()))
+
+        self.build_profile.start("date_ranges")
+        # copies, as people and assignments are converted to FTE below and the
+        # caller's data shouldn't change
+        self.people = data["people"].copy()
+        self.people["capacity"] = self.people["capacity"].fillna(0)
         self.projects = data["projects"]
-        self.assignments = data["assignments"]
+        self.assignments = data["assignments"].copy()
         self.clients = data["clients"]
         self.associations = data["associations"]
+        # forecast ids of clients, people, placeholders and projects and their
+        # database ids, see query_db.get_crosswalk
+        self.id_crosswalk = data.get("id_crosswalk")
 
         start_date = self.assignments["start_date"].min()
         end_date = self.assignments["end_date"].max()
@@ -110,7 +137,9 @@ class Wimbledon:
         self.people.capacity = self.people.capacity / (
             5 * self.work_hrs_per_day * 60 * 60
         )
+        self.build_profile.stop()
 
+        self.build_profile.start("person_allocations")
         # people_allocations: dict with key person_id, contains df of (date, project_id)
         #  with allocation people_totals: df of (date, person_id) with total allocations
         self.people_allocations, self.people_totals = self._get_allocations("person")
@@ -119,7 +148,9 @@ class Wimbledon:
         self.peoplereq_allocations = self.get_person_allocations("PEOPLE REQUIRED")
         self.unconfirmed_allocations = self.get_person_allocations("UNCONFIRMED")
         self.deferred_allocations = self.get_person_allocations("DEFERRED")
+        self.build_profile.stop(rows=len(self.assignments))
 
+        self.build_profile.start("capacities")
         # calculate team capacity: capacity in people table minus any allocations to
         # unavailable project
         self.people_capacities = pd.DataFrame(
@@ -147,14 +178,18 @@ class Wimbledon:
 
         self.team_capacity = self.people_capacities.sum(axis=1)
         self.people_free_capacity = self.people_capacities - self.people_totals
+        self.build_profile.stop(rows=len(self.people))
 
+        self.build_profile.start("project_allocations")
         # project_allocations: dict with key project_id, contains df of
         # (date, person_id) with allocation project_confirmed: df of (date, project_id)
         # with total allocations across PEOPLE ONLY
         self.project_allocations, self.project_confirmed = self._get_allocations(
             "project"
         )
+        self.build_profile.stop(rows=len(self.assignments))
 
+        self.build_profile.start("placeholder_totals")
         # project_unconfirmed: df of (date, project_id) with total allocation to
         # unconfirmed placeholders
         self.project_unconfirmed = self._get_project_unconfirmed()
@@ -178,9 +213,11 @@ class Wimbledon:
         )
 
         self.project_allocated = self.project_confirmed - self.project_peoplereq
+        self.build_profile.stop(rows=len(self.projects))
 
         # Time Tracking
         if with_tracked_time:
+            self.build_profile.start("tracking")
             self.tracked_project_tasks = self._get_tracking("project", "task")
             self.tracked_project_people = self._get_tracking("project", "person")
             self.tracked_person_projects = self._get_tracking("person", "project")
@@ -199,6 +236,71 @@ class Wimbledon:
             self.tracked_client_totals = self._client_from_project_tracking(
                 self.tracked_project_totals
             )
+            self.build_profile.stop(rows=len(self.time_entries))
+
+        if profile_path is not None:
+            self.build_profile.to_jsonl(
+                profile_path,
+                with_tracked_time=with_tracked_time,
+                n_people=len(self.people),
+                n_projects=len(self.projects),
+            )
+
+    @classmethod
+    def for_entity(
+        cls,
+        person=None,
+        project=None,
+        window=None,
+        conn=None,
+        with_tracked_time=True,
+        work_hrs_per_day=None,
+        proj_hrs_per_day=None,
+    ):
+        """Build a Wimbledon containing only the data for one person or one project,
+        without loading the whole database.
+
+        Allocations, capacities and tracking for the chosen person or project are
+        the same as in the full model, but the date index only spans the dates in
+        the slice, and totals across people/projects only include what is in the
+        slice.
+
+        Keyword Arguments:
+            person {int or str} -- id or name of the person (default: {None})
+            project {int or str} -- id or name of the project (default: {None})
+            window {tuple} -- (start_date, end_date) to restrict assignments and
+                time entries to, either may be None (default: {None})
+            conn {SQLAlchemy connection} -- connection to database (default: get from wimbledon config)
+            with_tracked_time {bool} -- whether to load and process timesheet data (default: {True})
+            work_hrs_per_day {numeric} -- hours in normal working day (default: 8)
+            proj_hrs_per_day {numeric} -- nominal hours spent on projects per day (default: 6.4)
+        """
+        start_date, end_date = (None, None) if window is None else window
+
+        data = query_db.get_entity_data(
+            conn=conn,
+            person=person,
+            project=project,
+            start_date=start_date,
+            end_date=end_date,
+            with_tracked_time=with_tracked_time,
+        )
+
+        if len(data["assignments"]) == 0:
+            raise ValueError(
+                "No assignments found for {}".format(
+                    "person " + str(person)
+                    if person is not None
+                    else "project " + str(project)
+                )
+            )
+
+        return cls(
+            with_tracked_time=with_tracked_time,
+            work_hrs_per_day=work_hrs_per_day,
+            proj_hrs_per_day=proj_hrs_per_day,
+            data=data,
+        )
 
     def get_person_name(self, person_id):
         """Get the name of someone from their person_id"""